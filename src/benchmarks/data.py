@@ -0,0 +1,43 @@
+"""Генерация тестового каталога книг для бенчмарков."""
+
+import random
+from typing import Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.models.books import Book
+
+__all__ = ["generate_books", "seed_books"]
+
+FIRST_NAMES = ["Alexander", "Mikhail", "Lev", "Fyodor", "Anton", "Ivan", "Anna", "Marina", "Robert", "Martin"]
+LAST_NAMES = ["Pushkin", "Lermontov", "Tolstoy", "Dostoevsky", "Chekhov", "Turgenev", "Akhmatova", "Fowler"]
+TITLE_WORDS = [
+    "war", "peace", "crime", "punishment", "idiot", "demons", "clean", "code", "architecture", "refactoring",
+    "captain", "daughter", "hero", "time", "fathers", "sons", "garden", "cherry", "seagull", "uncle",
+]  # fmt: skip
+
+
+def generate_books(rows: int, seed: int = 42) -> Iterator[dict]:
+    rnd = random.Random(seed)
+    for i in range(rows):
+        title = " ".join(rnd.sample(TITLE_WORDS, 3)).capitalize()
+        yield {
+            "title": f"{title} {i}"[:50],
+            "author": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} {i % 10_000}",
+            "year": rnd.randint(1900, 2024),
+            "count_pages": rnd.randint(10, 2000),
+        }
+
+
+async def seed_books(connection: AsyncConnection, rows: int, chunk_size: int = 5000) -> None:
+    """Вставляет rows книг пачками. Транзакцией управляет вызывающий код."""
+    chunk: list[dict] = []
+    for book in generate_books(rows):
+        chunk.append(book)
+        if len(chunk) >= chunk_size:
+            await connection.execute(insert(Book), chunk)
+            chunk = []
+
+    if chunk:
+        await connection.execute(insert(Book), chunk)
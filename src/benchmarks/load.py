@@ -0,0 +1,371 @@
+"""
+Нагрузочный бенчмарк API книг: поднимает приложение в отдельном процессе и гоняет ручки с фиксированной конкурентностью.
+
+Для каждого сценария (ручки) считаются RPS, задержки p50/p95/p99 и пиковая память (RSS) процесса сервера.
+Результаты пишутся в JSON, по которому можно сравнивать коммиты:
+
+    python -m src.benchmarks.load --rows 10000 --concurrency 32 --duration 10 --output bench.json
+    python -m src.benchmarks.load --rows 10000 --baseline bench.json --max-regression 0.15
+
+Со вторым запуском бенчмарк завершится с кодом 1, если у какого-то сценария RPS упал
+или p95 вырос больше, чем на --max-regression (доля, 0.15 = 15%).
+
+По умолчанию используется тестовая БД из настроек (DB_HOST, DB_TEST_NAME): таблица книг в ней очищается
+и заполняется заново, только если в ней не ровно --rows книг (или передан --reseed).
+С флагом --sqlite приложение поднимается на временном файле SQLite - без PostgreSQL,
+но и цифры тогда годятся только для грубого сравнения.
+
+Нагрузка создается из этого же процесса через httpx, поэтому на слабой машине упором может стать сам клиент:
+стоит смотреть на загрузку CPU обоих процессов.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable
+
+import httpx
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.benchmarks.data import generate_books, seed_books
+from src.configurations.settings import settings
+from src.models.books import Book
+
+__all__ = ["ScenarioResult", "percentile", "compare_results"]
+
+API = "/api/v1/books"
+
+# Запрос сценария: получает клиент и генератор случайных чисел воркера, возвращает ответ
+Request = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+@dataclass
+class ScenarioResult:
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_rss_mb: float | None = None
+    status_codes: dict[str, int] = field(default_factory=dict)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга. sorted_values должны быть отсортированы."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def compare_results(baseline: dict, current: dict, max_regression: float) -> list[str]:
+    """Сравнивает два прогона. Возвращает список регрессий (пустой - все хорошо)."""
+    regressions = []
+    for name, before in baseline["scenarios"].items():
+        after = current["scenarios"].get(name)
+        if after is None:
+            continue
+
+        if after["rps"] < before["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: rps {before['rps']:.1f} -> {after['rps']:.1f}")
+        if after["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {after['p95_ms']:.2f}ms")
+    return regressions
+
+
+def read_rss_mb(pid: int) -> float | None:
+    """Текущий RSS процесса в мегабайтах. Есть только на Linux (/proc), на других системах - None."""
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def new_book(rnd: random.Random) -> dict:
+    return {
+        "title": f"Benchmark {rnd.randrange(1_000_000)}",
+        "author": f"Author {rnd.randrange(10_000)}",
+        "year": rnd.randint(1900, 2024),
+        "pages": rnd.randint(10, 2000),
+    }
+
+
+def build_scenarios(rows: int) -> dict[str, Request]:
+    """Сценарии по ручкам books.py. Изменяющие сценарии трогают только случайные книги из засеянных."""
+    titles = [book["title"].split()[0] for book in generate_books(50)]
+
+    def random_id(rnd: random.Random) -> int:
+        return rnd.randint(1, rows)
+
+    async def get_book(client, rnd):
+        return await client.get(f"{API}/{random_id(rnd)}")
+
+    async def list_books(client, rnd):
+        return await client.get(f"{API}/", params={"limit": 100, "after": rnd.randrange(max(rows - 100, 1))})
+
+    async def list_filtered(client, rnd):
+        params = {"year_from": 1990, "year_to": 2000, "sort_by": "year", "limit": 100}
+        return await client.get(f"{API}/", params=params)
+
+    async def stream_books(client, rnd):
+        return await client.get(f"{API}/", params={"stream": "true", "limit": 1000})
+
+    async def search_books(client, rnd):
+        return await client.get(f"{API}/search", params={"q": rnd.choice(titles), "limit": 20})
+
+    async def book_stats(client, rnd):
+        return await client.get(f"{API}/stats", params={"authors_limit": 20})
+
+    async def create_book(client, rnd):
+        return await client.post(f"{API}/", json=new_book(rnd))
+
+    async def bulk_create(client, rnd):
+        return await client.post(f"{API}/bulk", json=[new_book(rnd) for _ in range(100)])
+
+    async def update_book(client, rnd):
+        book_id = random_id(rnd)
+        book = {**new_book(rnd), "id": book_id, "count_pages": rnd.randint(10, 2000)}
+        return await client.put(f"{API}/{book_id}", json=book)
+
+    async def patch_book(client, rnd):
+        return await client.patch(f"{API}/{random_id(rnd)}", json={"year": rnd.randint(1900, 2024)})
+
+    async def delete_missing(client, rnd):
+        # Удаляем несуществующие книги: так замеряется сама ручка, а засеянные данные не портятся
+        return await client.delete(f"{API}/{rows + 1_000_000 + rnd.randrange(1_000_000)}")
+
+    return {
+        "get_book": get_book,
+        "list_books": list_books,
+        "list_filtered": list_filtered,
+        "stream_books": stream_books,
+        "search_books": search_books,
+        "book_stats": book_stats,
+        "create_book": create_book,
+        "bulk_create": bulk_create,
+        "update_book": update_book,
+        "patch_book": patch_book,
+        "delete_book": delete_missing,
+    }
+
+
+# Коды, которые сценарий считает нормальными ответами (404 для удаления несуществующей книги)
+OK_STATUSES = {200, 201, 204, 404}
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, request: Request, concurrency: int, duration: float, warmup: float, server_pid: int
+) -> ScenarioResult:
+    latencies: list[float] = []
+    status_codes: dict[str, int] = {}
+    errors = 0
+    measuring = False
+    peak_rss = None
+
+    async def worker(seed: int, deadline: float) -> None:
+        nonlocal errors
+        rnd = random.Random(seed)
+        while time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            try:
+                response = await request(client, rnd)
+                await response.aread()
+                code = str(response.status_code)
+                failed = response.status_code not in OK_STATUSES
+            except httpx.HTTPError:
+                code, failed = "exception", True
+
+            if measuring:
+                latencies.append(time.perf_counter() - started_at)
+                status_codes[code] = status_codes.get(code, 0) + 1
+                errors += failed
+
+    async def sample_rss(deadline: float) -> None:
+        nonlocal peak_rss
+        while time.perf_counter() < deadline:
+            rss = read_rss_mb(server_pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0.0, rss)
+            await asyncio.sleep(0.05)
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(i, deadline) for i in range(concurrency)))
+
+    measuring = True
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+    await asyncio.gather(sample_rss(deadline), *(worker(1000 + i, deadline) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return ScenarioResult(
+        requests=len(latencies),
+        errors=errors,
+        rps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p95_ms=round(percentile(latencies, 95) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+        peak_rss_mb=round(peak_rss, 1) if peak_rss is not None else None,
+        status_codes=status_codes,
+    )
+
+
+async def prepare_database(database_url: str, rows: int, reseed: bool) -> None:
+    """Засеивает таблицу книг ровно rows строками с id от 1 до rows. Схему к этому моменту создает приложение."""
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.begin() as connection:
+            count = await connection.scalar(select(func.count()).select_from(Book))
+            if count == rows and not reseed:
+                return
+
+            if connection.dialect.name == "postgresql":
+                await connection.execute(text("TRUNCATE books_table RESTART IDENTITY"))
+            else:
+                await connection.execute(text("DELETE FROM books_table"))
+            print(f"seeding {rows} books...", file=sys.stderr)
+            await seed_books(connection, rows)
+
+        # VACUUM не работает внутри транзакции
+        async with engine.connect() as connection:
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            await connection.execute(
+                text("VACUUM ANALYZE books_table" if engine.dialect.name == "postgresql" else "ANALYZE")
+            )
+    finally:
+        await engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, env: dict[str, str]) -> subprocess.Popen:
+    command = [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    command += ["--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(command, env={**os.environ, **env})
+
+
+async def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            try:
+                if (await client.get("/internal/health/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    if args.sqlite:
+        db_file = os.path.join(tempfile.mkdtemp(prefix="books-bench-"), "bench.db")
+        env = {"DB_HOST": "sqlite+aiosqlite://", "DB_NAME": db_file, "DB_SCHEMA_MODE": "create_drop"}
+        database_url = f"sqlite+aiosqlite:///{db_file}"
+    else:
+        env = {"DB_NAME": settings.db_test_name, "DB_SCHEMA_MODE": "migrate"}
+        database_url = settings.database_test_url
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(port, env)
+    try:
+        await wait_until_ready(base_url, server)
+        await prepare_database(database_url, args.rows, args.reseed)
+
+        scenarios = build_scenarios(args.rows)
+        selected = args.scenario or list(scenarios)
+        results = {}
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+            for name in selected:
+                result = await run_scenario(
+                    client, scenarios[name], args.concurrency, args.duration, args.warmup, server.pid
+                )
+                results[name] = asdict(result)
+                print(
+                    f"{name:<14} rps={result.rps:>9.1f} p50={result.p50_ms:>8.2f}ms p95={result.p95_ms:>8.2f}ms "
+                    f"p99={result.p99_ms:>8.2f}ms errors={result.errors} rss={result.peak_rss_mb}MB",
+                    file=sys.stderr,
+                )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "database": "sqlite" if args.sqlite else "postgresql",
+            "rows": args.rows,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "python": sys.version.split()[0],
+        },
+        "scenarios": results,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="Сколько книг засеять (например 10000 или 1000000)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Сколько запросов держать в полете одновременно")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность замера сценария, секунды")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Прогрев перед замером сценария, секунды")
+    parser.add_argument("--scenario", action="append", choices=list(build_scenarios(1)), help="Только эти сценарии")
+    parser.add_argument("--reseed", action="store_true", help="Засеять таблицу заново, даже если она уже готова")
+    parser.add_argument(
+        "--sqlite", action="store_true", help="Поднять приложение на временной SQLite вместо PostgreSQL"
+    )
+    parser.add_argument("--output", help="Куда записать результаты в JSON (по умолчанию - в stdout)")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="Допустимое ухудшение RPS и p95 (доля)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    payload = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(payload + "\n")
+    else:
+        print(payload)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_results(json.load(baseline_file), results, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
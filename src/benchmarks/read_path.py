@@ -0,0 +1,88 @@
+"""
+Бенчмарк пути чтения списка книг: сколько процессорного времени уходит на одну строку.
+
+Сравниваются два пути:
+- orm: ORM объекты Book -> валидация через response_model ReturnedAllBooks -> jsonable_encoder -> orjson
+  (так FastAPI отдает ответ, если ручка возвращает ORM объекты);
+- records: кортежи колонок -> BookRecord со __slots__ -> orjson сразу в байты.
+
+Запуск (нужна PostgreSQL из docker-compose):
+
+    python -m src.benchmarks.read_path --rows 1000 --repeat 200
+
+Меряется process_time, то есть только CPU этого процесса: время работы самой БД сюда не входит.
+Книги создаются в тестовой БД внутри транзакции, которая в конце откатывается.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.benchmarks.data import seed_books
+from src.configurations.settings import settings
+from src.models.base import BaseModel
+from src.models.books import BOOK_RECORD_COLUMNS, Book, BookRecord
+from src.schemas import ReturnedAllBooks
+
+
+async def orm_path(session: AsyncSession, limit: int) -> tuple[float, float]:
+    started_at = time.process_time()
+    books = (await session.execute(select(Book).order_by(Book.id).limit(limit))).scalars().all()
+    fetched_at = time.process_time()
+    validated = ReturnedAllBooks.model_validate({"books": books}, from_attributes=True)
+    orjson.dumps(jsonable_encoder(validated))
+    session.expunge_all()  # Иначе следующие прогоны возьмут объекты из identity map
+    return fetched_at - started_at, time.process_time() - fetched_at
+
+
+async def records_path(session: AsyncSession, limit: int) -> tuple[float, float]:
+    started_at = time.process_time()
+    books = [
+        BookRecord(*row) for row in await session.execute(select(*BOOK_RECORD_COLUMNS).order_by(Book.id).limit(limit))
+    ]
+    fetched_at = time.process_time()
+    orjson.dumps({"books": books, "next_cursor": None})
+    return fetched_at - started_at, time.process_time() - fetched_at
+
+
+async def run(rows: int, repeat: int) -> None:
+    engine = create_async_engine(settings.database_test_url)
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                await connection.run_sync(BaseModel.metadata.create_all)
+                await seed_books(connection, rows)
+                await connection.execute(text("ANALYZE books_table"))
+
+                session = AsyncSession(bind=connection)
+                print(f"{'path':<10} {'fetch, us/row':>14} {'serialize, us/row':>18} {'total, us/row':>14}")
+                for name, path in (("orm", orm_path), ("records", records_path)):
+                    await path(session, rows)  # Прогрев: кэш запросов SQLAlchemy и подготовленные выражения
+                    samples = [await path(session, rows) for _ in range(repeat)]
+                    fetch = statistics.median(sample[0] for sample in samples) / rows * 1e6
+                    serialize = statistics.median(sample[1] for sample in samples) / rows * 1e6
+                    print(f"{name:<10} {fetch:>14.2f} {serialize:>18.2f} {fetch + serialize:>14.2f}")
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Сколько книг на странице")
+    parser.add_argument("--repeat", type=int, default=100, help="Сколько раз повторить замер")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк поиска: полнотекстовый поиск по GIN индексу против наивного ILIKE '%...%'.
+
+Запуск (нужна PostgreSQL из docker-compose):
+
+    python -m src.benchmarks.search --rows 200000 --query pushk --query "clean code"
+
+Книги создаются в тестовой БД внутри транзакции, которая в конце откатывается,
+поэтому после запуска в БД ничего не остается.
+
+На редких словах индекс выигрывает на порядки: ILIKE перебирает всю таблицу.
+На очень частых словах (совпадает большая часть каталога) полнотекстовый поиск медленнее:
+чтобы отсортировать по релевантности, ему нужно посчитать ранг у каждого совпадения,
+а ILIKE с сортировкой по id останавливается на первых limit строках.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.benchmarks.data import seed_books
+from src.configurations.settings import settings
+from src.models.base import BaseModel
+from src.models.books import Book
+from src.services.search import build_search_query, search_terms
+
+
+def naive_search_query(q: str, limit: int):
+    conditions = [or_(Book.title.ilike(f"%{term}%"), Book.author.ilike(f"%{term}%")) for term in search_terms(q)]
+    return select(Book).where(and_(*conditions)).order_by(Book.id).limit(limit)
+
+
+async def measure(connection: AsyncConnection, query, repeat: int) -> tuple[list[float], int]:
+    timings, found = [], 0
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        found = len((await connection.execute(query)).all())
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return timings, found
+
+
+async def run(rows: int, queries: list[str], repeat: int, limit: int) -> None:
+    engine = create_async_engine(settings.database_test_url)
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                await connection.run_sync(BaseModel.metadata.create_all)
+                print(f"Seeding {rows} books...")
+                await seed_books(connection, rows)
+                await connection.execute(text("ANALYZE books_table"))
+
+                print(f"{'query':<20} {'method':<10} {'found':>6} {'median, ms':>11} {'max, ms':>9}")
+                for q in queries:
+                    for method, query in (
+                        ("fts", build_search_query(q, limit, "postgresql")),
+                        ("ilike", naive_search_query(q, limit)),
+                    ):
+                        timings, found = await measure(connection, query, repeat)
+                        print(
+                            f"{q:<20} {method:<10} {found:>6} {statistics.median(timings):>11.2f} {max(timings):>9.2f}"
+                        )
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Сколько книг создать")
+    parser.add_argument("--query", action="append", dest="queries", help="Строка поиска (можно несколько)")
+    parser.add_argument("--repeat", type=int, default=20, help="Сколько раз повторить каждый запрос")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rows, args.queries or ["pushkin 4242", "nabokov", "pushkin"], args.repeat, args.limit))
+
+
+if __name__ == "__main__":
+    main()
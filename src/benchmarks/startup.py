@@ -0,0 +1,95 @@
+"""
+Бенчмарк холодного старта приложения: сколько стоит импорт и через сколько экземпляр готов принимать трафик.
+
+Импорт меряется через python -X importtime в отдельном процессе (кэш модулей текущего процесса не мешает):
+считается общее время импорта src.main и собственное время модулей src.* - то, что зависит от нашего кода.
+Время до готовности - от запуска uvicorn до первого 200 от /internal/health/ready (схема проверена, пул прогрет).
+Сервер стартует с настройками из окружения, как в проде: по умолчанию DB_SCHEMA_MODE=check, то есть БД
+уже должна быть мигрирована (python -m src.migrations upgrade).
+
+    python -m src.benchmarks.startup
+    python -m src.benchmarks.startup --top 20 --budget-ms 2500
+
+С --budget-ms бенчмарк завершится с кодом 1, если импорт src.main дольше бюджета.
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from src.benchmarks.load import free_port, start_server, wait_until_ready
+
+__all__ = ["profile_imports", "measure_time_to_ready"]
+
+OWN_PACKAGE = "src"
+PROJECT_ROOT = Path(__file__).resolve().parents[2]  # Откуда импортируется пакет src
+
+
+def profile_imports(module: str = "src.main") -> dict[str, Any]:
+    """Импортирует модуль в чистом процессе с -X importtime и разбирает отчет (время в миллисекундах)."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=PROJECT_ROOT,
+    )
+    modules = {}
+    for line in res.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = {"self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000}
+
+    own = [name for name in modules if name == OWN_PACKAGE or name.startswith(f"{OWN_PACKAGE}.")]
+    return {
+        "total_ms": modules[module]["cumulative_ms"],
+        "own_ms": sum(modules[name]["self_ms"] for name in own),
+        "modules": modules,
+    }
+
+
+async def measure_time_to_ready(env: dict[str, str] | None = None) -> float:
+    """Запускает сервер и возвращает, через сколько секунд он ответил готовностью."""
+    port = free_port()
+    started_at = time.perf_counter()
+    server = start_server(port, env or {})
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{port}", server)
+        return time.perf_counter() - started_at
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.main", help="Какой модуль импортировать")
+    parser.add_argument("--top", type=int, default=10, help="Сколько самых дорогих модулей показать")
+    parser.add_argument("--budget-ms", type=float, help="Допустимое время импорта, миллисекунды")
+    parser.add_argument("--no-server", action="store_true", help="Не мерить время до готовности сервера")
+    args = parser.parse_args()
+
+    profile = profile_imports(args.module)
+    slowest = sorted(profile["modules"].items(), key=lambda item: item[1]["self_ms"], reverse=True)[: args.top]
+    for name, timings in slowest:
+        print(f"{timings['self_ms']:>9.1f}ms {timings['cumulative_ms']:>9.1f}ms  {name}", file=sys.stderr)
+
+    results = {"import_total_ms": profile["total_ms"], "import_own_ms": profile["own_ms"]}
+    if not args.no_server:
+        results["time_to_ready_s"] = asyncio.run(measure_time_to_ready())
+    print(json.dumps(results, indent=2))
+
+    if args.budget_ms is not None and profile["total_ms"] > args.budget_ms:
+        print(f"Import of {args.module} took {profile['total_ms']:.1f}ms > {args.budget_ms}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
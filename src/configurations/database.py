@@ -1,39 +1,135 @@
+import asyncio
 import logging
-from typing import AsyncGenerator, Callable, Optional
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional
 
+from fastapi import Request
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
+# Импорт регистрирует модели в BaseModel.metadata для create_all
+import src.models.books  # noqa F401
+import src.models.stats  # noqa F401
+from src.migrations import check_schema_version, upgrade
 from src.models.base import BaseModel
-from src.models.books import Book  # noqa F401
+from src.monitoring import InstrumentedAsyncQueuePool, install_query_hooks
 
+from .replicas import ReplicaRouter
 from .settings import settings
 
 logger = logging.getLogger("__name__")
 
 
-__all__ = ["global_init", "get_async_session", "create_db_and_tables", "delete_db_and_tables"]
+__all__ = [
+    "build_async_engine",
+    "global_init",
+    "global_dispose",
+    "get_pool_status",
+    "get_async_session",
+    "after_commit",
+    "run_after_commit",
+    "get_async_read_session",
+    "get_session_factory",
+    "get_read_session_factory",
+    "create_db_and_tables",
+    "delete_db_and_tables",
+    "migrate_db",
+    "check_db_schema",
+    "warm_up_engine",
+    "warm_up_pools",
+]
 
 __async_engine: Optional[AsyncEngine] = None
 __session_factory: Optional[Callable[[], AsyncSession]] = None
+__replica_router: Optional[ReplicaRouter] = None
+
+# Запросы с этими методами пишут в БД. После них клиент какое-то время читает из основной БД.
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
+# Ключ в session.info со списком действий, которые нужно выполнить после коммита
+_AFTER_COMMIT = "after_commit"
+
+
+def build_async_engine(url: str, **overrides: Any) -> AsyncEngine:
+    """Создает движок с пулом, настроенным из Settings. overrides перекрывают настройки (удобно в тестах)."""
+    db_url = make_url(url)
+    options: dict[str, Any] = {
+        "poolclass": InstrumentedAsyncQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "echo": settings.db_echo,
+    }
+
+    if db_url.get_driver_name() == "asyncpg":
+        # Кэш подготовленных выражений есть и у SQLAlchemy, и у самого asyncpg. Настраиваем оба.
+        db_url = db_url.update_query_dict({"prepared_statement_cache_size": str(settings.db_statement_cache_size)})
+        options["connect_args"] = {"statement_cache_size": settings.db_statement_cache_size}
+
+    options.update(overrides)
+    engine = create_async_engine(db_url, **options)
+    install_query_hooks(engine.sync_engine, slow_query_threshold=settings.db_slow_query_threshold)
+    return engine
+
 
 def global_init() -> None:
-    global __async_engine, __session_factory
+    global __async_engine, __session_factory, __replica_router
 
     if __session_factory:
         return
 
     if not __async_engine:
-        __async_engine = create_async_engine(url=SQLALCHEMY_DATABASE_URL, echo=False)  # TODO
+        __async_engine = build_async_engine(SQLALCHEMY_DATABASE_URL)
 
     __session_factory = async_sessionmaker(__async_engine)
 
+    if settings.db_replica_urls:
+        __replica_router = ReplicaRouter(
+            __session_factory,
+            [build_async_engine(url) for url in settings.db_replica_urls],
+            strategy=settings.db_replica_strategy,
+            sticky_window=settings.db_read_your_writes_window,
+            health_check_interval=settings.db_replica_health_check_interval,
+        )
+
+
+async def global_dispose() -> None:
+    """Закрывает пулы основной БД и реплик. После этого можно снова вызвать global_init()."""
+    global __async_engine, __session_factory, __replica_router
+
+    if __replica_router is not None:
+        await __replica_router.dispose()
+    if __async_engine is not None:
+        await __async_engine.dispose()
 
-async def get_async_session() -> AsyncGenerator:
-    global __session_factory
+    __async_engine, __session_factory, __replica_router = None, None, None
 
+
+def client_key(request: Request) -> str:
+    """Кто прислал запрос. Клиенты за общим NAT могут представиться заголовком X-Client-Id."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "")
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Откладывает callback до коммита сессии (его вызывает run_after_commit). Например, сброс кэша:
+    сброшенный до коммита ключ конкурентный запрос успеет заполнить еще старой строкой из БД.
+    Если сессия откатилась, отложенные действия не выполняются.
+    """
+    session.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+async def run_after_commit(session: AsyncSession) -> None:
+    """Выполняет действия, отложенные через after_commit. Вызывать сразу после успешного коммита."""
+    for callback in session.info.pop(_AFTER_COMMIT, []):
+        await callback()
+
+
+async def get_async_session(request: Request) -> AsyncGenerator:
     if not __session_factory:
         raise ValueError({"message": "You must call global_init() before using this method."})
 
@@ -42,6 +138,9 @@ async def get_async_session() -> AsyncGenerator:
     try:
         yield session
         await session.commit()
+        await run_after_commit(session)
+        if __replica_router and request.method in WRITE_METHODS:
+            __replica_router.mark_write(client_key(request))
     except Exception as e:
         logger.error("Raises exception: %s", e)
         raise e
@@ -50,9 +149,74 @@ async def get_async_session() -> AsyncGenerator:
         await session.close()
 
 
-async def create_db_and_tables():
-    global __async_engine
+def _read_session_factory(request: Request) -> Callable[[], AsyncSession]:
+    if not __session_factory:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    if __replica_router is None:
+        return __session_factory
+
+    return __replica_router.read_session_factory(client_key(request))
+
+
+def _is_connection_error(error: Exception) -> bool:
+    return isinstance(error, OSError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+async def get_async_read_session(request: Request) -> AsyncGenerator:
+    """Сессия только для чтения: из реплики, если они настроены, иначе из основной БД."""
+    session: AsyncSession = _read_session_factory(request)()
+
+    try:
+        yield session
+    except Exception as e:
+        # Реплика недоступна - выводим ее из ротации, следующие запросы пойдут в другие реплики
+        if __replica_router and _is_connection_error(e):
+            __replica_router.mark_unhealthy(session)
+        logger.error("Raises exception: %s", e)
+        raise e
+    finally:
+        await session.rollback()
+        await session.close()
+
 
+def get_read_session_factory(request: Request) -> Callable[[], AsyncSession]:
+    """Как get_session_factory, но для чтения (учитывает реплики)."""
+    return _read_session_factory(request)
+
+
+def get_pool_status() -> dict[str, Any]:
+    """Текущее состояние пула соединений основного движка."""
+    if __async_engine is None:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    pool = __async_engine.pool
+    metrics = pool.metrics
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "waiting": metrics.waiting,
+        "timeouts": metrics.timeouts,
+        "checkout_latency": metrics.checkout_latency.snapshot(),
+    }
+
+
+def get_session_factory() -> Callable[[], AsyncSession]:
+    """Фабрика сессий для ручек, которым сессия нужна дольше, чем живет зависимость.
+
+    FastAPI закрывает зависимости с yield до отправки ответа,
+    поэтому стриминговые ответы открывают (и закрывают) сессию сами.
+    """
+    if not __session_factory:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    return __session_factory
+
+
+async def create_db_and_tables():
     if __async_engine is None:
         raise ValueError({"message": "You must call global_init() before using this method."})
 
@@ -61,10 +225,51 @@ async def create_db_and_tables():
 
 
 async def delete_db_and_tables():
-    global __async_engine
-
     if __async_engine is None:
         raise ValueError({"message": "You must call global_init() before using this method."})
 
     async with __async_engine.begin() as conn:
         await conn.run_sync(BaseModel.metadata.drop_all)
+
+
+async def migrate_db() -> list[int]:
+    if __async_engine is None:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    return await upgrade(__async_engine)
+
+
+async def check_db_schema() -> int:
+    if __async_engine is None:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    return await check_schema_version(__async_engine)
+
+
+async def warm_up_engine(engine: AsyncEngine, connections: int) -> int:
+    """Открывает до connections соединений одновременно и возвращает их в пул. Возвращает, сколько открыто."""
+    count = max(min(connections, engine.pool.size()), 0)  # Сверх pool_size пул соединения не сохранит
+    opened = [engine.connect() for _ in range(count)]
+    try:
+        await asyncio.gather(*(connection.start() for connection in opened))
+    finally:
+        await asyncio.gather(*(connection.close() for connection in opened), return_exceptions=True)
+    return count
+
+
+async def warm_up_pools(connections: int) -> None:
+    """Прогревает пулы основной БД и реплик перед тем, как приложение объявит готовность."""
+    if __async_engine is None:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    await warm_up_engine(__async_engine, connections)
+
+    if __replica_router is not None:
+        # Недоступная реплика не должна мешать старту: ее выведет из ротации проверка здоровья
+        results = await asyncio.gather(
+            *(warm_up_engine(replica.engine, connections) for replica in __replica_router.replicas),
+            return_exceptions=True,
+        )
+        for replica, result in zip(__replica_router.replicas, results):
+            if isinstance(result, Exception):
+                logger.warning("Replica %s warm-up failed: %s", replica.engine.url.render_as_string(), result)
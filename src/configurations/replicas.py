@@ -0,0 +1,129 @@
+"""
+Маршрутизация чтения по репликам БД.
+
+Запись всегда идет в основную БД (primary), чтение - в одну из здоровых реплик.
+Реплика отстает от основной БД, поэтому клиент, который только что что-то записал,
+какое-то время читает из основной БД - иначе он может не увидеть собственную запись.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Literal
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Replica", "ReplicaRouter"]
+
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    session_factory: Callable[[], AsyncSession] = field(init=False)
+    healthy: bool = True
+
+    def __post_init__(self):
+        self.session_factory = async_sessionmaker(self.engine)
+
+    @property
+    def checked_out(self) -> int:
+        # Не у всех пулов есть счетчик (например, у NullPool) - такие считаем свободными
+        checkedout = getattr(self.engine.pool, "checkedout", None)
+        return checkedout() if checkedout else 0
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        primary_session_factory: Callable[[], AsyncSession],
+        replica_engines: list[AsyncEngine],
+        strategy: Literal["round_robin", "least_connections"] = "least_connections",
+        sticky_window: float = 5.0,
+        health_check_interval: float = 5.0,
+        health_check_timeout: float = 1.0,
+        max_tracked_clients: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary_session_factory = primary_session_factory
+        self.replicas = [Replica(engine) for engine in replica_engines]
+        self.strategy = strategy
+        self.sticky_window = sticky_window
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.max_tracked_clients = max_tracked_clients
+        self._clock = clock
+        self._round_robin = itertools.count()
+        self._last_writes: OrderedDict[str, float] = OrderedDict()
+        self._last_health_check = clock()
+        self._health_check_task: asyncio.Task | None = None
+
+    def mark_write(self, client_key: str) -> None:
+        """Запоминаем, что клиент только что писал: следующие sticky_window секунд он читает из основной БД."""
+        self._last_writes[client_key] = self._clock()
+        self._last_writes.move_to_end(client_key)
+        while len(self._last_writes) > self.max_tracked_clients:
+            self._last_writes.popitem(last=False)
+
+    def _wrote_recently(self, client_key: str) -> bool:
+        written_at = self._last_writes.get(client_key)
+        return written_at is not None and self._clock() - written_at < self.sticky_window
+
+    def choose_replica(self) -> Replica | None:
+        self._schedule_health_check()
+
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "round_robin":
+            return healthy[next(self._round_robin) % len(healthy)]
+        return min(healthy, key=lambda replica: replica.checked_out)
+
+    def read_session_factory(self, client_key: str) -> Callable[[], AsyncSession]:
+        """Фабрика сессий для чтения: реплика, если можно, иначе основная БД."""
+        if self._wrote_recently(client_key) or (replica := self.choose_replica()) is None:
+            return self.primary_session_factory
+        return replica.session_factory
+
+    def mark_unhealthy(self, session: AsyncSession) -> None:
+        # Реплику выведем из ротации до следующей успешной проверки здоровья
+        for replica in self.replicas:
+            if session.bind is replica.engine:
+                logger.warning("Replica %s is marked unhealthy", replica.engine.url.render_as_string())
+                replica.healthy = False
+
+    async def check_health(self) -> None:
+        async def probe(replica: Replica) -> None:
+            async with replica.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        async def check(replica: Replica) -> None:
+            try:
+                await asyncio.wait_for(probe(replica), self.health_check_timeout)
+                replica.healthy = True
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning("Replica health check failed: %s", e)
+                replica.healthy = False
+
+        await asyncio.gather(*(check(replica) for replica in self.replicas))
+        self._last_health_check = self._clock()
+
+    def _schedule_health_check(self) -> None:
+        # Проверки запускаются по ходу работы, в фоне, не чаще раза в health_check_interval
+        if self._health_check_task is not None and not self._health_check_task.done():
+            return
+        if self._clock() - self._last_health_check < self.health_check_interval:
+            return
+        self._last_health_check = self._clock()
+        self._health_check_task = asyncio.get_running_loop().create_task(self.check_health())
+
+    async def dispose(self) -> None:
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+        await asyncio.gather(*(replica.engine.dispose() for replica in self.replicas))
@@ -12,6 +12,8 @@
 и может дать доступ к приложению злоумышленникам.
 """
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -20,7 +22,105 @@ class Settings(BaseSettings):
     db_host: str
     db_name: str
     db_test_name: str = "fastapi_project_test_db"
-    max_connection_count: int = 10
+    max_connection_count: int = 10  # Жесткий предел соединений на процесс: db_pool_size + переполнение
+
+    # Что делать со схемой БД при старте приложения:
+    # check - только проверить, что миграции применены (для продакшена, миграции запускаются отдельно);
+    # migrate - применить недостающие миграции;
+    # create_drop - создать таблицы по моделям при старте и удалить при остановке. ТОЛЬКО для разработки и тестов!
+    # none - ничего не делать: схемой уже занялся процесс, который запустил воркеры (python -m src.server)
+    db_schema_mode: Literal["check", "migrate", "create_drop", "none"] = "check"
+
+    # Реплики для чтения: полные URL, в .env - JSON списком. Пустой список - все идет в основную БД.
+    db_replica_urls: list[str] = []
+    db_replica_strategy: Literal["round_robin", "least_connections"] = "least_connections"
+    db_replica_health_check_interval: float = 5.0
+    # Сколько секунд после записи клиент читает из основной БД (реплика может еще не догнать)
+    db_read_your_writes_window: float = 5.0
+
+    # Секционирование books_table (только PostgreSQL): none - обычная таблица;
+    # year - по диапазонам года, db_partition_year_step лет в секции; hash - по хэшу id на db_partition_count секций.
+    # create_all сразу создает секционированную таблицу, существующую перестраивает python -m src.migrations partition
+    db_partitioning: Literal["none", "year", "hash"] = "none"
+    db_partition_count: int = 16
+    db_partition_year_step: int = 10
+    # Откуда берутся id книг: sequence - последовательность БД с кэшем номеров в каждом соединении;
+    # snowflake - генерирует приложение, без общей последовательности (id больше 2**53, см. src/models/ids.py)
+    db_id_strategy: Literal["sequence", "snowflake"] = "sequence"
+    db_snowflake_worker_id: int | None = None  # 0..1023, у каждого процесса свой. None - по pid процесса
+
+    # Пул соединений
+    db_pool_size: int = 5  # Сколько соединений пул держит открытыми постоянно
+    db_pool_timeout: float = 30.0  # Сколько секунд ждать свободное соединение
+    db_pool_recycle: int = 1800  # Через сколько секунд переоткрывать соединение
+    db_pool_pre_ping: bool = True  # Проверять соединение перед выдачей (защита от обрывов)
+    db_statement_cache_size: int = 100  # Кэш подготовленных выражений. 0 - если БД за pgbouncer
+    # Сколько соединений открыть при старте, до готовности принимать трафик (не больше db_pool_size).
+    # Первые запросы после выкатки не ждут подключения к БД
+    db_pool_warmup: int = 2
+    # Сколько соединений с БД можно открыть всем воркерам python -m src.server вместе.
+    # Делится поровну: у каждого воркера max_connection_count = db_total_connections // server_workers.
+    # None - каждому воркеру max_connection_count из настроек
+    db_total_connections: int | None = None
+
+    # Отладка и метрики запросов
+    db_echo: bool = False  # Печатать все SQL запросы в лог (только для отладки: очень многословно)
+    db_slow_query_threshold: float | None = 0.5  # Запросы дольше стольки секунд пишутся в лог. None - не писать
+    server_timing: bool = True  # Отдавать клиенту заголовок Server-Timing с разбивкой времени запроса
+
+    # Контроль допуска запросов (src/services/admission.py). Служебные ручки /internal не ограничиваются.
+    # Частота запросов с одного адреса: в среднем rate_limit_per_second, всплеском до rate_limit_burst. None - без предела
+    rate_limit_per_second: float | None = None
+    rate_limit_burst: int = 50
+    # Сколько запросов воркер выполняет одновременно. None - max_connection_count: больше пул все равно не обслужит.
+    # Лишние ждут в очереди не дольше admission_queue_timeout секунд и не больше admission_max_queue штук,
+    # остальные сразу получают 503
+    admission_max_concurrency: int | None = None
+    admission_queue_timeout: float = 0.5
+    admission_max_queue: int = 100
+
+    # Запуск через python -m src.server
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 0  # Сколько процессов-воркеров. 0 - по числу ядер
+    # После SIGTERM воркер еще столько секунд принимает запросы, но /internal/health/ready уже отвечает 503:
+    # балансировщик успевает заметить это и перестать слать трафик. Ставить не меньше интервала его проверок
+    server_drain_delay: float = 0.0
+    server_graceful_timeout: int = 30  # Сколько секунд ждать запросы, которые еще выполняются, перед остановкой
+
+    # Пагинация списка книг
+    books_page_size: int = 100
+    books_max_page_size: int = 1000
+    books_stream_chunk_size: int = 1000
+    books_export_chunk_size: int = 10_000  # Сколько строк в одной пачке выгрузки (и в одной row group Parquet)
+
+    # Массовое создание книг: сколько строк в одном INSERT
+    books_bulk_chunk_size: int = 1000
+    # JSON массив разбирается только целиком, поэтому больше этого размера (байт) не принимаем.
+    # Большие загрузки - в NDJSON, он читается потоком
+    books_bulk_json_max_bytes: int = 10 * 1024 * 1024
+    # Сколько ошибок отбракованных книг вернуть в ответе (всего отбраковано - rejected)
+    books_bulk_max_errors: int = 100
+
+    # Импорт каталога через COPY: строк в одной пачке COPY и сколько ошибок вернуть в отчете
+    books_import_chunk_size: int = 50_000
+    books_import_max_errors: int = 100
+
+    # Пакетная запись одиночных книг: одновременные POST /books/ пишутся одним INSERT.
+    # Пачка уходит, когда набралось books_batch_max_size книг или прошло books_batch_max_delay секунд.
+    books_write_batching: bool = False
+    books_batch_max_size: int = 500
+    books_batch_max_delay: float = 0.005
+
+    # Кэш книг. Кэш живет в памяти воркера, и запись в другом воркере его не сбросит,
+    # поэтому TTL - это предел, на который данные могут устареть.
+    cache_ttl: float = 60.0
+    cache_negative_ttl: float = 5.0  # Сколько помнить, что книги с таким id нет
+    cache_max_size: int = 10_000
+
+    @property
+    def db_max_overflow(self) -> int:
+        return max(self.max_connection_count - self.db_pool_size, 0)
 
     @property
     def database_url(self) -> str:
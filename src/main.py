@@ -1,20 +1,43 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.responses import ORJSONResponse
 
-from src.configurations.database import create_db_and_tables, delete_db_and_tables, global_init
-from src.routers import v1_router
+from src.configurations.database import (
+    check_db_schema,
+    create_db_and_tables,
+    delete_db_and_tables,
+    global_dispose,
+    global_init,
+    migrate_db,
+    warm_up_pools,
+)
+from src.configurations.settings import settings
+from src.monitoring import TimedORJSONResponse, TimingMiddleware
+from src.routers import internal_router, v1_router
+from src.services.admission import AdmissionMiddleware, get_concurrency_limiter, get_rate_limiter
+from src.services.batching import close_books_insert_batcher
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):  # Рекомендуется теперь вместо @app.on_event()
     # Запускается при старте приложения
     global_init()
-    await create_db_and_tables()
+    if settings.db_schema_mode == "create_drop":
+        await create_db_and_tables()  # Только для разработки: таблицы по моделям, без миграций
+    elif settings.db_schema_mode == "migrate":
+        await migrate_db()
+    elif settings.db_schema_mode == "check":
+        await check_db_schema()  # Быстрый путь: один SELECT версии схемы, никакого DDL
+    # none: схему уже подготовил процесс, который запустил воркеры (src/server.py), и DDL не гоняет каждый воркер
+    await warm_up_pools(settings.db_pool_warmup)
+    app.state.ready = True  # С этого момента /internal/health/ready отвечает 200 и балансировщик шлет трафик
     yield
     # Запускается при остановке приложения
-    await delete_db_and_tables()
+    app.state.ready = False
+    await close_books_insert_batcher()  # Дописываем книги, которые еще стоят в очереди
+    if settings.db_schema_mode == "create_drop":
+        await delete_db_and_tables()
+    await global_dispose()  # Запросы к этому моменту уже завершены: сервер дождался их перед остановкой
 
 
 # Само приложение fastApi. именно оно запускается сервером и служит точкой входа
@@ -25,7 +48,7 @@ def create_application():
         description="Учебное приложение для группы MTS Shad",
         version="0.0.1",
         responses={404: {"description": "Not Found!"}},
-        default_response_class=ORJSONResponse,  # Подключаем быстрый сериализатор,
+        default_response_class=TimedORJSONResponse,  # Подключаем быстрый сериализатор (с замером времени)
         lifespan=lifespan,
     )
 
@@ -35,6 +58,13 @@ app = create_application()
 
 def _configure():
     app.include_router(v1_router)
+    app.include_router(internal_router)
+    # Ограничители перед роутерами: при перегрузке лишние запросы быстро получают 429/503 вместо долгого ожидания пула
+    app.add_middleware(
+        AdmissionMiddleware, rate_limiter=get_rate_limiter(), concurrency_limiter=get_concurrency_limiter()
+    )
+    # Замеры времени каждого запроса: метрики для /internal/metrics и заголовок Server-Timing
+    app.add_middleware(TimingMiddleware, server_timing=settings.server_timing)
 
 
 # @app.on_event("startup")  # Вместо этого теперь рекомендуется lifespan
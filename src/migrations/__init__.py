@@ -0,0 +1,17 @@
+"""
+Версионные миграции схемы БД.
+
+Каждая миграция - это набор SQL выражений с номером версии (см. versions.py).
+Номер последней примененной версии хранится в таблице schema_version.
+Приложение при старте только сверяет этот номер (один быстрый SELECT),
+а сами миграции запускаются отдельно, до выкатки:
+
+    python -m src.migrations upgrade
+
+Секционирование books_table - не миграция, а отдельная перестройка по настройкам (см. partitioning.py).
+"""
+
+from .partitioning import *  # noqa F403
+from .runner import *  # noqa F403
+
+__all__ = runner.__all__ + partitioning.__all__  # noqa F405
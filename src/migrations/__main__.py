@@ -0,0 +1,62 @@
+"""
+Командная строка для миграций:
+
+    python -m src.migrations upgrade [--target N]   # применить недостающие миграции
+    python -m src.migrations current                # показать текущую версию схемы
+    python -m src.migrations check                  # код возврата 1, если схема устарела
+    python -m src.migrations partition              # перестроить books_table под DB_PARTITIONING
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+
+from .partitioning import repartition
+from .runner import SchemaVersionError, check_schema_version, current_version, latest_version, upgrade
+
+
+async def run(command: str, target: int | None) -> int:
+    engine = create_async_engine(settings.database_url, poolclass=NullPool)
+    try:
+        if command == "upgrade":
+            applied = await upgrade(engine, target)
+            print(f"Applied migrations: {applied or 'none'}")
+        elif command == "partition":
+            # Модель читаем только здесь: остальным командам миграций модели не нужны
+            from src.models.books import BOOK_ID_SEQUENCE, Book
+
+            await check_schema_version(engine)
+            print(f"Copied rows: {await repartition(engine, Book.__table__, BOOK_ID_SEQUENCE)}")
+        elif command == "current":
+            async with engine.connect() as connection:
+                print(f"Current version: {await current_version(connection)}, latest: {latest_version()}")
+        else:
+            try:
+                await check_schema_version(engine)
+            except SchemaVersionError as e:
+                print(e, file=sys.stderr)
+                return 1
+            print("Schema is up to date")
+    finally:
+        await engine.dispose()
+    return 0
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m src.migrations")
+    parser.add_argument("command", choices=["upgrade", "current", "check", "partition"])
+    parser.add_argument("--target", type=int, default=None, help="До какой версии применить миграции")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.command, args.target)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Перестройка существующей таблицы под секционирование из настроек (DB_PARTITIONING).
+
+PostgreSQL не умеет превращать обычную таблицу в секционированную (и менять схему секционирования) на месте,
+поэтому таблица пересоздается по модели и данные переливаются одним INSERT ... SELECT:
+
+1. старая таблица, ее секции и индексы переименовываются с суффиксом _old;
+2. новая таблица со всеми секциями и индексами создается по модели (как в create_all);
+3. строки копируются, последовательность id продолжается с максимального id, старая таблица удаляется.
+
+Все это - одна транзакция, и на время копирования таблица заблокирована даже для чтения.
+На большом каталоге перестройку запускают в окно обслуживания:
+
+    python -m src.migrations partition
+"""
+
+import logging
+
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from .runner import MIGRATIONS_LOCK_ID
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["repartition"]
+
+OLD_SUFFIX = "_old"
+
+
+async def _child_tables(connection: AsyncConnection, table_name: str) -> list[str]:
+    res = await connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table_name AS regclass)"
+        ),
+        {"table_name": table_name},
+    )
+    return list(res.scalars())
+
+
+async def _indexes(connection: AsyncConnection, table_name: str) -> list[str]:
+    res = await connection.execute(
+        text(
+            "SELECT c.relname FROM pg_index AS i JOIN pg_class AS c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = CAST(:table_name AS regclass)"
+        ),
+        {"table_name": table_name},
+    )
+    return list(res.scalars())
+
+
+async def _sequence_exists(connection: AsyncConnection, name: str) -> bool:
+    return await connection.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+
+
+async def _rename_old(connection: AsyncConnection, table_name: str) -> None:
+    # Сначала секции и индексы: новые объекты получат те же имена
+    for name in [table_name, *await _child_tables(connection, table_name)]:
+        for index_name in await _indexes(connection, name):
+            await connection.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}{OLD_SUFFIX}"))
+        if name != table_name:
+            await connection.execute(text(f"ALTER TABLE {name} RENAME TO {name}{OLD_SUFFIX}"))
+    await connection.execute(text(f"ALTER TABLE {table_name} RENAME TO {table_name}{OLD_SUFFIX}"))
+
+
+async def repartition(engine: AsyncEngine, table: Table, sequence_name: str | None = None) -> int:
+    """
+    Пересоздает таблицу по ее описанию в модели и переносит в нее все строки. Возвращает число перенесенных строк.
+
+    sequence_name - последовательность id: она переживает пересоздание таблицы и продолжается с максимального id.
+    """
+    async with engine.begin() as connection:
+        # Тот же замок, что и у миграций: перестройка не должна идти одновременно с ними
+        await connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+        await connection.execute(text(f"LOCK TABLE {table.name} IN ACCESS EXCLUSIVE MODE"))
+
+        has_sequence = sequence_name is not None and await _sequence_exists(connection, sequence_name)
+        if has_sequence:
+            # Иначе последовательность удалится вместе со старой таблицей (ее создавал SERIAL)
+            await connection.execute(text(f"ALTER SEQUENCE {sequence_name} OWNED BY NONE"))
+
+        await _rename_old(connection, table.name)
+        logger.info("Creating %s (partitioning: %s)", table.name, table.dialect_options["postgresql"]["partition_by"])
+        # checkfirst: последовательность уже есть, а таблицы с этим именем после переименования нет
+        await connection.run_sync(table.create, checkfirst=True)
+
+        columns = ", ".join(column.name for column in table.columns)
+        # Строки не новые: триггеры новой таблицы (например, сводная статистика) не должны учесть их второй раз
+        await connection.execute(text(f"ALTER TABLE {table.name} DISABLE TRIGGER USER"))
+        res = await connection.execute(
+            text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}{OLD_SUFFIX}")
+        )
+        await connection.execute(text(f"ALTER TABLE {table.name} ENABLE TRIGGER USER"))
+        logger.info("Copied %s rows", res.rowcount)
+        await connection.execute(text(f"DROP TABLE {table.name}{OLD_SUFFIX}"))
+
+        if sequence_name is not None and await _sequence_exists(connection, sequence_name):
+            await connection.execute(
+                text(f"SELECT setval('{sequence_name}', coalesce(max(id), 0) + 1, false) FROM {table.name}")
+            )
+            await connection.execute(text(f"ALTER SEQUENCE {sequence_name} OWNED BY {table.name}.id"))
+
+        await connection.execute(text(f"ANALYZE {table.name}"))
+    return res.rowcount
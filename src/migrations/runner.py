@@ -0,0 +1,113 @@
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "Migration",
+    "MigrationStep",
+    "SchemaVersionError",
+    "current_version",
+    "latest_version",
+    "upgrade",
+    "check_schema_version",
+]
+
+# Ключ advisory lock: два процесса не должны применять миграции одновременно
+MIGRATIONS_LOCK_ID = 7_340_001
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+# Шаг миграции: SQL или функция, которая сама решает, что выполнить (например, смотря на то, какая таблица в БД)
+MigrationStep = str | Callable[[AsyncConnection], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: tuple[MigrationStep, ...]
+    transactional: bool = True
+
+
+def _migrations() -> list[Migration]:
+    from .versions import MIGRATIONS
+
+    return MIGRATIONS
+
+
+def latest_version() -> int:
+    return max(migration.version for migration in _migrations())
+
+
+async def _ensure_version_table(connection: AsyncConnection) -> None:
+    await connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """
+        )
+    )
+
+
+async def current_version(connection: AsyncConnection) -> int:
+    """Номер последней примененной миграции. 0 - если миграций еще не было."""
+    if not await connection.run_sync(lambda sync_conn: sync_conn.dialect.has_table(sync_conn, "schema_version")):
+        return 0
+    return (await connection.execute(text("SELECT coalesce(max(version), 0) FROM schema_version"))).scalar_one()
+
+
+async def check_schema_version(engine: AsyncEngine) -> int:
+    """Быстрая проверка при старте приложения: схема БД должна быть последней версии."""
+    async with engine.connect() as connection:
+        version = await current_version(connection)
+
+    if version != latest_version():
+        raise SchemaVersionError(
+            f"Database schema version is {version}, expected {latest_version()}. Run `python -m src.migrations upgrade`."
+        )
+    return version
+
+
+async def upgrade(engine: AsyncEngine, target: int | None = None) -> list[int]:
+    """Применяет недостающие миграции (до target включительно). Возвращает номера примененных."""
+    applied: list[int] = []
+    autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    async with autocommit_engine.connect() as lock_connection:
+        await lock_connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+        try:
+            await _ensure_version_table(lock_connection)
+            version = await current_version(lock_connection)
+
+            for migration in sorted(_migrations(), key=lambda m: m.version):
+                if migration.version <= version or (target is not None and migration.version > target):
+                    continue
+
+                logger.info("Applying migration %s: %s", migration.version, migration.description)
+                async with engine.begin() if migration.transactional else autocommit_engine.connect() as connection:
+                    for statement in migration.statements:
+                        if callable(statement):
+                            await statement(connection)
+                        else:
+                            await connection.execute(text(statement))
+                    await connection.execute(
+                        text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                        {"version": migration.version, "description": migration.description},
+                    )
+                applied.append(migration.version)
+        finally:
+            await lock_connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+
+    return applied
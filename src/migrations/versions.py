@@ -0,0 +1,143 @@
+"""
+Список миграций. Новые миграции добавляются только в конец, примененные не меняются.
+
+Индексы на больших таблицах создаем через CREATE INDEX CONCURRENTLY: он не блокирует запись,
+но не может выполняться в транзакции, поэтому такие миграции помечены transactional=False.
+Секционированные таблицы его не поддерживают - на них индекс строится обычным CREATE INDEX.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.models.stats import BOOK_STATS_TRIGGER_STATEMENTS
+
+from .runner import Migration, MigrationStep
+
+__all__ = ["MIGRATIONS"]
+
+
+def create_index_concurrently(name: str, table: str, definition: str) -> MigrationStep:
+    async def create(connection: AsyncConnection) -> None:
+        relkind = await connection.scalar(
+            text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+        )
+        if relkind == "p":
+            # Секционированная таблица (create_all с DB_PARTITIONING) не умеет индексы CONCURRENTLY.
+            # Индексы там уже созданы вместе с таблицей, а если какого-то нет - строим обычным CREATE INDEX,
+            # который на это время блокирует запись
+            await connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"))
+            return
+
+        # Если прошлый запуск упал посреди CREATE INDEX CONCURRENTLY, остается невалидный индекс.
+        # Миграция тогда не записана как примененная, поэтому индекс можно спокойно пересоздать.
+        await connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        await connection.execute(text(f"CREATE INDEX CONCURRENTLY {name} ON {table} {definition}"))
+
+    return create
+
+
+MIGRATIONS = [
+    Migration(
+        version=1,
+        description="Create books_table",
+        # IF NOT EXISTS - чтобы подхватить базы, созданные еще через create_all
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS books_table (
+                id SERIAL PRIMARY KEY,
+                title VARCHAR(50) NOT NULL,
+                author VARCHAR(100) NOT NULL,
+                year INTEGER NOT NULL,
+                count_pages INTEGER NOT NULL
+            )
+            """,
+        ),
+    ),
+    Migration(
+        version=2,
+        description="Indexes for filtering and sorting books",
+        transactional=False,
+        statements=(
+            create_index_concurrently("ix_books_table_author_id", "books_table", "(author, id)"),
+            create_index_concurrently("ix_books_table_author_pattern", "books_table", "(author varchar_pattern_ops)"),
+            create_index_concurrently("ix_books_table_title_id", "books_table", "(title, id)"),
+            create_index_concurrently("ix_books_table_year_id", "books_table", "(year, id)"),
+            create_index_concurrently("ix_books_table_count_pages_id", "books_table", "(count_pages, id)"),
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Full-text search index over title and author",
+        transactional=False,
+        statements=(
+            create_index_concurrently(
+                "ix_books_table_search", "books_table", "USING gin (to_tsvector('simple', title || ' ' || author))"
+            ),
+        ),
+    ),
+    Migration(
+        version=4,
+        description="Book version for ETags and optimistic concurrency",
+        # Начиная с PostgreSQL 11 колонка с константным DEFAULT добавляется без переписывания таблицы
+        statements=("ALTER TABLE books_table ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",),
+    ),
+    Migration(
+        version=5,
+        description="64-bit book ids and a cached id sequence",
+        # Смена типа переписывает таблицу и ее индексы под эксклюзивной блокировкой.
+        # На большом каталоге миграцию запускают в окно обслуживания.
+        # В базе из create_all id уже BIGINT, и смена типа пропускается: при секционировании по хэшу
+        # id - ключ секций, и ALTER на нем запрещен
+        statements=(
+            """
+            DO $$
+            BEGIN
+                IF (SELECT atttypid FROM pg_attribute WHERE attrelid = 'books_table'::regclass AND attname = 'id')
+                    <> 'bigint'::regtype THEN
+                    ALTER TABLE books_table ALTER COLUMN id TYPE BIGINT;
+                END IF;
+            END
+            $$
+            """,
+            "ALTER SEQUENCE books_table_id_seq AS BIGINT CACHE 50",
+        ),
+    ),
+    Migration(
+        version=6,
+        description="Book statistics by author and year, maintained by triggers",
+        # Функцию и триггеры берем из модели. Их выражения можно выполнять повторно, поэтому при изменении
+        # SQL в модели новая миграция просто применяет его еще раз.
+        # Первое наполнение - один GROUP BY по всей таблице, запись в books_table на это время заблокирована.
+        # IF NOT EXISTS и TRUNCATE перед наполнением - чтобы подхватить базы из create_all: там таблицы
+        # статистики уже есть и триггеры уже что-то в них насчитали
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS book_author_stats (
+                author VARCHAR(100) PRIMARY KEY,
+                books BIGINT NOT NULL,
+                pages BIGINT NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_book_author_stats_books ON book_author_stats (books DESC, author)",
+            """
+            CREATE TABLE IF NOT EXISTS book_year_stats (
+                year INTEGER PRIMARY KEY,
+                books BIGINT NOT NULL,
+                pages BIGINT NOT NULL
+            )
+            """,
+            "LOCK TABLE books_table IN SHARE MODE",
+            *BOOK_STATS_TRIGGER_STATEMENTS,
+            "TRUNCATE book_author_stats, book_year_stats",
+            "INSERT INTO book_author_stats SELECT author, count(*), sum(count_pages) FROM books_table GROUP BY author",
+            "INSERT INTO book_year_stats SELECT year, count(*), sum(count_pages) FROM books_table GROUP BY year",
+        ),
+    ),
+    Migration(
+        version=7,
+        description="Fold book statistics into the totals at commit",
+        # Триггеры из модели теперь пишут изменения в служебные таблицы, а в суммы их переносят при коммите.
+        # Суммы не меняются, их пересчитывать не нужно
+        statements=BOOK_STATS_TRIGGER_STATEMENTS,
+    ),
+]
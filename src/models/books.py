@@ -1,14 +1,99 @@
-from sqlalchemy import String
+from dataclasses import dataclass
+
+from sqlalchemy import DDL, Index, String, event, func, literal_column, text
 from sqlalchemy.orm import Mapped, mapped_column
 
+from src.configurations.settings import settings
+
 from .base import BaseModel
+from .ids import SnowflakeGenerator, id_column
+from .partitioning import partition_table
+from .stats import BOOK_STATS_TRIGGER_STATEMENTS
+
+BOOK_ID_SEQUENCE = "books_table_id_seq"
+
+# Генератор id книг при стратегии snowflake. None - id выдает последовательность БД (см. ids.py)
+book_id_generator = (
+    SnowflakeGenerator(settings.db_snowflake_worker_id) if settings.db_id_strategy == "snowflake" else None
+)
 
 
 class Book(BaseModel):
     __tablename__ = "books_table"
+    # Индексы под фильтры и сортировки списка книг. id в конце составных индексов
+    # нужен для пагинации по ключу: (колонка, id) однозначно задает порядок строк.
+    __table_args__ = (
+        Index("ix_books_table_author_id", "author", "id"),
+        # Отдельный индекс для поиска по префиксу (LIKE 'abc%'): обычный B-tree для этого не годится,
+        # если у БД не C-локаль.
+        Index("ix_books_table_author_pattern", "author", postgresql_ops={"author": "varchar_pattern_ops"}),
+        Index("ix_books_table_title_id", "title", "id"),
+        Index("ix_books_table_year_id", "year", "id"),
+        Index("ix_books_table_count_pages_id", "count_pages", "id"),
+        # GIN индекс для полнотекстового поиска (см. book_search_vector ниже). Есть только в PostgreSQL.
+        Index(
+            "ix_books_table_search",
+            text("to_tsvector('simple', title || ' ' || author)"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = id_column(BOOK_ID_SEQUENCE, book_id_generator)
     title: Mapped[str] = mapped_column(String(50), nullable=False)
     author: Mapped[str] = mapped_column(String(100), nullable=False)
     year: Mapped[int]
     count_pages: Mapped[int]
+    # Номер версии книги. Растет при каждом изменении, на нем построены ETag и If-Match.
+    version: Mapped[int] = mapped_column(default=1, server_default=text("1"))
+
+
+partition_table(
+    Book.__table__,
+    settings.db_partitioning,
+    count=settings.db_partition_count,
+    year_step=settings.db_partition_year_step,
+)
+
+# SQLAlchemy берет id из последовательности сам, а этот DEFAULT - для INSERT в обход моделей (импорт через COPY).
+# Так таблица из create_all совпадает с таблицей из миграций
+if book_id_generator is None:
+    event.listen(
+        Book.__table__,
+        "after_create",
+        DDL(f"ALTER TABLE %(fullname)s ALTER COLUMN id SET DEFAULT nextval('{BOOK_ID_SEQUENCE}')").execute_if(
+            dialect="postgresql"
+        ),
+    )
+
+
+# Сводную статистику (src/models/stats.py) держат в актуальном состоянии триггеры этой таблицы
+@event.listens_for(Book.__table__, "after_create")
+def _create_stats_triggers(target, connection, **kw) -> None:
+    if connection.dialect.name == "postgresql":
+        for statement in BOOK_STATS_TRIGGER_STATEMENTS:
+            connection.execute(text(statement))
+
+
+# Поисковый вектор по названию и автору. Конфигурация "simple" не привязана к языку:
+# в каталоге есть книги и на русском, и на английском.
+# Выражение должно совпадать с выражением индекса ix_books_table_search, иначе индекс не сработает.
+# Поэтому константы вставлены литералами, а не параметрами запроса.
+book_search_vector = func.to_tsvector(
+    literal_column("'simple'"), Book.title.concat(literal_column("' '")).concat(Book.author)
+)
+
+
+# Легкая запись о книге для чтения. Без identity map, отслеживания изменений и валидации:
+# строку из БД кладем в слоты как есть, а orjson сериализует dataclass напрямую.
+# Порядок полей совпадает с ReturnedBook, поэтому и JSON получается тот же.
+@dataclass(slots=True)
+class BookRecord:
+    title: str
+    author: str
+    year: int
+    id: int
+    count_pages: int
+
+
+# Колонки, из которых собирается BookRecord: select(*BOOK_RECORD_COLUMNS), затем BookRecord(*row)
+BOOK_RECORD_COLUMNS = (Book.title, Book.author, Book.year, Book.id, Book.count_pages)
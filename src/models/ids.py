@@ -0,0 +1,71 @@
+"""
+Стратегии выдачи id книг.
+
+sequence - последовательность PostgreSQL с кэшем: каждое соединение берет из нее сразу ID_SEQUENCE_CACHE номеров
+и раздает их без обращения к общей последовательности. Под большим потоком вставок последовательность
+перестает быть узким местом. Цена - дыры в нумерации и то, что id из разных соединений не идут по порядку вставки.
+
+snowflake - id генерирует само приложение (схема Twitter Snowflake), БД вообще не участвует:
+
+    | 41 бит: миллисекунды от SNOWFLAKE_EPOCH | 10 бит: номер воркера | 12 бит: номер внутри миллисекунды |
+
+Id растут со временем и уникальны, пока у одновременно работающих процессов разные номера воркеров.
+Они больше 2**53, поэтому клиенты на JavaScript должны читать их как BigInt (обычный Number округлит id).
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import BigInteger, Integer, Sequence
+from sqlalchemy.orm import MappedColumn, mapped_column
+
+__all__ = ["ID_SEQUENCE_CACHE", "SNOWFLAKE_EPOCH", "SnowflakeGenerator", "id_column"]
+
+ID_SEQUENCE_CACHE = 50
+
+SNOWFLAKE_EPOCH = 1_704_067_200_000  # 2024-01-01 00:00:00 UTC в миллисекундах
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# BIGINT в PostgreSQL, а в SQLite - INTEGER: только он там автоинкрементный (rowid)
+ID_TYPE = BigInteger().with_variant(Integer(), "sqlite")
+
+
+class SnowflakeGenerator:
+    def __init__(self, worker_id: int | None = None, clock=time.time):
+        if worker_id is None:
+            # Без явного номера различаем воркеры по pid. На нескольких серверах номер нужно задавать явно
+            worker_id = os.getpid() & MAX_WORKER_ID
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Snowflake worker id must be between 0 and {MAX_WORKER_ID}")
+
+        self.worker_id = worker_id
+        self._clock = clock
+        self._last_timestamp = -1
+        self._sequence = 0
+        self._lock = threading.Lock()  # Генератор зовут и из потоков (например, при импорте)
+
+    def __call__(self) -> int:
+        with self._lock:
+            timestamp = max(int(self._clock() * 1000) - SNOWFLAKE_EPOCH, self._last_timestamp)
+            if timestamp == self._last_timestamp:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Номера в этой миллисекунде кончились. Вместо ожидания занимаем следующую миллисекунду:
+                    # часы догонят ее сами. Так же переживаем и перевод часов назад
+                    timestamp += 1
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+
+            return (timestamp << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+
+def id_column(sequence_name: str, generator: SnowflakeGenerator | None) -> MappedColumn:
+    """Колонка первичного ключа: id из генератора приложения или (generator=None) из последовательности с кэшем."""
+    if generator is not None:
+        return mapped_column(ID_TYPE, primary_key=True, autoincrement=False, default=generator)
+    return mapped_column(ID_TYPE, Sequence(sequence_name, cache=ID_SEQUENCE_CACHE), primary_key=True)
@@ -0,0 +1,71 @@
+"""
+Декларативное секционирование таблиц PostgreSQL (PARTITION BY) через модели.
+
+Таблица и все ее секции создаются обычным create_all: секции - DDL после CREATE TABLE.
+Индексы, объявленные на таблице, PostgreSQL сам создает в каждой секции.
+
+- year - по диапазонам года: секции по year_step лет от year_from до year_to и секция DEFAULT для остальных.
+  Запросы с фильтром по году читают только нужные секции (partition pruning).
+  Первичный ключ секционированной таблицы обязан содержать ключ секционирования, поэтому он становится (id, year).
+  Поиск по одному id в этом режиме проверяет индексы всех секций.
+- hash - по хэшу id на count секций. Секции одного размера, поиск по id читает одну секцию,
+  но фильтры по другим колонкам проходят по всем секциям.
+
+Секции уменьшают то, с чем работают VACUUM и перестроение индексов, и позволяют обслуживать таблицу по частям.
+На других БД (SQLite) секционирование не применяется.
+"""
+
+from typing import Literal
+
+from sqlalchemy import DDL, PrimaryKeyConstraint, Table, event
+
+__all__ = ["PartitionScheme", "partition_table", "partition_names"]
+
+PartitionScheme = Literal["none", "year", "hash"]
+
+
+def _partition_bounds(
+    table: Table, scheme: PartitionScheme, count: int, year_step: int, year_from: int, year_to: int
+) -> list[tuple[str, str]]:
+    if scheme == "hash":
+        return [(f"{table.name}_p{i}", f"FOR VALUES WITH (MODULUS {count}, REMAINDER {i})") for i in range(count)]
+
+    bounds = [
+        (f"{table.name}_y{start}", f"FOR VALUES FROM ({start}) TO ({start + year_step})")
+        for start in range(year_from, year_to, year_step)
+    ]
+    return bounds + [(f"{table.name}_default", "DEFAULT")]
+
+
+def partition_names(table: Table) -> list[str]:
+    """Имена секций, которые будут созданы вместе с таблицей."""
+    return [name for name, _ in table.info.get("partitions", [])]
+
+
+def partition_table(
+    table: Table,
+    scheme: PartitionScheme,
+    count: int = 16,
+    year_step: int = 10,
+    year_from: int = 1900,
+    year_to: int = 2100,
+) -> None:
+    """Делает таблицу секционированной. Вызывается один раз, до создания таблицы в БД."""
+    if scheme == "none":
+        return
+
+    if scheme == "year":
+        # Колонку помечаем до замены ключа, иначе SQLAlchemy предупредит о расхождении primary_key у колонок.
+        # Маппер модели уже построен и по-прежнему считает ключом только id
+        table.c.year.primary_key = True
+        table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.year, name=table.primary_key.name))
+        table.dialect_options["postgresql"]["partition_by"] = "RANGE (year)"
+    else:
+        table.dialect_options["postgresql"]["partition_by"] = "HASH (id)"
+
+    partitions = _partition_bounds(table, scheme, count, year_step, year_from, year_to)
+    table.info["partitions"] = partitions
+    prefix = f"{table.schema}." if table.schema else ""
+    for name, bound in partitions:
+        ddl = DDL(f"CREATE TABLE {prefix}{name} PARTITION OF %(fullname)s {bound}")
+        event.listen(table, "after_create", ddl.execute_if(dialect="postgresql"))
@@ -0,0 +1,151 @@
+"""
+Сводная статистика каталога: число книг и страниц по авторам и по годам.
+
+Таблицы обновляются триггерами на books_table (только PostgreSQL), поэтому статистику меняет любая запись:
+ручки API, пакетная запись, импорт через COPY и ручные правки в psql.
+Триггеры срабатывают раз на выражение (FOR EACH STATEMENT) и видят все измененные строки разом
+(transition tables), так что массовый INSERT записывает изменения каждого автора и года одной строкой, а не построчно.
+
+Выражение не трогает общие строки статистики: изменения копятся в book_stats_deltas под номером транзакции.
+В book_author_stats и book_year_stats их переносит отложенный триггер при COMMIT, одним шагом на транзакцию:
+сначала все авторы по порядку, затем все годы по порядку. Так строка горячего года заблокирована только на время
+коммита, а не на всю пишущую транзакцию (потоковый /bulk, импорт), и у транзакций один порядок блокировок,
+сколько бы выражений они ни выполнили, - намертво друг друга они не заблокируют.
+Пока транзакция не закончилась, ее изменения видит только она сама (см. src/services/stats.py).
+
+Если статистика разошлась с таблицей (например, триггеры отключали), ее пересобирает
+python -m src.services.stats rebuild
+"""
+
+from sqlalchemy import BigInteger, Index, String, column, table, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import BaseModel
+
+__all__ = ["BookAuthorStats", "BookYearStats", "book_stats_deltas", "BOOK_STATS_TRIGGER_STATEMENTS"]
+
+
+class BookAuthorStats(BaseModel):
+    __tablename__ = "book_author_stats"
+    # Для "топа" авторов: сортировка по числу книг без сортировки всей таблицы
+    __table_args__ = (Index("ix_book_author_stats_books", text("books DESC"), "author"),)
+
+    author: Mapped[str] = mapped_column(String(100), primary_key=True)
+    books: Mapped[int] = mapped_column(BigInteger)
+    pages: Mapped[int] = mapped_column(BigInteger)
+
+
+class BookYearStats(BaseModel):
+    __tablename__ = "book_year_stats"
+
+    year: Mapped[int] = mapped_column(primary_key=True)
+    books: Mapped[int] = mapped_column(BigInteger)
+    pages: Mapped[int] = mapped_column(BigInteger)
+
+
+# Изменения статистики, которые еще не перенесены в таблицы выше: строки (транзакция, автор, год, +-книги, +-страницы).
+# Таблица служебная и живет вместе с триггерами (см. BOOK_STATS_TRIGGER_STATEMENTS), поэтому здесь только описание
+# для запросов, а не модель
+book_stats_deltas = table(
+    "book_stats_deltas", column("txid"), column("author"), column("year"), column("books"), column("pages")
+)
+
+# Изменения (автор, год, +-1 книга, +-страницы): при UPDATE старая строка вычитается, новая прибавляется
+_ADDED = "SELECT author, year, 1 AS books, count_pages AS pages FROM new_rows"
+_REMOVED = "SELECT author, year, -1 AS books, -count_pages AS pages FROM old_rows"
+
+# Выражение дописывает свои изменения и отмечает транзакцию в book_stats_pending. Общих строк оно не блокирует:
+# в обе таблицы пишет только эта транзакция (ключ - ее номер).
+# Группы, где ничего не поменялось (например, изменилось только название), пропускаются.
+_RECORD_CHANGES = """
+            INSERT INTO book_stats_deltas (author, year, books, pages)
+            SELECT author, year, sum(books), sum(pages) FROM ({changes}) AS changes GROUP BY author, year
+            HAVING sum(books) <> 0 OR sum(pages) <> 0;
+            IF FOUND THEN
+                INSERT INTO book_stats_pending (txid) VALUES (txid_current()) ON CONFLICT DO NOTHING;
+            END IF;"""
+
+# Перенос изменений транзакции при COMMIT. Каждая таблица - отдельным выражением и в порядке ключа:
+# так все транзакции берут блокировки в одном порядке.
+# Авторы и годы, у которых не осталось книг, удаляются после: внутри одного запроса DELETE не увидел бы
+# только что обновленные строки
+_FOLD_CHANGES = """
+            INSERT INTO book_author_stats AS s (author, books, pages)
+            SELECT author, sum(books), sum(pages) FROM book_stats_deltas WHERE txid = NEW.txid GROUP BY author
+            HAVING sum(books) <> 0 OR sum(pages) <> 0 ORDER BY author
+            ON CONFLICT (author) DO UPDATE SET books = s.books + excluded.books, pages = s.pages + excluded.pages;
+            INSERT INTO book_year_stats AS s (year, books, pages)
+            SELECT year, sum(books), sum(pages) FROM book_stats_deltas WHERE txid = NEW.txid GROUP BY year
+            HAVING sum(books) <> 0 OR sum(pages) <> 0 ORDER BY year
+            ON CONFLICT (year) DO UPDATE SET books = s.books + excluded.books, pages = s.pages + excluded.pages;
+            DELETE FROM book_author_stats
+            WHERE books = 0 AND author IN (SELECT author FROM book_stats_deltas WHERE txid = NEW.txid);
+            DELETE FROM book_year_stats
+            WHERE books = 0 AND year IN (SELECT year FROM book_stats_deltas WHERE txid = NEW.txid);
+            DELETE FROM book_stats_deltas WHERE txid = NEW.txid;
+            DELETE FROM book_stats_pending WHERE txid = NEW.txid;"""
+
+# Служебные таблицы, функции и триггеры. Запросы в функциях статические, а не EXECUTE: PL/pgSQL кэширует их планы,
+# и триггер на вставке одной книги стоит десятые доли миллисекунды.
+# Все выражения можно выполнять повторно: ими же миграции обновляют триггеры в существующей БД.
+# Триггеры вешает на books_table сама модель Book (src/models/books.py), поэтому этот модуль книги не импортирует.
+BOOK_STATS_TRIGGER_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS book_stats_deltas (
+        txid BIGINT NOT NULL DEFAULT txid_current(),
+        author VARCHAR(100) NOT NULL,
+        year INTEGER NOT NULL,
+        books BIGINT NOT NULL,
+        pages BIGINT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_book_stats_deltas_txid ON book_stats_deltas (txid)",
+    "CREATE TABLE IF NOT EXISTS book_stats_pending (txid BIGINT PRIMARY KEY)",
+    f"""
+    CREATE OR REPLACE FUNCTION books_stats_maintain() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            -- Чужих изменений здесь нет: пишущие транзакции переносят их до конца коммита, а TRUNCATE ждет их.
+            -- Отметку транзакции не трогаем (TRUNCATE не дала бы: у нее отложенный триггер), перенос будет пустым
+            TRUNCATE book_author_stats, book_year_stats;
+            DELETE FROM book_stats_deltas WHERE txid = txid_current();
+        ELSIF TG_OP = 'INSERT' THEN{_RECORD_CHANGES.format(changes=_ADDED)}
+        ELSIF TG_OP = 'DELETE' THEN{_RECORD_CHANGES.format(changes=_REMOVED)}
+        ELSE{_RECORD_CHANGES.format(changes=f"{_ADDED} UNION ALL {_REMOVED}")}
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION books_stats_fold() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN{_FOLD_CHANGES}
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS books_stats_insert ON books_table",
+    "DROP TRIGGER IF EXISTS books_stats_update ON books_table",
+    "DROP TRIGGER IF EXISTS books_stats_delete ON books_table",
+    "DROP TRIGGER IF EXISTS books_stats_truncate ON books_table",
+    "DROP TRIGGER IF EXISTS books_stats_fold ON book_stats_pending",
+    """
+    CREATE TRIGGER books_stats_insert AFTER INSERT ON books_table
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_stats_maintain()
+    """,
+    """
+    CREATE TRIGGER books_stats_update AFTER UPDATE ON books_table
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_stats_maintain()
+    """,
+    """
+    CREATE TRIGGER books_stats_delete AFTER DELETE ON books_table
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION books_stats_maintain()
+    """,
+    "CREATE TRIGGER books_stats_truncate AFTER TRUNCATE ON books_table FOR EACH STATEMENT "
+    "EXECUTE FUNCTION books_stats_maintain()",
+    # Отметка транзакции вставляется один раз, поэтому перенос срабатывает один раз на транзакцию
+    """
+    CREATE CONSTRAINT TRIGGER books_stats_fold AFTER INSERT ON book_stats_pending
+    DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION books_stats_fold()
+    """,
+)
@@ -0,0 +1,6 @@
+from .pool import *  # noqa F403
+from .prometheus import *  # noqa F403
+from .queries import *  # noqa F403
+from .requests import *  # noqa F403
+
+__all__ = pool.__all__ + prometheus.__all__ + queries.__all__ + requests.__all__  # noqa F405
@@ -0,0 +1,85 @@
+"""
+Метрики пула соединений с БД.
+
+Стандартный пул SQLAlchemy умеет сказать, сколько соединений выдано прямо сейчас,
+но не показывает, сколько корутин стоят в очереди за соединением и как долго они ждут.
+Именно по этим цифрам видно, что пул пора увеличивать (или что БД не успевает).
+"""
+
+import time
+from bisect import bisect_left
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+__all__ = ["format_bound", "Histogram", "PoolMetrics", "InstrumentedAsyncQueuePool"]
+
+# Границы корзин гистограммы в секундах (как у prometheus-клиента)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами. Хранит только счетчики, поэтому не растет со временем."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - "+Inf"
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """Накопленные значения по корзинам: [(верхняя граница, сколько наблюдений не больше нее), ...]."""
+        result, total = [], 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": [{"le": format_bound(bound), "count": count} for bound, count in self.cumulative()],
+        }
+
+
+def format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.waiting = 0  # Сколько корутин прямо сейчас ждут соединение
+        self.timeouts = 0  # Сколько раз соединение так и не дождались (pool_timeout)
+        self.checkout_latency = Histogram()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Асинхронный QueuePool, который считает ожидающих и время получения соединения."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        self.metrics.waiting += 1
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.waiting -= 1
+            self.metrics.checkout_latency.observe(time.perf_counter() - started_at)
+
+    def recreate(self):
+        # engine.dispose() пересоздает пул. Метрики переносим, чтобы счетчики не обнулялись.
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
@@ -0,0 +1,95 @@
+"""Метрики в текстовом формате Prometheus (exposition format 0.0.4), без сторонних библиотек."""
+
+from typing import Iterable
+
+from .pool import Histogram, format_bound
+from .queries import QueryMetrics
+from .requests import RequestMetrics
+
+__all__ = ["PROMETHEUS_CONTENT_TYPE", "render_prometheus"]
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _header(name: str, metric_type: str, description: str) -> list[str]:
+    return [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+
+
+def _histogram(name: str, histogram: Histogram, labels: dict[str, str]) -> Iterable[str]:
+    for bound, count in histogram.cumulative():
+        yield f"{name}_bucket{_labels({**labels, 'le': format_bound(bound)})} {count}"
+    yield f"{name}_sum{_labels(labels)} {histogram.sum}"
+    yield f"{name}_count{_labels(labels)} {histogram.count}"
+
+
+def render_prometheus(requests: RequestMetrics, queries: QueryMetrics, pool: dict | None = None) -> str:
+    """Собирает все метрики в одну страницу. pool - результат get_pool_status() (None, если БД не готова)."""
+    lines: list[str] = []
+    routes = sorted(requests.routes.items())
+
+    lines += _header("http_requests_total", "counter", "HTTP responses by route and status code.")
+    for (method, route), metrics in routes:
+        for status_code, count in sorted(metrics.responses.items()):
+            lines.append(
+                f"http_requests_total{_labels({'method': method, 'route': route, 'status': str(status_code)})} {count}"
+            )
+
+    histograms = (
+        ("http_request_duration_seconds", "duration", "Full request time, including sending the body."),
+        ("http_request_handler_seconds", "handler", "Request time spent outside the database and serialization."),
+        ("http_request_db_seconds", "db", "Time spent in database queries per request."),
+        ("http_request_serialization_seconds", "serialization", "Time spent serializing the response."),
+    )
+    for name, attribute, description in histograms:
+        lines += _header(name, "histogram", description)
+        for (method, route), metrics in routes:
+            lines += _histogram(name, getattr(metrics, attribute), {"method": method, "route": route})
+
+    counters = (
+        ("http_request_db_queries_total", "queries", "Database queries executed by requests."),
+        ("http_request_db_rows_total", "rows", "Rows returned or affected by request queries."),
+    )
+    for name, attribute, description in counters:
+        lines += _header(name, "counter", description)
+        for (method, route), metrics in routes:
+            lines.append(f"{name}{_labels({'method': method, 'route': route})} {getattr(metrics, attribute)}")
+
+    lines += _header("db_query_duration_seconds", "histogram", "Duration of every SQL query.")
+    lines += _histogram("db_query_duration_seconds", queries.duration, {})
+    lines += _header("db_slow_queries_total", "counter", "Queries slower than DB_SLOW_QUERY_THRESHOLD.")
+    lines.append(f"db_slow_queries_total {queries.slow_queries}")
+
+    if pool is not None:
+        gauges = (
+            ("db_pool_size", "size", "Connections the pool keeps open."),
+            ("db_pool_max_overflow", "max_overflow", "Extra connections allowed above the pool size."),
+            ("db_pool_checked_out", "checked_out", "Connections currently in use."),
+            ("db_pool_checked_in", "checked_in", "Idle connections in the pool."),
+            ("db_pool_overflow", "overflow", "Current overflow (negative while the pool is not full yet)."),
+            ("db_pool_waiting", "waiting", "Coroutines waiting for a connection."),
+        )
+        for name, key, description in gauges:
+            lines += _header(name, "gauge", description)
+            lines.append(f"{name} {pool[key]}")
+
+        lines += _header("db_pool_timeouts_total", "counter", "Connection checkouts that hit pool_timeout.")
+        lines.append(f"db_pool_timeouts_total {pool['timeouts']}")
+
+        checkout = pool["checkout_latency"]
+        lines += _header("db_pool_checkout_seconds", "histogram", "Time to get a connection from the pool.")
+        for bucket in checkout["buckets"]:
+            lines.append(f"db_pool_checkout_seconds_bucket{_labels({'le': bucket['le']})} {bucket['count']}")
+        lines.append(f"db_pool_checkout_seconds_sum {checkout['sum']}")
+        lines.append(f"db_pool_checkout_seconds_count {checkout['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,83 @@
+"""
+Хуки движка SQLAlchemy: время и число SQL запросов, число строк и лог медленных запросов.
+
+Вместо echo=True, который печатает вообще все, в лог попадают только запросы дольше порога
+db_slow_query_threshold. Параметры запросов в лог не пишутся: в них могут быть данные пользователей.
+"""
+
+import logging
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExecutionContext
+
+from .pool import Histogram
+from .requests import current_request_stats
+
+__all__ = ["QueryMetrics", "query_metrics", "install_query_hooks"]
+
+logger = logging.getLogger(__name__)
+
+# Длинные запросы (например, массовые вставки) в логе обрезаем
+MAX_LOGGED_STATEMENT_LENGTH = 1000
+
+
+class QueryMetrics:
+    def __init__(self):
+        self.duration = Histogram()
+        self.slow_queries = 0
+
+
+query_metrics = QueryMetrics()
+
+
+def _before_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, parameters: Any, context: ExecutionContext, executemany: bool
+) -> None:
+    # Стек, а не одно значение: внутри одного соединения запросы могут вкладываться (например, pre ping)
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext,
+    executemany: bool,
+    *,
+    slow_query_threshold: float | None,
+) -> None:
+    duration = time.perf_counter() - conn.info["query_started_at"].pop()
+    query_metrics.duration.observe(duration)
+
+    if stats := current_request_stats.get():
+        stats.db_time += duration
+        stats.queries += 1
+        # Для SELECT не все драйверы сообщают число строк (и никто - для серверного курсора), тогда тут -1
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+    if slow_query_threshold is not None and duration >= slow_query_threshold:
+        query_metrics.slow_queries += 1
+        logger.warning("Slow query (%.3fs): %s", duration, statement[:MAX_LOGGED_STATEMENT_LENGTH])
+
+
+def install_query_hooks(engine: Engine, slow_query_threshold: float | None = None) -> None:
+    """Подключает хуки к синхронному движку (у асинхронного это engine.sync_engine)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+
+    def after_cursor_execute(*args: Any) -> None:
+        _after_cursor_execute(*args, slow_query_threshold=slow_query_threshold)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    # Запрос упал - достаем время старта из стека, иначе стек будет расти
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context: Any) -> None:
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started_at"):
+            connection.info["query_started_at"].pop()
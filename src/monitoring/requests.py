@@ -0,0 +1,164 @@
+"""
+Метрики запросов к API: куда уходит время запроса.
+
+Для каждого запроса middleware заводит RequestStats и кладет его в contextvar.
+Хуки движка SQLAlchemy (queries.py) добавляют туда время в БД, число запросов и строк,
+а сериализация ответа (timed_dumps) - свое время. Все, что осталось от общего времени, - время самой ручки.
+
+Итоги складываются в гистограммы по маршрутам (шаблон пути, а не сам путь, чтобы не плодить метки)
+и отдаются клиенту заголовком Server-Timing.
+"""
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .pool import Histogram
+
+__all__ = [
+    "RequestStats",
+    "RouteMetrics",
+    "RequestMetrics",
+    "request_metrics",
+    "current_request_stats",
+    "record_rows",
+    "timed_dumps",
+    "TimedORJSONResponse",
+    "TimingMiddleware",
+]
+
+
+@dataclass(slots=True)
+class RequestStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    db_time: float = 0.0
+    queries: int = 0
+    rows: int = 0
+    serialization_time: float = 0.0
+
+    def handler_time(self, total: float) -> float:
+        return max(total - self.db_time - self.serialization_time, 0.0)
+
+    def server_timing(self, total: float) -> str:
+        """Значение заголовка Server-Timing (длительности в миллисекундах)."""
+        return ", ".join(
+            [
+                f"handler;dur={self.handler_time(total) * 1000:.3f}",
+                f'db;dur={self.db_time * 1000:.3f};desc="queries={self.queries} rows={self.rows}"',
+                f"serialize;dur={self.serialization_time * 1000:.3f}",
+                f"total;dur={total * 1000:.3f}",
+            ]
+        )
+
+
+# Статистика текущего запроса. None - код выполняется вне запроса (миграции, фоновые задачи, тесты)
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+
+def record_rows(count: int) -> None:
+    """Учесть строки, которые драйвер не посчитал сам (например, прочитанные из серверного курсора)."""
+    if stats := current_request_stats.get():
+        stats.rows += count
+
+
+def timed_dumps(obj: Any) -> bytes:
+    """orjson.dumps, время которого попадает в метрику сериализации текущего запроса."""
+    started_at = time.perf_counter()
+    try:
+        return orjson.dumps(obj)
+    finally:
+        if stats := current_request_stats.get():
+            stats.serialization_time += time.perf_counter() - started_at
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse, который учитывает время сериализации ответа."""
+
+    def render(self, content: Any) -> bytes:
+        started_at = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            if stats := current_request_stats.get():
+                stats.serialization_time += time.perf_counter() - started_at
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.responses: dict[int, int] = {}  # Сколько ответов с каждым статусом
+        self.duration = Histogram()
+        self.handler = Histogram()
+        self.db = Histogram()
+        self.serialization = Histogram()
+        self.queries = 0
+        self.rows = 0
+
+
+class RequestMetrics:
+    """Накопленные метрики по маршрутам: ключ - (метод, шаблон пути)."""
+
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status_code: int, stats: RequestStats, duration: float) -> None:
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+
+        metrics.responses[status_code] = metrics.responses.get(status_code, 0) + 1
+        metrics.duration.observe(duration)
+        metrics.handler.observe(stats.handler_time(duration))
+        metrics.db.observe(stats.db_time)
+        metrics.serialization.observe(stats.serialization_time)
+        metrics.queries += stats.queries
+        metrics.rows += stats.rows
+
+
+request_metrics = RequestMetrics()
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware, которое замеряет каждый HTTP запрос.
+
+    Написано как "чистое" ASGI, а не через BaseHTTPMiddleware: так нет лишней задачи на каждый запрос
+    и стриминговые ответы проходят без буферизации. Server-Timing отражает время до начала ответа,
+    а в метрики попадает полное время, включая отправку тела.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics, server_timing: bool = True):
+        self.app = app
+        self.metrics = metrics
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        status_code = 500  # Если ручка упала, ответ 500 отправит внешний ServerErrorMiddleware
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    total = time.perf_counter() - stats.started_at
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing(total))
+            await send(message)
+
+        token = current_request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request_stats.reset(token)
+            # Маршрут FastAPI кладет в scope после сопоставления пути. Не нашелся - это 404 на неизвестный путь
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            self.metrics.observe(scope["method"], route, status_code, stats, time.perf_counter() - stats.started_at)
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
 
+from .internal import internal_router
 from .v1.books import books_router
 
+__all__ = ["internal_router", "v1_router"]
+
 v1_router = APIRouter(tags=["v1"], prefix="/api/v1")
 
 
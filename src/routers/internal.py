@@ -0,0 +1,72 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+
+from src.configurations.database import get_pool_status
+from src.monitoring import PROMETHEUS_CONTENT_TYPE, query_metrics, render_prometheus, request_metrics
+from src.schemas import AdmissionStats, CacheStats, PoolStatus
+from src.services.admission import get_concurrency_limiter, get_rate_limiter
+from src.services.cache import ReadThroughCache, get_books_cache
+
+# Служебные ручки для мониторинга. Не показываем их в сваггере.
+internal_router = APIRouter(tags=["internal"], prefix="/internal", include_in_schema=False)
+
+
+# Ручка с метриками пула соединений. По ней подбираем размер пула под реальную нагрузку.
+@internal_router.get("/pool", response_model=PoolStatus)
+async def get_pool_metrics():
+    try:
+        return get_pool_status()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is not initialized")
+
+
+# Ручка со статистикой кэша книг
+@internal_router.get("/cache", response_model=CacheStats)
+async def get_cache_stats(cache: Annotated[ReadThroughCache, Depends(get_books_cache)]):
+    total = cache.hits + cache.misses
+    return {"hits": cache.hits, "misses": cache.misses, "hit_ratio": cache.hits / total if total else 0.0}
+
+
+# Ручка с состоянием ограничителей: сколько запросов в работе, в очереди и сколько им отказано
+@internal_router.get("/admission", response_model=AdmissionStats)
+async def get_admission_stats():
+    limiter = get_concurrency_limiter()
+    rate_limiter = get_rate_limiter()
+    return {
+        "concurrency_limit": limiter.limit,
+        "in_flight": limiter.in_flight,
+        "queued": limiter.queued,
+        "admitted": limiter.admitted,
+        "shed": limiter.shed,
+        "rate_limited": rate_limiter.limited if rate_limiter else 0,
+        "queue_wait": limiter.queue_wait.snapshot(),
+    }
+
+
+# Все метрики приложения в формате Prometheus: запросы по маршрутам, SQL запросы и пул соединений
+@internal_router.get("/metrics")
+async def get_prometheus_metrics():
+    try:
+        pool = get_pool_status()
+    except ValueError:
+        pool = None  # БД еще не инициализирована - отдаем то, что есть
+
+    return Response(render_prometheus(request_metrics, query_metrics, pool), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Живость: процесс отвечает. Оркестратор перезапускает контейнер, только если эта ручка молчит
+@internal_router.get("/health/live")
+async def get_liveness():
+    return {"status": "alive"}
+
+
+# Готовность: схема проверена, пулы соединений прогреты и приложение не останавливается.
+# Доступность БД здесь намеренно не проверяем: иначе при сбое БД балансировщик разом выведет все экземпляры
+@internal_router.get("/health/ready")
+async def get_readiness(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Not ready", headers={"Retry-After": "1"}
+        )
+    return {"status": "ready"}
@@ -1,79 +1,482 @@
-from typing import Annotated
+from typing import Annotated, Any, AsyncIterable, AsyncIterator, Callable
 
-from fastapi import APIRouter, Depends, Response, status
-from icecream import ic
-from sqlalchemy import select
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.configurations.database import get_async_session
-from src.models.books import Book
-from src.schemas import IncomingBook, ReturnedAllBooks, ReturnedBook
+from src.configurations.database import (
+    after_commit,
+    get_async_read_session,
+    get_async_session,
+    get_read_session_factory,
+    get_session_factory,
+)
+from src.configurations.settings import settings
+from src.models.books import BOOK_RECORD_COLUMNS, Book, BookRecord
+from src.monitoring import record_rows, timed_dumps
+from src.schemas import (
+    INT64_MAX,
+    BooksFilter,
+    BookStats,
+    BulkCreatedBooks,
+    ExportCompression,
+    ExportFormat,
+    ImportMode,
+    ImportReport,
+    IncomingBook,
+    PatchedBook,
+    ReturnedAllBooks,
+    ReturnedBook,
+)
+from src.services.batching import InsertBatcher, get_books_insert_batcher
+from src.services.books import InvalidCursorError, build_books_query, decode_cursor, encode_cursor
+from src.services.cache import ReadThroughCache, get_books_cache
+from src.services.etags import book_etag, collection_etag, etag_matches, expected_versions
+from src.services.export import MEDIA_TYPES, ExportUnavailableError, check_export_available, export_books
+from src.services.importer import ImportUnavailableError, import_books
+from src.services.ingest import (
+    BodyTooLargeError,
+    is_ndjson,
+    iter_ndjson_lines,
+    length_errors,
+    read_body,
+    validate_book,
+    validation_errors,
+)
+from src.services.search import build_search_query
+from src.services.stats import get_book_stats
 
 books_router = APIRouter(tags=["books"], prefix="/books")
 
 # Больше не симулируем хранилище данных. Подключаемся к реальному, через сессию.
 DBSession = Annotated[AsyncSession, Depends(get_async_session)]
+# Сессия для ручек, которые только читают. Если настроены реплики - она идет в реплику.
+DBReadSession = Annotated[AsyncSession, Depends(get_async_read_session)]
+# Для стриминга нужна сессия, которая переживет зависимость. Ее открывает сам генератор ответа.
+DBReadSessionFactory = Annotated[Callable[[], AsyncSession], Depends(get_read_session_factory)]
+# То же для основной БД: из нее заполняется кэш книг (см. get_book)
+DBSessionFactory = Annotated[Callable[[], AsyncSession], Depends(get_session_factory)]
+# Кэш с готовыми (уже сериализованными) ответами для отдельных книг
+BooksCache = Annotated[ReadThroughCache, Depends(get_books_cache)]
+BooksBatcher = Annotated[InsertBatcher, Depends(get_books_insert_batcher)]
+# ИД книги - BIGINT. Больший ИД драйвер не передаст в запрос, поэтому отвечаем 422 сразу
+BookId = Annotated[int, Path(ge=-INT64_MAX - 1, le=INT64_MAX)]
+
+
+def _book_cache_key(book_id: int) -> str:
+    return f"book:{book_id}"
+
+
+# Кэш сбрасывается только после коммита: иначе конкурентный GET между сбросом и коммитом
+# прочитал бы из БД (или отстающей реплики) старую строку и снова положил ее в кэш
+def _invalidate_books(session: AsyncSession, cache: ReadThroughCache, book_ids: list[int]) -> None:
+    keys = [_book_cache_key(book_id) for book_id in book_ids]
+    after_commit(session, lambda: cache.invalidate(*keys))
+
+
+# Ответ из уже готовых байтов. response_model у ручки тогда только для документации:
+# FastAPI не валидирует и не сериализует ответ повторно.
+def _json_response(payload: bytes, etag: str) -> Response:
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+# В кэше книга лежит вместе со своим ETag: "ETag\nJSON". В JSON от orjson переводов строк нет.
+def _pack_cached(etag: str, payload: bytes) -> bytes:
+    return etag.encode() + b"\n" + payload
+
+
+def _unpack_cached(value: bytes) -> tuple[str, bytes]:
+    etag, payload = value.split(b"\n", 1)
+    return etag.decode(), payload
 
 
 # Ручка для создания записи о книге в БД. Возвращает созданную книгу.
+# С BOOKS_WRITE_BATCHING=true книга не пишется сразу, а встает в общую очередь (см. services/batching.py).
 @books_router.post("/", response_model=ReturnedBook, status_code=status.HTTP_201_CREATED)  # Прописываем модель ответа
 async def create_book(
-    book: IncomingBook, session: DBSession
+    book: IncomingBook, session: DBSession, cache: BooksCache, batcher: BooksBatcher, response: Response
 ):  # прописываем модель валидирующую входные данные и сессию как зависимость.
     # это - бизнес логика. Обрабатываем данные, сохраняем, преобразуем и т.д.
-    new_book = Book(
-        title=book.title,
-        author=book.author,
-        year=book.year,
-        count_pages=book.count_pages,
-    )
-    session.add(new_book)
-    await session.flush()
+    if settings.books_write_batching:
+        values = book.model_dump()
+        book_id, version = await batcher.submit(values)
+        new_book = {**values, "id": book_id, "version": version}
+    else:
+        new_book = Book(
+            title=book.title,
+            author=book.author,
+            year=book.year,
+            count_pages=book.count_pages,
+        )
+        session.add(new_book)
+        await session.flush()
+        book_id, version = new_book.id, new_book.version
+
+    # Кто-то мог запросить этот id до создания книги, и в кэше лежит "книги нет"
+    _invalidate_books(session, cache, [book_id])
 
+    response.headers["ETag"] = book_etag(book_id, version)
     return new_book
 
 
-# Ручка, возвращающая все книги
+async def _iter_json_array(items: list[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def _insert_books(session: AsyncSession, chunk: list[dict]) -> list[int]:
+    # Один многострочный INSERT ... RETURNING id на пачку. sort_by_parameter_order гарантирует,
+    # что id вернутся в том же порядке, что и строки во входных данных.
+    res = await session.execute(insert(Book).returning(Book.id, sort_by_parameter_order=True), chunk)
+    return list(res.scalars())
+
+
+# Ручка для массового создания книг. Принимает JSON массив или NDJSON (по книге на строку).
+# Невалидные книги не роняют всю загрузку: они попадают в errors (первые BOOKS_BULK_MAX_ERRORS), остальные сохраняются.
+# JSON массив держится в памяти целиком, поэтому он не больше BOOKS_BULK_JSON_MAX_BYTES (иначе 413),
+# а большие загрузки нужно слать в NDJSON.
+@books_router.post(
+    "/bulk",
+    response_model=BulkCreatedBooks,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": IncomingBook.model_json_schema()}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def create_books_bulk(request: Request, session: DBSession, cache: BooksCache):
+    items: AsyncIterable[Any]
+    if is_ndjson(request.headers.get("content-type")):
+        # NDJSON читаем построчно из потока - тело целиком в памяти не держим
+        items = iter_ndjson_lines(request.stream())
+    else:
+        max_size = settings.books_bulk_json_max_bytes
+        too_large = HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"JSON array body is limited to {max_size} bytes, send large loads as application/x-ndjson",
+        )
+        # Заголовку можно не верить (его может и не быть), но по нему большое тело отклоняется без чтения
+        if int(request.headers.get("content-length") or 0) > max_size:
+            raise too_large
+        try:
+            payload = orjson.loads(await read_body(request.stream(), max_size))
+        except BodyTooLargeError:
+            raise too_large
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Body is not valid JSON")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Expected a JSON array")
+        items = _iter_json_array(payload)
+
+    ids: list[int] = []
+    errors: list[dict] = []
+    rejected = 0
+    chunk: list[dict] = []
+    index = 0
+    async for item in items:
+        try:
+            book = validate_book(item)
+        except ValidationError as e:
+            item_errors = validation_errors(e)
+        else:
+            # Строка длиннее колонки уронила бы INSERT всей пачки, поэтому она отбраковывается здесь
+            if not (item_errors := length_errors(book)):
+                chunk.append(book.model_dump())
+
+        if item_errors:
+            rejected += 1
+            if len(errors) < settings.books_bulk_max_errors:
+                errors.append({"index": index, "errors": item_errors})
+        index += 1
+
+        if len(chunk) >= settings.books_bulk_chunk_size:
+            ids.extend(await _insert_books(session, chunk))
+            chunk = []
+
+    if chunk:
+        ids.extend(await _insert_books(session, chunk))
+
+    _invalidate_books(session, cache, ids)
+
+    return {"ids": ids, "rejected": rejected, "errors": errors}
+
+
+# Ручка импорта каталога из CSV (text/csv) или NDJSON. Тело читается потоком и грузится через COPY,
+# книги ищутся по паре автор + название (mode=upsert) или просто добавляются (mode=insert).
+# Для больших файлов удобнее командная строка: python -m src.services.importer catalog.csv
+@books_router.post(
+    "/import",
+    response_model=ImportReport,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_books_catalog(
+    request: Request, session: DBSession, cache: BooksCache, mode: ImportMode = ImportMode.upsert
+):
+    content_type = request.headers.get("content-type", "")
+    if is_ndjson(content_type):
+        file_format = "ndjson"
+    elif content_type.split(";", 1)[0].strip().lower() == "text/csv":
+        file_format = "csv"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected text/csv or application/x-ndjson"
+        )
+
+    async def invalidate(book_ids: list[int]) -> None:
+        _invalidate_books(session, cache, book_ids)
+
+    try:
+        stats = await import_books(session, request.stream(), file_format, mode, on_updated=invalidate)
+    except ImportUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    return stats.report()
+
+
+# Генератор NDJSON: по строке на книгу. Строки читаются серверным курсором пачками,
+# поэтому память не растет вместе с таблицей.
+async def _stream_books(
+    session_factory: Callable[[], AsyncSession], filters: BooksFilter, after: tuple[Any, int] | None
+) -> AsyncIterator[bytes]:
+    query = build_books_query(filters, after).execution_options(yield_per=settings.books_stream_chunk_size)
+
+    async with session_factory() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            record_rows(len(rows))  # Серверный курсор не сообщает число строк, считаем сами
+            yield b"".join(timed_dumps(BookRecord(*row)) + b"\n" for row in rows)
+
+
+# Ручка, возвращающая все книги.
+# Пагинация по ключу (keyset): следующая страница начинается после позиции из next_cursor
+# (значение колонки сортировки и id последней книги), поэтому глубокие страницы не дороже первой (в отличие от OFFSET).
+# С stream=true отдает весь хвост таблицы потоком в формате NDJSON.
+# Фильтры и сортировка приходят query параметрами (см. BooksFilter).
+# Если страница не изменилась с прошлого запроса (If-None-Match совпал с ETag), отвечаем 304 без тела.
 @books_router.get("/", response_model=ReturnedAllBooks)
-async def get_all_books(session: DBSession):
+async def get_all_books(
+    session: DBReadSession,
+    session_factory: DBReadSessionFactory,
+    filters: Annotated[BooksFilter, Depends()],
+    limit: Annotated[int, Query(ge=1, le=settings.books_max_page_size)] = settings.books_page_size,
+    after: Annotated[
+        str | None, Query(description="next_cursor с предыдущей страницы (при сортировке по id - можно просто id)")
+    ] = None,
+    stream: Annotated[bool, Query(description="Отдать книги потоком в формате NDJSON")] = False,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    try:
+        position = decode_cursor(after, filters.sort_by) if after is not None else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    if stream:
+        return StreamingResponse(_stream_books(session_factory, filters, position), media_type="application/x-ndjson")
+
     # Хотим видеть формат:
-    # books: [{"id": 1, "title": "Blabla", ...}, {"id": 2, ...}]
-    query = select(Book)
+    # books: [{"id": 1, "title": "Blabla", ...}, {"id": 2, ...}], next_cursor: "eyJzb3J0X2J5Ijoi..."
+    # Строки читаем простыми кортежами и сразу сериализуем, минуя ORM объекты и pydantic.
+    # Лишняя строка говорит, есть ли следующая страница
+    query = build_books_query(filters, position, limit + 1, extra_columns=(Book.version,))
     res = await session.execute(query)
-    books = res.scalars().all()
-    return {"books": books}
+    versions, books = [], []
+    for version, *fields in res:
+        versions.append(version)
+        books.append(BookRecord(*fields))
+
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_cursor(filters.sort_by, books[-1])
+
+    etag = collection_etag(zip((book.id for book in books), versions), next_cursor)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    return _json_response(timed_dumps({"books": books, "next_cursor": next_cursor}), etag)
+
+
+# Ручка поиска книг по названию и автору. Книги отсортированы по релевантности.
+# Объявлена до "/{book_id}", иначе "search" попадет в book_id.
+@books_router.get("/search", response_model=ReturnedAllBooks)
+async def search_books(
+    session: DBReadSession,
+    q: Annotated[str, Query(min_length=1, max_length=200, description="Слова из названия или автора")],
+    limit: Annotated[int, Query(ge=1, le=settings.books_max_page_size)] = settings.books_page_size,
+):
+    query = build_search_query(q, limit, session.get_bind().dialect.name)
+    books = [BookRecord(*row) for row in await session.execute(query)] if query is not None else []
+
+    return Response(content=timed_dumps({"books": books, "next_cursor": None}), media_type="application/json")
+
+
+# Ручка сводной статистики для дашбордов: книги и страницы по авторам и годам.
+# Суммы заранее посчитаны триггерами (см. models/stats.py), поэтому ответ не требует прохода по каталогу.
+@books_router.get("/stats", response_model=BookStats)
+async def get_books_stats(
+    session: DBReadSession,
+    authors_limit: Annotated[int, Query(ge=1, le=settings.books_max_page_size)] = settings.books_page_size,
+):
+    stats = await get_book_stats(session, authors_limit)
+    return Response(content=timed_dumps(stats), media_type="application/json")
+
+
+# Ручка выгрузки всего каталога для аналитики: CSV, NDJSON или Parquet потоком, с необязательным сжатием.
+# Сжатие gzip/zstd отдается как Content-Encoding, Parquet сжимается сам (см. services/export.py).
+@books_router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in MEDIA_TYPES.values()}}},
+)
+async def export_books_catalog(
+    session_factory: DBReadSessionFactory,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.csv,
+    compression: ExportCompression = ExportCompression.none,
+):
+    try:
+        check_export_available(export_format, compression)
+    except ExportUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    headers = {"Content-Disposition": f'attachment; filename="books.{export_format.value}"'}
+    if compression != ExportCompression.none and export_format != ExportFormat.parquet:
+        headers["Content-Encoding"] = compression.value
+
+    return StreamingResponse(
+        export_books(session_factory, export_format, compression, settings.books_export_chunk_size),
+        media_type=MEDIA_TYPES[export_format],
+        headers=headers,
+    )
 
 
-# Ручка для получения книги по ее ИД
+# Ручка для получения книги по ее ИД.
+# Книга берется из кэша уже сериализованной. В БД идем только при промахе, и только в основную:
+# отстающая реплика после сброса ключа вернула бы в кэш старую строку, и та жила бы там до конца TTL.
+# Если у клиента уже актуальная версия (If-None-Match), отвечаем 304 без тела.
 @books_router.get("/{book_id}", response_model=ReturnedBook)
-async def get_book(book_id: int, session: DBSession):
-    res = await session.get(Book, book_id)
-    return res
+async def get_book(
+    book_id: BookId,
+    session_factory: DBSessionFactory,
+    cache: BooksCache,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    async def load_book() -> bytes | None:
+        async with session_factory() as session:
+            res = await session.execute(select(Book.version, *BOOK_RECORD_COLUMNS).where(Book.id == book_id))
+            row = res.first()
+        if row:
+            version, *fields = row
+            return _pack_cached(book_etag(book_id, version), timed_dumps(BookRecord(*fields)))
+        return None
 
+    if cached := await cache.get_or_load(_book_cache_key(book_id), load_book):
+        etag, payload = _unpack_cached(cached)
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+        return _json_response(payload, etag)
 
-# Ручка для удаления книги
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+
+# Если книга не изменилась (или не удалилась), отличаем "книги нет" (404) от "версия не та" (412).
+async def _precondition_failed_or_not_found(
+    session: AsyncSession, book_id: int, versions: list[int] | None
+) -> Response:
+    if versions is not None and await session.scalar(select(Book.id).where(Book.id == book_id)) is not None:
+        return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+
+# Ручка для удаления книги. Один запрос DELETE ... RETURNING id вместо чтения и удаления:
+# если ничего не вернулось - книги не было.
+# С заголовком If-Match книга удаляется, только если ее версия совпала (оптимистичная блокировка).
 @books_router.delete("/{book_id}")
-async def delete_book(book_id: int, session: DBSession):
-    deleted_book = await session.get(Book, book_id)
-    ic(deleted_book)  # Красивая и информативная замена для print. Полезна при отладке.
-    if deleted_book:
-        await session.delete(deleted_book)
+async def delete_book(
+    book_id: BookId,
+    session: DBSession,
+    cache: BooksCache,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    query = delete(Book).where(Book.id == book_id)
+    if (versions := expected_versions(if_match, book_id)) is not None:
+        query = query.where(Book.version.in_(versions))
+
+    res = await session.execute(query.returning(Book.id))
+    if res.scalar_one_or_none() is None:
+        return await _precondition_failed_or_not_found(session, book_id, versions)
+
+    _invalidate_books(session, cache, [book_id])
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)  # Response может вернуть текст и метаданные.
 
 
-# Ручка для обновления данных о книге
-@books_router.put("/{book_id}")
-async def update_book(book_id: int, new_data: ReturnedBook, session: DBSession):
+# Обновляет переданные поля одним запросом UPDATE ... RETURNING и поднимает версию книги.
+# С заголовком If-Match обновление проходит, только если версия книги совпала с версией из ETag:
+# конкурентные изменения отсекаются условием в WHERE, без блокировок строк.
+async def _update_book(
+    session: AsyncSession, cache: ReadThroughCache, response: Response, book_id: int, values: dict, if_match: str | None
+) -> Book | Response:
+    conditions = [Book.id == book_id]
+    if (versions := expected_versions(if_match, book_id)) is not None:
+        conditions.append(Book.version.in_(versions))
+
+    if values:
+        query = update(Book).where(*conditions).values(**values, version=Book.version + 1).returning(Book)
+    else:
+        query = select(Book).where(*conditions)  # Менять нечего - просто проверяем условия и отдаем книгу
+
     # Оператор "морж", позволяющий одновременно и присвоить значение и проверить его.
-    if updated_book := await session.get(Book, book_id):
-        updated_book.author = new_data.author
-        updated_book.title = new_data.title
-        updated_book.year = new_data.year
-        updated_book.count_pages = new_data.count_pages
+    if (updated_book := (await session.scalars(query)).one_or_none()) is None:
+        return await _precondition_failed_or_not_found(session, book_id, versions)
 
-        await session.flush()
+    _invalidate_books(session, cache, [book_id])
+    response.headers["ETag"] = book_etag(book_id, updated_book.version)
+    return updated_book
 
-        return updated_book
 
-    return Response(status_code=status.HTTP_404_NOT_FOUND)
+# Ручка для обновления данных о книге
+@books_router.put("/{book_id}", response_model=ReturnedBook)
+async def update_book(
+    book_id: BookId,
+    new_data: ReturnedBook,
+    session: DBSession,
+    cache: BooksCache,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    values = new_data.model_dump(include={"title", "author", "year", "count_pages"})
+    return await _update_book(session, cache, response, book_id, values, if_match)
+
+
+# Ручка для частичного обновления книги: меняются только переданные поля
+@books_router.patch("/{book_id}", response_model=ReturnedBook)
+async def patch_book(
+    book_id: BookId,
+    new_data: PatchedBook,
+    session: DBSession,
+    cache: BooksCache,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    values = new_data.model_dump(exclude_unset=True)
+    return await _update_book(session, cache, response, book_id, values, if_match)
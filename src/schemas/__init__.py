@@ -1,3 +1,4 @@
 from .books import *  # noqa F403
+from .monitoring import *  # noqa F403
 
-__all__ = books.__all__  # noqa F405
+__all__ = books.__all__ + monitoring.__all__  # noqa F405
@@ -1,7 +1,33 @@
-from pydantic import BaseModel, Field, field_validator
+from enum import Enum
+
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 from pydantic_core import PydanticCustomError
 
-__all__ = ["IncomingBook", "ReturnedAllBooks", "ReturnedBook"]
+# Границы целых в БД: год и страницы - INTEGER, id - BIGINT. Число больше границы
+# драйвер не передаст в запрос (500 вместо 422), поэтому такие параметры отсекаются еще при валидации
+INT32_MAX = 2**31 - 1
+INT64_MAX = 2**63 - 1
+
+__all__ = [
+    "INT32_MAX",
+    "INT64_MAX",
+    "BookSortField",
+    "BookStats",
+    "BookStatsByAuthor",
+    "BookStatsByYear",
+    "BooksFilter",
+    "BulkCreatedBooks",
+    "BulkItemError",
+    "ExportCompression",
+    "ExportFormat",
+    "ImportMode",
+    "ImportReport",
+    "IncomingBook",
+    "PatchedBook",
+    "ReturnedAllBooks",
+    "ReturnedBook",
+    "SortOrder",
+]
 
 
 # Базовый класс "Книги", содержащий поля, которые есть во всех классах-наследниках.
@@ -13,10 +39,12 @@ class BaseBook(BaseModel):
 
 # Класс для валидации входящих данных. Не содержит id так как его присваивает БД.
 class IncomingBook(BaseBook):
-    year: int = 2024  # Пример присваивания дефолтного значения
+    year: int = Field(default=2024, le=INT32_MAX)  # Пример присваивания дефолтного значения
     count_pages: int = Field(
         alias="pages",
         default=300,
+        ge=-INT32_MAX - 1,
+        le=INT32_MAX,
     )  # Пример использования тонкой настройки полей. Передачи в них метаинформации.
 
     @field_validator("year")  # Валидатор, проверяет что дата не слишком древняя
@@ -27,12 +55,132 @@ class IncomingBook(BaseBook):
         return val
 
 
+# Класс для частичного обновления книги (PATCH). Все поля необязательные:
+# обновляются только переданные. Явно передать null нельзя - в БД эти поля NOT NULL.
+class PatchedBook(BaseModel):
+    title: str | None = None
+    author: str | None = None
+    year: int | None = Field(default=None, le=INT32_MAX)
+    count_pages: int | None = Field(
+        default=None, ge=-INT32_MAX - 1, le=INT32_MAX, validation_alias=AliasChoices("count_pages", "pages")
+    )
+
+    @field_validator("*")
+    @staticmethod
+    def validate_not_null(val):
+        if val is None:
+            raise PydanticCustomError("Validation error", "Field can't be null!")
+        return val
+
+    @field_validator("year")
+    @staticmethod
+    def validate_year(val: int):
+        return IncomingBook.validate_year(val)
+
+
 # Класс, валидирующий исходящие данные. Он уже содержит id
 class ReturnedBook(BaseBook):
     id: int
     count_pages: int
 
 
-# Класс для возврата массива объектов "Книга"
+# Класс для возврата массива объектов "Книга".
+# next_cursor - непрозрачный курсор на конец страницы, его нужно передать в параметр after,
+# чтобы получить следующую страницу. Если страниц больше нет - None.
 class ReturnedAllBooks(BaseModel):
     books: list[ReturnedBook]
+    next_cursor: str | None = None
+
+
+# Ошибка валидации одной книги из массовой загрузки. index - позиция книги во входных данных.
+class BulkItemError(BaseModel):
+    index: int
+    errors: list[dict]
+
+
+# Результат массового создания книг: id созданных книг (в порядке входных данных), число отбракованных записей
+# и ошибки первых из них (не больше settings.books_bulk_max_errors)
+class BulkCreatedBooks(BaseModel):
+    ids: list[int]
+    rejected: int
+    errors: list[BulkItemError]
+
+
+# Поля, по которым можно сортировать список книг
+class BookSortField(str, Enum):
+    id = "id"
+    title = "title"
+    author = "author"
+    year = "year"
+    count_pages = "count_pages"
+
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+# Фильтры и сортировка для списка книг. Поля приходят из query параметров.
+# Под каждый фильтр в модели Book есть индекс, поэтому ни один из них не приводит к полному перебору таблицы.
+class BooksFilter(BaseModel):
+    author: str | None = Field(default=None, description="Точное совпадение автора")
+    author_prefix: str | None = Field(default=None, min_length=1, description="Автор начинается с")
+    year_from: int | None = Field(default=None, ge=-INT32_MAX - 1, le=INT32_MAX)
+    year_to: int | None = Field(default=None, ge=-INT32_MAX - 1, le=INT32_MAX)
+    pages_from: int | None = Field(default=None, ge=-INT32_MAX - 1, le=INT32_MAX)
+    pages_to: int | None = Field(default=None, ge=-INT32_MAX - 1, le=INT32_MAX)
+    sort_by: BookSortField = BookSortField.id
+    order: SortOrder = SortOrder.asc
+
+
+# Форматы выгрузки каталога
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    parquet = "parquet"
+
+
+class ExportCompression(str, Enum):
+    none = "none"
+    gzip = "gzip"
+    zstd = "zstd"
+
+
+# Как импорт поступает с книгами, которые уже есть в каталоге (книга определяется парой автор + название)
+class ImportMode(str, Enum):
+    upsert = "upsert"  # Обновить найденные, добавить новые
+    insert = "insert"  # Добавить все строки как новые книги
+
+
+# Итог импорта каталога. errors - первые отбракованные строки (index - номер строки данных в файле)
+class ImportReport(BaseModel):
+    rows_read: int
+    accepted: int
+    rejected: int
+    duplicates: int
+    inserted: int
+    updated: int
+    unchanged: int
+    seconds: float
+    rows_per_second: float
+    errors: list[BulkItemError]
+
+
+# Сводная статистика каталога: всего книг и страниц, разбивка по авторам (самые плодовитые первыми) и по годам
+class BookStatsByAuthor(BaseModel):
+    author: str
+    books: int
+    pages: int
+
+
+class BookStatsByYear(BaseModel):
+    year: int
+    books: int
+    pages: int
+
+
+class BookStats(BaseModel):
+    total_books: int
+    total_pages: int
+    authors: list[BookStatsByAuthor]
+    years: list[BookStatsByYear]
@@ -0,0 +1,44 @@
+from pydantic import BaseModel
+
+__all__ = ["AdmissionStats", "CacheStats", "HistogramBucket", "HistogramSnapshot", "PoolStatus"]
+
+
+class HistogramBucket(BaseModel):
+    le: str  # Верхняя граница корзины, "+Inf" для последней
+    count: int  # Накопленное число наблюдений
+
+
+class HistogramSnapshot(BaseModel):
+    count: int
+    sum: float
+    buckets: list[HistogramBucket]
+
+
+# Состояние пула соединений с БД
+class PoolStatus(BaseModel):
+    size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    waiting: int
+    timeouts: int
+    checkout_latency: HistogramSnapshot
+
+
+# Счетчики попаданий и промахов кэша
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+# Состояние ограничителей запросов
+class AdmissionStats(BaseModel):
+    concurrency_limit: int
+    in_flight: int
+    queued: int
+    admitted: int
+    shed: int  # Сколько запросов получили 503
+    rate_limited: int  # Сколько запросов получили 429
+    queue_wait: HistogramSnapshot
@@ -0,0 +1,203 @@
+"""
+Запуск приложения в проде: несколько процессов-воркеров uvicorn на одном сокете.
+
+    python -m src.server                        # воркеров по числу ядер (SERVER_WORKERS=0)
+    python -m src.server --workers 4 --port 8080
+
+Схему БД (DB_SCHEMA_MODE) готовит один раз родительский процесс, до запуска воркеров:
+воркеры стартуют с DB_SCHEMA_MODE=none и не гоняют DDL наперегонки. В режиме create_drop таблицы удаляются
+тоже один раз - когда остановились все воркеры.
+
+Каждый воркер сам открывает свои пулы соединений (global_init() в lifespan). Размер пулов считается вместе
+с числом воркеров: если задан DB_TOTAL_CONNECTIONS, он делится между воркерами поровну.
+
+SIGTERM (и Ctrl+C) останавливает воркеры мягко: /internal/health/ready сразу начинает отвечать 503,
+еще SERVER_DRAIN_DELAY секунд запросы принимаются (пока балансировщик не уберет экземпляр),
+затем сервер перестает принимать соединения и до SERVER_GRACEFUL_TIMEOUT секунд ждет запросы, которые
+еще выполняются. Только после этого закрываются пулы соединений. Повторный сигнал останавливает без паузы.
+
+Ctrl+C терминал шлет всей группе процессов, поэтому воркеры SIGINT пропускают: останавливает их только SIGTERM
+от родителя. Иначе этот SIGTERM пришел бы воркеру вторым сигналом и оборвал паузу.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from types import FrameType
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src.configurations.database import (
+    check_db_schema,
+    create_db_and_tables,
+    delete_db_and_tables,
+    global_dispose,
+    global_init,
+    migrate_db,
+)
+from src.configurations.settings import Settings, settings
+
+logger = logging.getLogger("uvicorn.error")  # Пишем туда же, куда и сам uvicorn
+
+__all__ = ["WorkerPlan", "plan_workers", "DrainingServer", "DrainingMultiprocess", "serve"]
+
+APP = "src.main:app"
+
+
+@dataclass(frozen=True)
+class WorkerPlan:
+    workers: int
+    pool_size: int
+    max_connection_count: int  # На один воркер: pool_size + переполнение
+
+
+def plan_workers(config: Settings, workers: int | None = None) -> WorkerPlan:
+    """Сколько запустить воркеров и сколько соединений с БД дать каждому."""
+    count = workers or config.server_workers or os.cpu_count() or 1
+    max_connections = config.max_connection_count
+    if config.db_total_connections is not None:
+        max_connections = config.db_total_connections // count
+        if max_connections < 1:
+            raise ValueError(f"DB_TOTAL_CONNECTIONS={config.db_total_connections} is less than workers ({count})")
+    return WorkerPlan(
+        workers=count,
+        pool_size=min(config.db_pool_size, max_connections),
+        max_connection_count=max_connections,
+    )
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    Сервер uvicorn, который по первому сигналу не выходит сразу, а сначала снимает готовность.
+    supervised - воркер под DrainingMultiprocess: SIGINT он пропускает, SIGTERM пришлет родитель.
+    """
+
+    def __init__(self, config: uvicorn.Config, drain_delay: float = 0.0, supervised: bool = False) -> None:
+        super().__init__(config)
+        self.drain_delay = drain_delay
+        self.supervised = supervised
+        self.drain_deadline: float | None = None
+
+    def install_signal_handlers(self) -> None:
+        super().install_signal_handlers()
+        if self.supervised and threading.current_thread() is threading.main_thread():
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        if self.drain_deadline is not None:
+            # Повторный сигнал: выходим сразу, не дожидаясь ни конца паузы, ни начатых запросов
+            self.should_exit = self.force_exit = True
+            return
+
+        self.drain_deadline = time.monotonic() + self.drain_delay
+        # Приложение уже загружено этим процессом (config.load), импорт вернет тот же объект
+        from src.main import app
+
+        app.state.ready = False
+        logger.info("Draining: not ready, stopping in %.1fs", self.drain_delay)
+        if self.drain_delay <= 0:
+            super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.drain_deadline is not None and time.monotonic() >= self.drain_deadline:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+class DrainingMultiprocess(Multiprocess):
+    """Супервизор воркеров: при остановке сигналит всем сразу, чтобы они снимали нагрузку одновременно."""
+
+    def signal_handler(self, sig: int, frame: FrameType | None) -> None:
+        if self.should_exit.is_set():
+            # Повторный сигнал (второй Ctrl+C): второй SIGTERM останавливает воркеры без паузы
+            for process in self.processes:
+                process.terminate()
+        super().signal_handler(sig, frame)
+
+    def shutdown(self) -> None:
+        # uvicorn останавливает воркеры по одному, и паузы SERVER_DRAIN_DELAY складывались бы
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        logger.info("Stopping parent process [%s]", self.pid)
+
+
+async def prepare_schema(mode: str) -> None:
+    global_init()
+    try:
+        if mode == "create_drop":
+            await create_db_and_tables()
+        elif mode == "migrate":
+            await migrate_db()
+        elif mode == "check":
+            await check_db_schema()
+    finally:
+        await global_dispose()
+
+
+async def drop_schema() -> None:
+    global_init()
+    try:
+        await delete_db_and_tables()
+    finally:
+        await global_dispose()
+
+
+def serve(host: str, port: int, workers: int | None = None) -> None:
+    plan = plan_workers(settings, workers)
+    schema_mode = settings.db_schema_mode
+    config = uvicorn.Config(
+        APP,
+        host=host,
+        port=port,
+        workers=plan.workers,
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+    )
+    logger.info(
+        "Starting %s workers, pool_size=%s, max_connection_count=%s per worker",
+        plan.workers,
+        plan.pool_size,
+        plan.max_connection_count,
+    )
+
+    asyncio.run(prepare_schema(schema_mode))
+
+    # Воркеры запускаются через spawn и читают настройки из окружения заново
+    os.environ.update(
+        {
+            "DB_SCHEMA_MODE": "none",
+            "DB_POOL_SIZE": str(plan.pool_size),
+            "MAX_CONNECTION_COUNT": str(plan.max_connection_count),
+        }
+    )
+    server = DrainingServer(config, drain_delay=settings.server_drain_delay, supervised=True)
+    sock = config.bind_socket()
+    try:
+        # Родитель по SIGTERM отправляет SIGTERM воркерам и ждет, пока каждый мягко остановится
+        DrainingMultiprocess(config, target=server.run, sockets=[sock]).run()
+    finally:
+        sock.close()
+        if schema_mode == "create_drop":
+            asyncio.run(drop_schema())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, help="Сколько воркеров (по умолчанию SERVER_WORKERS)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
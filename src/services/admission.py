@@ -0,0 +1,282 @@
+"""
+Контроль допуска запросов (admission control): лучше быстро отказать части запросов, чем медленно обслужить все.
+
+Когда БД тормозит, запросы копятся в очереди за соединением из пула, и задержка растет у всех сразу.
+Перед роутерами стоят два ограничителя:
+
+- TokenBucketLimiter - частота запросов от одного клиента (token bucket): в среднем rate в секунду,
+  всплесками до burst. Лишние запросы получают 429 и Retry-After - через сколько секунд появится токен.
+  Ведра хранятся в RateLimitBackend: в памяти процесса (у каждого воркера свои) или в общем Redis.
+- ConcurrencyLimiter - сколько запросов воркер выполняет одновременно. Предел берется по размеру пула
+  соединений: больше запросов пул все равно не обслужит. Остальные ждут в очереди по порядку, но не дольше
+  queue_timeout. Если очередь уже стоит дольше этого, новые запросы не ждут, а сразу получают 503.
+
+Служебные ручки (/internal: проверки здоровья, метрики) не ограничиваются никогда.
+"""
+
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Callable
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.configurations.settings import settings
+from src.monitoring import Histogram
+
+__all__ = [
+    "RateLimitBackend",
+    "InMemoryRateLimitBackend",
+    "RedisRateLimitBackend",
+    "TokenBucketLimiter",
+    "ConcurrencyLimiter",
+    "AdmissionMiddleware",
+    "get_rate_limiter",
+    "get_concurrency_limiter",
+]
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        """Забирает токен из ведра key. 0 - токен был, иначе через сколько секунд он появится."""
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Ведра в памяти процесса. Самые давно не приходившие клиенты вытесняются после max_keys."""
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # key -> (токены, когда посчитаны)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        now = self._clock()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Ведро считается атомарно внутри Redis и по часам Redis, а не воркеров (у них часы могут расходиться).
+# Дробное число Lua вернул бы как целое, поэтому ожидание отдаем строкой
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Общие для всех воркеров ведра. client - асинхронный клиент с интерфейсом redis.asyncio.Redis."""
+
+    def __init__(self, client: Any, prefix: str = "ratelimit:"):
+        self._client = client
+        self._prefix = prefix
+
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._client.eval(_TOKEN_BUCKET_SCRIPT, 1, self._prefix + key, rate, burst))
+
+
+class TokenBucketLimiter:
+    def __init__(self, backend: RateLimitBackend, rate: float, burst: int):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.limited = 0
+
+    async def check(self, key: str) -> float:
+        """0 - запрос можно пропустить, иначе через сколько секунд клиенту стоит повторить."""
+        wait = await self.backend.consume(key, self.rate, self.burst)
+        if wait > 0:
+            self.limited += 1
+        return wait
+
+
+class ConcurrencyLimiter:
+    """Не больше limit запросов одновременно, остальные - в очереди по порядку прихода."""
+
+    def __init__(
+        self,
+        limit: int,
+        queue_timeout: float,
+        max_queue: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._clock = clock
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.queue_wait = Histogram()
+        self._waiters: deque[tuple[float, asyncio.Future]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def queue_delay(self) -> float:
+        """Сколько уже ждет самый старый запрос в очереди."""
+        return self._clock() - self._waiters[0][0] if self._waiters else 0.0
+
+    async def acquire(self) -> bool:
+        """True - слот получен (его нужно вернуть release), False - запросу отказано."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._admit(0.0)
+            return True
+
+        # Очередь и так стоит дольше цели: этот запрос тоже не дождется, отказываем сразу, без ожидания
+        if len(self._waiters) >= self.max_queue or self.queue_delay() >= self.queue_timeout:
+            self.shed += 1
+            return False
+
+        waiter = (self._clock(), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait([waiter[1]], timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)  # Клиент ушел, пока ждал
+            raise
+
+        if waiter[1].done():
+            self._admit(self._clock() - waiter[0])
+            return True
+
+        self._abandon(waiter)
+        self.shed += 1
+        return False
+
+    def release(self) -> None:
+        # Слот передается следующему в очереди напрямую, in_flight при этом не меняется
+        while self._waiters:
+            _, future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _admit(self, waited: float) -> None:
+        self.admitted += 1
+        self.queue_wait.observe(waited)
+
+    def _abandon(self, waiter: tuple[float, asyncio.Future]) -> None:
+        if waiter[1].done():
+            self.release()  # Слот успели передать, но он уже не нужен
+        else:
+            waiter[1].cancel()
+            self._waiters.remove(waiter)
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> ORJSONResponse:
+    return ORJSONResponse(
+        {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+    )
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware с ограничителями перед роутерами. Как и TimingMiddleware, "чистое" ASGI:
+    слот ConcurrencyLimiter держится, пока не отправлен весь ответ, включая стриминговые.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate_limiter: TokenBucketLimiter | None = None,
+        concurrency_limiter: ConcurrencyLimiter | None = None,
+        exempt_prefixes: tuple[str, ...] = ("/internal",),
+    ):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.exempt_prefixes = exempt_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter is not None:
+            # Ключ - адрес клиента (за прокси uvicorn берет его из X-Forwarded-For).
+            # X-Client-Id тут не подходит: меняя его, клиент получал бы новое ведро на каждый запрос
+            client = scope.get("client")
+            wait = await self.rate_limiter.check(client[0] if client else "")
+            if wait > 0:
+                await _reject(429, "Too Many Requests", wait)(scope, receive, send)
+                return
+
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            await _reject(503, "Server is overloaded", limiter.queue_timeout)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+__rate_limiter: TokenBucketLimiter | None = None
+__concurrency_limiter: ConcurrencyLimiter | None = None
+
+
+def get_rate_limiter() -> TokenBucketLimiter | None:
+    """Ограничитель частоты из настроек. None - если RATE_LIMIT_PER_SECOND не задан."""
+    global __rate_limiter
+
+    if __rate_limiter is None and settings.rate_limit_per_second is not None:
+        __rate_limiter = TokenBucketLimiter(
+            InMemoryRateLimitBackend(), rate=settings.rate_limit_per_second, burst=settings.rate_limit_burst
+        )
+
+    return __rate_limiter
+
+
+def get_concurrency_limiter() -> ConcurrencyLimiter:
+    """Ограничитель одновременных запросов воркера. По умолчанию - по числу соединений пула с переполнением."""
+    global __concurrency_limiter
+
+    if __concurrency_limiter is None:
+        __concurrency_limiter = ConcurrencyLimiter(
+            limit=settings.admission_max_concurrency or settings.max_connection_count,
+            queue_timeout=settings.admission_queue_timeout,
+            max_queue=settings.admission_max_queue,
+        )
+
+    return __concurrency_limiter
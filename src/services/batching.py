@@ -0,0 +1,148 @@
+"""
+Отложенная пакетная запись (write-behind) для создания книг.
+
+При всплесках нагрузки каждая ручка create_book открывает свою транзакцию ради одной строки.
+InsertBatcher собирает одновременные вставки в общую очередь и пишет их одним многострочным INSERT:
+пачка уходит, как только набралось max_batch_size строк или прошло max_delay секунд с первой строки.
+Каждый запрос ждет свою строку и получает свой id (или свою ошибку).
+
+Цена - до max_delay секунд дополнительной задержки на запрос, выигрыш - одна транзакция на пачку вместо сотен.
+
+Если пачка не записалась из-за плохих строк (row_errors: нарушение ограничения, неверные данные), она делится
+пополам, пока ошибку не получат только виноватые строки. Любая другая ошибка (потеря соединения, таймаут пула,
+переключение БД) сразу достается всей пачке: повторять ее по частям значит заставить клиентов ждать
+почти 2N последовательных попыток, каждая из которых может висеть до pool_timeout.
+"""
+
+import asyncio
+import contextvars
+from typing import Annotated, Awaitable, Callable, Generic, TypeVar
+
+from fastapi import Depends
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.database import get_session_factory
+from src.configurations.settings import settings
+from src.models.books import Book
+
+__all__ = ["InsertBatcher", "insert_books", "get_books_insert_batcher", "close_books_insert_batcher"]
+
+T = TypeVar("T")
+
+# Пишет пачку строк и возвращает результат по каждой строке в том же порядке
+Writer = Callable[[list[dict]], Awaitable[list[T]]]
+
+
+class InsertBatcher(Generic[T]):
+    def __init__(
+        self,
+        writer: Writer,
+        max_batch_size: int = 500,
+        max_delay: float = 0.005,
+        row_errors: tuple[type[Exception], ...] = (IntegrityError, DataError),
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.row_errors = row_errors  # Ошибки из-за самих строк: только на них пачка делится пополам
+        self._writer = writer
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self.batches = 0  # Сколько пачек записано (для тестов и отладки)
+
+    async def submit(self, row: dict) -> T:
+        """Ставит строку в очередь и ждет, пока ее пачка запишется."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            # Пустой контекст: иначе таймер унаследует contextvars первого запроса,
+            # и запись всей пачки попадет в его метрики
+            self._timer = loop.call_later(self.max_delay, self._start_flush, context=contextvars.Context())
+
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch), context=contextvars.Context())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        try:
+            results = await self._writer([row for row, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            if len(batch) == 1 or not isinstance(e, self.row_errors):
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            # Одна плохая строка не должна ронять всю пачку: делим пополам, пока не найдем виноватые строки
+            middle = len(batch) // 2
+            await self._flush(batch[:middle])
+            await self._flush(batch[middle:])
+            return
+
+        self.batches += 1
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():  # Клиент мог отключиться, не дождавшись ответа
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Дописывает все, что стоит в очереди. Вызывается при остановке приложения."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+async def insert_books(session: AsyncSession, rows: list[dict]) -> list[tuple[int, int]]:
+    """Один INSERT ... RETURNING на все строки. Возвращает (id, version) в порядке входных строк."""
+    res = await session.execute(insert(Book).returning(Book.id, Book.version, sort_by_parameter_order=True), rows)
+    return [(book_id, version) for book_id, version in res]
+
+
+__books_insert_batcher: InsertBatcher[tuple[int, int]] | None = None
+
+
+def get_books_insert_batcher(
+    session_factory: Annotated[Callable[[], AsyncSession], Depends(get_session_factory)],
+) -> InsertBatcher[tuple[int, int]]:
+    """Зависимость с общей очередью вставки книг. Создается при первом обращении."""
+    global __books_insert_batcher
+
+    if __books_insert_batcher is None:
+
+        async def write(rows: list[dict]) -> list[tuple[int, int]]:
+            async with session_factory() as session:
+                result = await insert_books(session, rows)
+                await session.commit()
+                return result
+
+        __books_insert_batcher = InsertBatcher(
+            write, max_batch_size=settings.books_batch_max_size, max_delay=settings.books_batch_max_delay
+        )
+
+    return __books_insert_batcher
+
+
+async def close_books_insert_batcher() -> None:
+    global __books_insert_batcher
+
+    if __books_insert_batcher is not None:
+        await __books_insert_batcher.close()
+        __books_insert_batcher = None
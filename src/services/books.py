@@ -0,0 +1,119 @@
+"""Построение запросов к таблице книг: фильтры, сортировка и пагинация по ключу."""
+
+import base64
+from typing import Any
+
+import orjson
+from sqlalchemy import Select, literal, select, tuple_
+
+from src.models.books import BOOK_RECORD_COLUMNS, Book, BookRecord
+from src.schemas import INT32_MAX, INT64_MAX, BooksFilter, BookSortField, SortOrder
+
+__all__ = ["InvalidCursorError", "build_books_query", "encode_cursor", "decode_cursor"]
+
+SORT_COLUMNS = {
+    BookSortField.id: Book.id,
+    BookSortField.title: Book.title,
+    BookSortField.author: Book.author,
+    BookSortField.year: Book.year,
+    BookSortField.count_pages: Book.count_pages,
+}
+
+# Тип значения колонки сортировки в курсоре и, для целых, наибольшее значение
+SORT_VALUE_TYPES = {
+    BookSortField.id: (int, INT64_MAX),
+    BookSortField.title: (str, None),
+    BookSortField.author: (str, None),
+    BookSortField.year: (int, INT32_MAX),
+    BookSortField.count_pages: (int, INT32_MAX),
+}
+
+
+def _in_range(value: int, max_value: int) -> bool:
+    return -max_value - 1 <= value <= max_value
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(sort_by: BookSortField, book: BookRecord) -> str:
+    """
+    Курсор на следующую страницу после книги book: поле сортировки, значение этого поля и id.
+    Значение лежит в самом курсоре, а не ищется заново по id: если книгу удалят или изменят
+    между страницами, следующая страница все равно продолжится ровно с того же места.
+    """
+    payload = {"sort_by": sort_by.value, "value": getattr(book, sort_by.value), "id": book.id}
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode()
+
+
+def decode_cursor(cursor: str, sort_by: BookSortField) -> tuple[Any, int]:
+    """(значение колонки сортировки, id) из курсора. Для сортировки по id курсором может быть и просто id."""
+    # isdigit() пропускает и не ASCII цифры ("١٢"), а int() их понимает
+    if sort_by == BookSortField.id and cursor.isascii() and cursor.isdigit():
+        if not _in_range(book_id := int(cursor), INT64_MAX):
+            raise InvalidCursorError("Cursor id is out of range")
+        return book_id, book_id
+
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor))
+        cursor_sort_by, value, book_id = payload["sort_by"], payload["value"], payload["id"]
+    except (ValueError, TypeError, KeyError):  # binascii.Error и JSONDecodeError - это ValueError
+        raise InvalidCursorError("Malformed cursor")
+
+    if cursor_sort_by != sort_by.value:
+        raise InvalidCursorError(f"Cursor is for sort_by={cursor_sort_by}, not {sort_by.value}")
+    # bool - подкласс int, но в курсоре ему взяться неоткуда
+    value_type, max_value = SORT_VALUE_TYPES[sort_by]
+    if type(value) is not value_type or type(book_id) is not int:
+        raise InvalidCursorError("Malformed cursor")
+    if not _in_range(book_id, INT64_MAX) or (max_value is not None and not _in_range(value, max_value)):
+        raise InvalidCursorError("Cursor value is out of range")
+    return value, book_id
+
+
+def build_books_query(
+    filters: BooksFilter, after: tuple[Any, int] | None = None, limit: int | None = None, extra_columns: tuple = ()
+) -> Select:
+    """Запрос на страницу книг после позиции after (или с начала, если after не передан).
+
+    after - (значение колонки сортировки, id) последней книги предыдущей страницы, см. decode_cursor.
+
+    Выбирает колонки BookRecord, а не ORM объекты Book. extra_columns идут в строке перед ними.
+    """
+    query = select(*extra_columns, *BOOK_RECORD_COLUMNS)
+
+    if filters.author is not None:
+        query = query.where(Book.author == filters.author)
+    if filters.author_prefix is not None:
+        query = query.where(Book.author.startswith(filters.author_prefix, autoescape=True))
+    if filters.year_from is not None:
+        query = query.where(Book.year >= filters.year_from)
+    if filters.year_to is not None:
+        query = query.where(Book.year <= filters.year_to)
+    if filters.pages_from is not None:
+        query = query.where(Book.count_pages >= filters.pages_from)
+    if filters.pages_to is not None:
+        query = query.where(Book.count_pages <= filters.pages_to)
+
+    sort_column = SORT_COLUMNS[filters.sort_by]
+    descending = filters.order == SortOrder.desc
+
+    if after is not None:
+        after_value, after_id = after
+        if sort_column is Book.id:
+            query = query.where(Book.id < after_id if descending else Book.id > after_id)
+        else:
+            # Сравнение пар (колонка, id) разрешается индексом (колонка, id).
+            # Типы параметров - как у колонок: без этого id ушел бы в запрос как INTEGER и не вместил бы BIGINT
+            row = tuple_(sort_column, Book.id)
+            cursor = tuple_(literal(after_value, sort_column.type), literal(after_id, Book.id.type))
+            query = query.where(row < cursor if descending else row > cursor)
+
+    order_columns = [Book.id] if sort_column is Book.id else [sort_column, Book.id]
+    query = query.order_by(*(column.desc() if descending else column for column in order_columns))
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    return query
@@ -0,0 +1,164 @@
+"""
+Кэш для горячих и редко меняющихся данных (например, отдельных книг).
+
+Хранилище подключается через CacheBackend: в процессе (InMemoryCacheBackend) или внешнее,
+общее для всех воркеров (RedisCacheBackend). Поверх него ReadThroughCache:
+берет значение из кэша, а при промахе загружает его из БД ровно один раз,
+даже если за ним одновременно пришло много запросов.
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from src.configurations.settings import settings
+
+__all__ = ["CacheBackend", "InMemoryCacheBackend", "RedisCacheBackend", "ReadThroughCache", "get_books_cache"]
+
+# Маркер "записи нет в БД". Кэшируем и отсутствие, чтобы запросы к несуществующим id не били в БД.
+_MISSING = b""
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None: ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """LRU кэш с TTL в памяти процесса. У каждого воркера он свой."""
+
+    def __init__(self, max_size: int, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get(self, key: str) -> bytes | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Общий для всех воркеров кэш. client - асинхронный клиент с интерфейсом redis.asyncio.Redis."""
+
+    def __init__(self, client: Any, prefix: str = "cache:"):
+        self._client = client
+        self._prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(self._prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._client.delete(*(self._prefix + key for key in keys))
+
+
+class ReadThroughCache:
+    def __init__(self, backend: CacheBackend, ttl: float, negative_ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[bytes | None]]) -> bytes | None:
+        """Значение из кэша, а при промахе - из loader. None - если loader ничего не нашел."""
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value or None
+
+        self.misses += 1
+
+        # Защита от "толпы": пока одна корутина грузит ключ, остальные ждут ее результат
+        if (inflight := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # Отменили нас самих
+                return await loader()  # Отменили того, кто грузил. Грузим сами.
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            # Если ключ инвалидировали, пока мы грузили, загруженное значение уже может быть устаревшим
+            if self._inflight.get(key) is future:
+                if value is None:
+                    await self.backend.set(key, _MISSING, self.negative_ttl)
+                else:
+                    await self.backend.set(key, value, self.ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            self._inflight.pop(key, None)
+        await self.backend.delete(*keys)
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Ошибку загрузки получит тот, кто ее грузил. Ждущих может и не быть - не шумим в лог.
+    if not future.cancelled():
+        future.exception()
+
+
+__books_cache: ReadThroughCache | None = None
+
+
+def get_books_cache() -> ReadThroughCache:
+    """Зависимость с кэшем книг. Создается при первом обращении."""
+    global __books_cache
+
+    if __books_cache is None:
+        __books_cache = ReadThroughCache(
+            InMemoryCacheBackend(max_size=settings.cache_max_size),
+            ttl=settings.cache_ttl,
+            negative_ttl=settings.cache_negative_ttl,
+        )
+
+    return __books_cache
@@ -0,0 +1,57 @@
+"""
+ETag и условные запросы (If-None-Match, If-Match) для книг.
+
+ETag отдельной книги - это ее id и номер версии, который растет при каждом изменении.
+ETag списка - хэш пар (id, версия) всех книг на странице: он меняется, если на странице
+появилась, пропала или изменилась хотя бы одна книга.
+"""
+
+import hashlib
+from typing import Iterable
+
+__all__ = ["book_etag", "collection_etag", "etag_matches", "expected_versions"]
+
+
+def book_etag(book_id: int, version: int) -> str:
+    return f'"{book_id}.{version}"'
+
+
+def collection_etag(items: Iterable[tuple[int, int]], next_cursor: str | None) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for book_id, version in items:
+        digest.update(f"{book_id}.{version};".encode())
+    digest.update(f"next={next_cursor}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _parse(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match (слабое сравнение, как требует RFC 9110)."""
+    if not if_none_match:
+        return False
+
+    tags = _parse(if_none_match)
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def expected_versions(if_match: str | None, book_id: int) -> list[int] | None:
+    """Версии книги из заголовка If-Match. None - если условия нет (заголовка нет или там "*").
+
+    If-Match требует строгого сравнения, поэтому слабые ETag (W/...) и чужие id не подходят ни к одной версии.
+    """
+    if not if_match:
+        return None
+
+    tags = _parse(if_match)
+    if "*" in tags:
+        return None
+
+    versions = []
+    for tag in tags:
+        tag_id, _, version = tag.strip('"').partition(".")
+        if not tag.startswith("W/") and tag_id == str(book_id) and version.isdigit():
+            versions.append(int(version))
+    return versions
@@ -0,0 +1,227 @@
+"""
+Выгрузка всего каталога книг потоком: CSV, NDJSON или Parquet, при желании сжатая gzip/zstd.
+
+Память не зависит от размера таблицы: строки читаются пачками (серверный курсор или COPY),
+и каждая пачка уходит клиенту сразу после сериализации.
+
+- CSV на PostgreSQL выгружается через COPY ... TO STDOUT: сервер сам формирует CSV,
+  и Python только перекладывает байты. Очередь между COPY и ответом ограничена,
+  поэтому медленный клиент притормаживает COPY, а не копит данные в памяти.
+- NDJSON (и CSV на других БД) - через серверный курсор. NDJSON через COPY не сделать:
+  текстовый формат COPY экранирует обратные слэши и испортит JSON.
+- Parquet пишется группами строк (row group) по пачке на группу. Parquet сжимается сам,
+  поэтому compression для него задает кодек колонок, а не сжатие всего потока.
+
+pyarrow (Parquet) и zstandard (zstd) - необязательные зависимости: poetry install -E export.
+"""
+
+import asyncio
+import contextlib
+import csv
+import importlib
+import io
+import zlib
+from typing import Any, AsyncIterator, Callable
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.books import Book
+from src.monitoring import record_rows
+from src.schemas import ExportCompression, ExportFormat
+
+__all__ = [
+    "EXPORT_COLUMNS",
+    "MEDIA_TYPES",
+    "ExportUnavailableError",
+    "check_export_available",
+    "compress_stream",
+    "export_books",
+]
+
+EXPORT_COLUMNS = (Book.id, Book.title, Book.author, Book.year, Book.count_pages)
+EXPORT_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+
+MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv; charset=utf-8",
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+}
+
+# Сколько пачек COPY может ждать отправки клиенту
+COPY_QUEUE_SIZE = 8
+
+
+class ExportUnavailableError(RuntimeError):
+    """Для формата или сжатия не установлена необязательная зависимость."""
+
+
+def _import_optional(module: str) -> Any:
+    # Импортируем только при выгрузке: pyarrow тяжелый и не должен замедлять старт приложения
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ExportUnavailableError(f"{module} is not installed (poetry install -E export)") from None
+
+
+def check_export_available(export_format: ExportFormat, compression: ExportCompression) -> None:
+    """Проверяет зависимости до начала ответа: после первого байта вернуть ошибку уже нельзя."""
+    if export_format == ExportFormat.parquet:
+        _import_optional("pyarrow.parquet")
+    elif compression == ExportCompression.zstd:
+        _import_optional("zstandard")
+
+
+def _export_query():
+    return select(*EXPORT_COLUMNS).order_by(Book.id)
+
+
+async def _iter_partitions(session: AsyncSession, chunk_size: int) -> AsyncIterator[list[tuple]]:
+    result = await session.stream(_export_query().execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        record_rows(len(rows))
+        yield rows
+
+
+async def _copy_csv(session: AsyncSession) -> AsyncIterator[bytes]:
+    connection = await session.connection()
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+    sql = str(_export_query().compile(dialect=connection.dialect))
+
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=COPY_QUEUE_SIZE)
+
+    async def put(data: bytearray) -> None:
+        await queue.put(bytes(data))  # asyncpg отдает bytearray, а ответу нужны bytes
+
+    async def copy() -> None:
+        try:
+            await driver_connection.copy_from_query(sql, output=put, format="csv", header=True)
+        finally:
+            # При отмене из очереди уже никто не читает: в полной очереди put ждал бы вечно
+            if not asyncio.current_task().cancelling():
+                await queue.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+        await task  # Если COPY упал - здесь поднимется его ошибка
+    finally:
+        if not task.done():
+            # Клиент отключился раньше - останавливаем COPY и ждем, пока он остановится.
+            # После отмены COPY внутри транзакции asyncpg уже не может пользоваться соединением,
+            # поэтому оно не возвращается в пул, а закрывается
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            await connection.invalidate()
+
+
+async def _cursor_csv(session: AsyncSession, chunk_size: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_FIELDS)
+    async for rows in _iter_partitions(session, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():  # Пустая таблица - остался только заголовок
+        yield buffer.getvalue().encode()
+
+
+async def _cursor_ndjson(session: AsyncSession, chunk_size: int) -> AsyncIterator[bytes]:
+    async for rows in _iter_partitions(session, chunk_size):
+        yield b"".join(orjson.dumps(dict(zip(EXPORT_FIELDS, row))) + b"\n" for row in rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл, в который pyarrow пишет Parquet. Записанное забираем после каждой группы строк."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+async def _cursor_parquet(
+    session: AsyncSession, chunk_size: int, compression: ExportCompression
+) -> AsyncIterator[bytes]:
+    pa = _import_optional("pyarrow")
+    pq = _import_optional("pyarrow.parquet")
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("title", pa.string()),
+            ("author", pa.string()),
+            ("year", pa.int32()),
+            ("count_pages", pa.int32()),
+        ]
+    )
+    codec = "snappy" if compression == ExportCompression.none else compression.value
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=codec)
+    try:
+        async for rows in _iter_partitions(session, chunk_size):
+            writer.write_table(pa.Table.from_arrays([list(column) for column in zip(*rows)], schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()  # Дописывает футер с метаданными файла
+    yield sink.take()
+
+
+async def export_books(
+    session_factory: Callable[[], AsyncSession],
+    export_format: ExportFormat,
+    compression: ExportCompression,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    """Генератор тела ответа. Сессию открывает сам: ответ живет дольше зависимостей FastAPI."""
+    async with session_factory() as session:
+        if export_format == ExportFormat.parquet:
+            chunks = _cursor_parquet(session, chunk_size, compression)
+        else:
+            if export_format == ExportFormat.ndjson:
+                chunks = _cursor_ndjson(session, chunk_size)
+            elif session.get_bind().dialect.name == "postgresql":
+                chunks = _copy_csv(session)
+            else:
+                chunks = _cursor_csv(session, chunk_size)
+            chunks = compress_stream(chunks, compression)
+
+        # Если клиент отключился, генераторы закрываются здесь, пока сессия еще открыта
+        async with contextlib.aclosing(chunks):
+            async for chunk in chunks:
+                if chunk:
+                    yield chunk
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], compression: ExportCompression) -> AsyncIterator[bytes]:
+    """Сжимает поток. Исходный генератор закрывается вместе с этим, даже если его не дочитали."""
+    async with contextlib.aclosing(chunks):
+        if compression == ExportCompression.none:
+            async for chunk in chunks:
+                yield chunk
+            return
+
+        if compression == ExportCompression.gzip:
+            compressor = zlib.compressobj(wbits=31)  # 31 - формат gzip (с заголовком), а не "сырой" deflate
+        else:
+            compressor = _import_optional("zstandard").ZstdCompressor().compressobj()
+
+        async for chunk in chunks:
+            if data := compressor.compress(chunk):
+                yield data
+        yield compressor.flush()
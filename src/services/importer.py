@@ -0,0 +1,316 @@
+"""
+Импорт каталога книг из CSV или NDJSON через COPY.
+
+Файл читается потоком и проверяется пачками по тем же правилам, что и одиночная книга (IncomingBook).
+Прошедшие проверку строки идут бинарным COPY во временную таблицу books_import,
+а из нее - одним набором запросов в books_table:
+
+- upsert: книга ищется по паре (автор, название). Найденные обновляются (если что-то поменялось),
+  новые вставляются. Если в файле одна книга встречается несколько раз, побеждает последняя строка;
+- insert: все строки просто добавляются.
+
+Построчных INSERT нет вообще, поэтому большие файлы грузятся за минуты: время уходит на разбор в Python
+и на обновление индексов в БД. Невалидные строки не роняют импорт, а считаются в rejected.
+
+Командная строка (файл может быть сжат gzip):
+
+    python -m src.services.importer catalog.csv [--mode upsert|insert] [--format csv|ndjson]
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+from src.models.books import book_id_generator
+from src.schemas import ImportMode
+
+from .ingest import iter_ndjson_lines, length_errors, validate_book, validation_errors
+
+__all__ = ["ImportFormat", "ImportStats", "ImportUnavailableError", "iter_csv_records", "import_books"]
+
+logger = logging.getLogger(__name__)
+
+ImportFormat = Literal["csv", "ndjson"]
+
+# Импорты выполняются по одному: два одновременных upsert могли бы вставить одну книгу дважды
+IMPORT_LOCK_ID = 7_340_002
+
+STAGING_COLUMNS = ("line", "id", "title", "author", "year", "count_pages")
+# Колонки, которые переносим в books_table. id заранее выдаем сами только при стратегии snowflake,
+# иначе его выдаст последовательность БД
+INSERT_COLUMNS = ("id, " if book_id_generator is not None else "") + "title, author, year, count_pages"
+# Заголовки CSV, которые понимаем. Поле count_pages у IncomingBook принимается под именем pages
+CSV_COLUMN_ALIASES = {"count_pages": "pages"}
+
+
+class ImportUnavailableError(RuntimeError):
+    """Импорт через COPY поддерживается только для PostgreSQL."""
+
+
+@dataclass
+class ImportStats:
+    rows_read: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    duplicates: int = 0  # Повторы одной книги внутри файла (в режиме upsert)
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+    errors: list[dict] = field(default_factory=list)  # Первые settings.books_import_max_errors ошибок
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def report(self) -> dict[str, Any]:
+        return {**asdict(self), "seconds": round(self.seconds, 3), "rows_per_second": round(self.rows_per_second, 1)}
+
+
+async def iter_csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Собирает из кусков потока целые записи CSV.
+
+    Запись может занимать несколько строк (перевод строки внутри кавычек), поэтому запись считается
+    законченной, только когда кавычек в ней четное число.
+    """
+    parts: list[bytes] = []
+    quotes = 0
+    tail = b""
+    first = True
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            parts.append(line)
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                record = b"\n".join(parts).decode("utf-8-sig" if first else "utf-8")
+                parts, quotes, first = [], 0, False
+                if record.strip():
+                    yield record
+
+    parts.append(tail)
+    record = b"\n".join(parts).decode("utf-8-sig" if first else "utf-8")
+    if record.strip():
+        yield record
+
+
+async def _iter_items(chunks: AsyncIterable[bytes], file_format: ImportFormat) -> AsyncIterator[Any]:
+    if file_format == "ndjson":
+        async for line in iter_ndjson_lines(chunks):
+            yield line
+        return
+
+    header: list[str] | None = None
+    async for record in iter_csv_records(chunks):
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [CSV_COLUMN_ALIASES.get(name.strip(), name.strip()) for name in values]
+            continue
+        # Пустая ячейка - значит поля нет, и берется значение по умолчанию из IncomingBook
+        yield {name: value for name, value in zip(header, values) if value != ""}
+
+
+async def _create_staging_table(session: AsyncSession) -> None:
+    await session.execute(
+        text(
+            "CREATE TEMP TABLE books_import "
+            "(line bigint NOT NULL, id bigint, title text NOT NULL, author text NOT NULL, year int NOT NULL, "
+            "count_pages int NOT NULL) ON COMMIT DROP"
+        )
+    )
+
+
+async def _copy_to_staging(session: AsyncSession, records: list[tuple]) -> None:
+    connection = await session.connection()
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+    await driver_connection.copy_records_to_table("books_import", records=records, columns=STAGING_COLUMNS)
+
+
+async def _merge(
+    session: AsyncSession,
+    mode: ImportMode,
+    stats: ImportStats,
+    on_updated: Callable[[list[int]], Awaitable[None]] | None,
+) -> None:
+    await session.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": IMPORT_LOCK_ID})
+
+    if mode == ImportMode.insert:
+        res = await session.execute(
+            text(f"INSERT INTO books_table ({INSERT_COLUMNS}) SELECT {INSERT_COLUMNS} FROM books_import ORDER BY line")
+        )
+        stats.inserted = res.rowcount
+        return
+
+    # Последняя строка файла для каждой книги. Индекс и статистика - чтобы планировщик выбрал хороший join
+    await session.execute(
+        text(
+            "CREATE TEMP TABLE books_import_latest ON COMMIT DROP AS "
+            "SELECT DISTINCT ON (author, title) line, id, title, author, year, count_pages "
+            "FROM books_import ORDER BY author, title, line DESC"
+        )
+    )
+    await session.execute(text("CREATE INDEX ON books_import_latest (author, title)"))
+    await session.execute(text("ANALYZE books_import_latest"))
+    distinct = await session.scalar(text("SELECT count(*) FROM books_import_latest"))
+    stats.duplicates = stats.accepted - distinct
+
+    # id обновленных книг читаем пачками (серверный курсор): их может быть миллионы
+    updated = await session.stream(
+        text(
+            "UPDATE books_table AS b "
+            "SET year = s.year, count_pages = s.count_pages, version = b.version + 1 "
+            "FROM books_import_latest AS s "
+            "WHERE b.author = s.author AND b.title = s.title "
+            "AND (b.year, b.count_pages) IS DISTINCT FROM (s.year, s.count_pages) "
+            "RETURNING b.id"
+        ).execution_options(yield_per=settings.books_import_chunk_size)
+    )
+    async for rows in updated.partitions():
+        stats.updated += len(rows)
+        if on_updated is not None:
+            await on_updated([row[0] for row in rows])
+
+    res = await session.execute(
+        text(
+            f"INSERT INTO books_table ({INSERT_COLUMNS}) "
+            f"SELECT {INSERT_COLUMNS} FROM books_import_latest AS s "
+            "WHERE NOT EXISTS (SELECT 1 FROM books_table AS b WHERE b.author = s.author AND b.title = s.title) "
+            "ORDER BY s.line"
+        )
+    )
+    stats.inserted = res.rowcount
+    stats.unchanged = distinct - stats.updated - stats.inserted
+
+
+async def import_books(
+    session: AsyncSession,
+    chunks: AsyncIterable[bytes],
+    file_format: ImportFormat,
+    mode: ImportMode = ImportMode.upsert,
+    on_progress: Callable[[ImportStats], None] | None = None,
+    on_updated: Callable[[list[int]], Awaitable[None]] | None = None,
+) -> ImportStats:
+    """
+    Загружает книги из потока байтов. Транзакцией управляет вызывающий код: все изменения
+    появятся в books_table только после коммита.
+
+    on_progress вызывается после каждой пачки, on_updated получает id обновленных книг (например, чтобы сбросить кэш).
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        raise ImportUnavailableError("Bulk import requires PostgreSQL (COPY)")
+
+    started_at = time.perf_counter()
+    stats = ImportStats()
+    await _create_staging_table(session)
+
+    batch: list[tuple] = []
+    async for item in _iter_items(chunks, file_format):
+        stats.rows_read += 1
+        try:
+            book = validate_book(item)
+        except ValidationError as e:
+            errors = validation_errors(e)
+        else:
+            errors = length_errors(book)
+            if not errors:
+                book_id = book_id_generator() if book_id_generator is not None else None
+                batch.append((stats.rows_read, book_id, book.title, book.author, book.year, book.count_pages))
+
+        if errors:
+            stats.rejected += 1
+            if len(stats.errors) < settings.books_import_max_errors:
+                stats.errors.append({"index": stats.rows_read, "errors": errors})
+
+        if len(batch) >= settings.books_import_chunk_size:
+            await _copy_to_staging(session, batch)
+            stats.accepted += len(batch)
+            batch = []
+            stats.seconds = time.perf_counter() - started_at
+            if on_progress is not None:
+                on_progress(stats)
+
+    if batch:
+        await _copy_to_staging(session, batch)
+        stats.accepted += len(batch)
+
+    await _merge(session, mode, stats, on_updated)
+    # ON COMMIT DROP уберет таблицы и при ошибке, но вызывающий код может импортировать еще раз до коммита
+    await session.execute(text("DROP TABLE IF EXISTS books_import, books_import_latest"))
+    stats.seconds = time.perf_counter() - started_at
+    if on_progress is not None:
+        on_progress(stats)
+
+    logger.info(
+        "Imported books: read=%d inserted=%d updated=%d rejected=%d in %.1fs",
+        stats.rows_read,
+        stats.inserted,
+        stats.updated,
+        stats.rejected,
+        stats.seconds,
+    )
+    return stats
+
+
+async def _iter_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    # Чтение файла блокирующее, поэтому уводим его в поток, чтобы не стопорить цикл событий
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as file:
+        while chunk := await asyncio.to_thread(file.read, chunk_size):
+            yield chunk
+
+
+def _detect_format(path: str) -> ImportFormat:
+    name = path.removesuffix(".gz")
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def _print_progress(stats: ImportStats) -> None:
+    print(
+        f"read={stats.rows_read} accepted={stats.accepted} rejected={stats.rejected} "
+        f"inserted={stats.inserted} updated={stats.updated} ({stats.rows_per_second:.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+async def run(path: str, file_format: ImportFormat, mode: ImportMode) -> ImportStats:
+    engine = create_async_engine(settings.database_url, poolclass=NullPool)
+    try:
+        async with AsyncSession(engine) as session:
+            stats = await import_books(session, _iter_file(path), file_format, mode, on_progress=_print_progress)
+            await session.commit()
+        return stats
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m src.services.importer", description=__doc__)
+    parser.add_argument("path", help="Файл CSV или NDJSON (можно .gz)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="По умолчанию - по расширению файла")
+    parser.add_argument("--mode", choices=[mode.value for mode in ImportMode], default=ImportMode.upsert.value)
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args.path, args.format or _detect_format(args.path), ImportMode(args.mode)))
+    for error in stats.errors:
+        print(f"row {error['index']}: {error['errors']}", file=sys.stderr)
+    print(json.dumps({**stats.report(), "errors": len(stats.errors)}))
+
+
+if __name__ == "__main__":
+    main()
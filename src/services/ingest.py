@@ -0,0 +1,83 @@
+"""
+Разбор входящих данных для массовой загрузки книг.
+
+Тело запроса может быть очень большим, поэтому NDJSON читаем построчно прямо из потока
+и ничего не накапливаем целиком. JSON массив так не разобрать, поэтому его размер ограничен (read_body).
+"""
+
+from typing import Any, AsyncIterable, AsyncIterator
+
+from pydantic import ValidationError
+
+from src.models.books import Book
+from src.schemas import IncomingBook
+
+__all__ = [
+    "NDJSON_MEDIA_TYPES",
+    "MAX_LENGTHS",
+    "BodyTooLargeError",
+    "is_ndjson",
+    "read_body",
+    "iter_ndjson_lines",
+    "validate_book",
+    "validation_errors",
+    "length_errors",
+]
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+# Длины строк проверяем до записи: одна слишком длинная строка уронила бы весь INSERT (или COPY) в books_table
+MAX_LENGTHS = {"title": Book.__table__.c.title.type.length, "author": Book.__table__.c.author.type.length}
+
+
+class BodyTooLargeError(Exception):
+    pass
+
+
+def is_ndjson(content_type: str | None) -> bool:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return media_type in NDJSON_MEDIA_TYPES
+
+
+async def read_body(chunks: AsyncIterable[bytes], max_size: int) -> bytes:
+    """Читает тело целиком, но не больше max_size байт: на большем теле бросает BodyTooLargeError."""
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > max_size:
+            raise BodyTooLargeError(f"Body is larger than {max_size} bytes")
+    return bytes(body)
+
+
+async def iter_ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Собирает строки из кусков потока. Пустые строки пропускает."""
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+
+    if tail.strip():
+        yield tail
+
+
+def validate_book(item: Any) -> IncomingBook:
+    """Валидирует одну книгу: строку JSON (из NDJSON) или уже разобранный объект (из JSON массива)."""
+    if isinstance(item, (bytes, str)):
+        return IncomingBook.model_validate_json(item)
+    return IncomingBook.model_validate(item)
+
+
+def validation_errors(error: ValidationError) -> list[dict]:
+    # Без input/ctx/url: в них могут быть несериализуемые объекты, а клиенту хватит места и текста ошибки
+    return error.errors(include_url=False, include_context=False, include_input=False)
+
+
+def length_errors(book: IncomingBook) -> list[dict]:
+    """Ошибки в том же виде, что и validation_errors, для строк длиннее колонок books_table."""
+    return [
+        {"type": "string_too_long", "loc": [name], "msg": f"String should have at most {max_length} characters"}
+        for name, max_length in MAX_LENGTHS.items()
+        if len(getattr(book, name)) > max_length
+    ]
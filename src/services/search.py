@@ -0,0 +1,44 @@
+"""
+Поиск книг по названию и автору.
+
+В PostgreSQL это полнотекстовый поиск по tsvector с GIN индексом: каждое слово запроса
+ищется как префикс ("пушк" найдет "Пушкин"), результаты ранжируются по ts_rank.
+В других БД (SQLite в тестах) - упрощенный поиск по подстроке без индекса.
+"""
+
+import re
+
+from sqlalchemy import Select, and_, case, func, literal_column, or_, select
+
+from src.models.books import BOOK_RECORD_COLUMNS, Book, book_search_vector
+
+__all__ = ["build_search_query", "search_terms"]
+
+
+def search_terms(q: str) -> list[str]:
+    """Слова из строки запроса. Все остальное (операторы tsquery, знаки препинания) отбрасываем."""
+    return [term.lower() for term in re.findall(r"\w+", q)]
+
+
+def build_search_query(q: str, limit: int, dialect_name: str) -> Select | None:
+    """Запрос поиска книг. None - если в строке запроса нет ни одного слова."""
+    if not (terms := search_terms(q)):
+        return None
+
+    if dialect_name == "postgresql":
+        ts_query = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+        rank = func.ts_rank(book_search_vector, ts_query)
+        query = select(*BOOK_RECORD_COLUMNS).where(book_search_vector.op("@@")(ts_query)).order_by(rank.desc(), Book.id)
+    else:
+        title, author = func.lower(Book.title), func.lower(Book.author)
+        conditions = [
+            or_(title.contains(term, autoescape=True), author.contains(term, autoescape=True)) for term in terms
+        ]
+        # Совпадение с началом слова ценнее, чем с серединой
+        rank = sum(
+            case((or_(title.startswith(term, autoescape=True), author.startswith(term, autoescape=True)), 2), else_=1)
+            for term in terms
+        )
+        query = select(*BOOK_RECORD_COLUMNS).where(and_(*conditions)).order_by(rank.desc(), Book.id)
+
+    return query.limit(limit)
@@ -0,0 +1,176 @@
+"""
+Сводная статистика каталога (см. src/models/stats.py).
+
+На PostgreSQL ручка читает готовые суммы из book_author_stats и book_year_stats: их держат в актуальном
+состоянии триггеры, и запрос не зависит от размера каталога. К суммам прибавляются изменения текущей транзакции,
+которые она перенесет в статистику только при коммите: так транзакция видит свои записи.
+В других БД (SQLite в тестах) триггеров нет, и статистика считается GROUP BY по всей таблице.
+
+Командная строка:
+
+    python -m src.services.stats rebuild   # пересобрать статистику по books_table
+    python -m src.services.stats check     # код возврата 1, если статистика разошлась с таблицей
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any
+
+from sqlalchemy import BigInteger, Select, cast, func, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.models.stats import BookAuthorStats, BookYearStats, book_stats_deltas
+
+__all__ = ["get_book_stats", "rebuild_book_stats", "find_stats_mismatches"]
+
+
+def _computed_by_author() -> Select:
+    return select(Book.author, func.count(), func.sum(Book.count_pages)).group_by(Book.author)
+
+
+def _computed_by_year() -> Select:
+    return select(Book.year, func.count(), func.sum(Book.count_pages)).group_by(Book.year)
+
+
+def _own_deltas(key) -> Select:
+    """Изменения текущей транзакции по ключу (автор или год), еще не перенесенные в статистику.
+
+    В транзакции, которая ничего не писала (и на реплике), номера транзакции нет - и изменений тоже.
+    """
+    return (
+        select(
+            key,
+            cast(func.sum(book_stats_deltas.c.books), BigInteger),
+            cast(func.sum(book_stats_deltas.c.pages), BigInteger),
+        )
+        .where(book_stats_deltas.c.txid == func.txid_current_if_assigned())
+        .group_by(key)
+    )
+
+
+def _stored_by_author(limit: int | None = None) -> Select:
+    """Статистика по авторам с изменениями текущей транзакции, больше всего книг - первыми."""
+    pending = _own_deltas(book_stats_deltas.c.author).subquery("pending")
+    author, books, pages = pending.c
+    # Авторов без изменений берем сразу в порядке индекса ix_book_author_stats_books: с limit читается только начало
+    untouched = (
+        select(BookAuthorStats.author, BookAuthorStats.books, BookAuthorStats.pages)
+        .where(BookAuthorStats.author.not_in(select(author)))
+        .order_by(BookAuthorStats.books.desc(), BookAuthorStats.author)
+        .limit(limit)
+    )
+    touched = select(
+        author, func.coalesce(BookAuthorStats.books, 0) + books, func.coalesce(BookAuthorStats.pages, 0) + pages
+    ).select_from(pending.outerjoin(BookAuthorStats, BookAuthorStats.author == author))
+    rows = union_all(untouched, touched).subquery()
+    return select(*rows.c).where(rows.c.books != 0).order_by(rows.c.books.desc(), rows.c.author).limit(limit)
+
+
+def _stored_by_year() -> Select:
+    """Статистика по годам с изменениями текущей транзакции. Годов немного, поэтому просто складываем."""
+    rows = union_all(
+        select(BookYearStats.year, BookYearStats.books, BookYearStats.pages),
+        _own_deltas(book_stats_deltas.c.year),
+    ).subquery()
+    year, books, pages = rows.c
+    return (
+        select(year, cast(func.sum(books), BigInteger), cast(func.sum(pages), BigInteger))
+        .group_by(year)
+        .having(func.sum(books) != 0)
+        .order_by(year)
+    )
+
+
+async def get_book_stats(session: AsyncSession, authors_limit: int) -> dict[str, Any]:
+    """Статистика для ручки: authors_limit авторов с наибольшим числом книг и все годы."""
+    if session.get_bind().dialect.name == "postgresql":
+        by_author = _stored_by_author(authors_limit)
+        by_year = _stored_by_year()
+    else:
+        by_author = _computed_by_author().order_by(func.count().desc(), Book.author).limit(authors_limit)
+        by_year = _computed_by_year().order_by(Book.year)
+
+    authors = [
+        {"author": author, "books": books, "pages": pages} for author, books, pages in await session.execute(by_author)
+    ]
+    years = [{"year": year, "books": books, "pages": pages} for year, books, pages in await session.execute(by_year)]
+
+    return {
+        # Годов немного (один на строку), поэтому итоги проще сложить здесь, чем держать отдельную таблицу
+        "total_books": sum(year["books"] for year in years),
+        "total_pages": sum(year["pages"] for year in years),
+        "authors": authors,
+        "years": years,
+    }
+
+
+async def rebuild_book_stats(session: AsyncSession) -> None:
+    """Пересчитывает статистику с нуля. Запись в books_table на это время блокируется, чтение - нет."""
+    await session.execute(text("LOCK TABLE books_table IN SHARE MODE"))
+    await session.execute(text("TRUNCATE book_author_stats, book_year_stats"))
+    # Свои еще не перенесенные изменения уже учтены пересчетом. Чужих нет: SHARE ждет конца пишущих транзакций
+    await session.execute(text("DELETE FROM book_stats_deltas WHERE txid = txid_current()"))
+    await session.execute(
+        text(
+            "INSERT INTO book_author_stats (author, books, pages) "
+            "SELECT author, count(*), sum(count_pages) FROM books_table GROUP BY author"
+        )
+    )
+    await session.execute(
+        text(
+            "INSERT INTO book_year_stats (year, books, pages) "
+            "SELECT year, count(*), sum(count_pages) FROM books_table GROUP BY year"
+        )
+    )
+
+
+async def find_stats_mismatches(session: AsyncSession) -> list[dict[str, Any]]:
+    """Сверяет статистику с GROUP BY по books_table. Пустой список - все сходится."""
+    mismatches = []
+    checks = (
+        ("author", _computed_by_author(), _stored_by_author()),
+        ("year", _computed_by_year(), _stored_by_year()),
+    )
+    for key, computed_query, stored_query in checks:
+        computed = {row[0]: tuple(row[1:]) for row in await session.execute(computed_query)}
+        stored = {row[0]: tuple(row[1:]) for row in await session.execute(stored_query)}
+        for value in sorted(computed.keys() | stored.keys()):
+            if computed.get(value) != stored.get(value):
+                mismatches.append({key: value, "expected": computed.get(value), "stored": stored.get(value)})
+    return mismatches
+
+
+async def run(command: str) -> int:
+    engine = create_async_engine(settings.database_url, poolclass=NullPool)
+    try:
+        async with AsyncSession(engine) as session:
+            if command == "rebuild":
+                await rebuild_book_stats(session)
+                await session.commit()
+                print("Book statistics rebuilt")
+                return 0
+
+            mismatches = await find_stats_mismatches(session)
+            for mismatch in mismatches:
+                print(json.dumps(mismatch, ensure_ascii=False), file=sys.stderr)
+            print(f"Mismatches: {len(mismatches)}")
+            return 1 if mismatches else 0
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.services.stats", description=__doc__)
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.command)))
+
+
+if __name__ == "__main__":
+    main()
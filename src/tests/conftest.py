@@ -3,76 +3,205 @@
 Сам пайтест подтягивает их по имени из файла conftest.py
 """
 
-import asyncio
+import hashlib
+import os
+from contextlib import nullcontext
+from pathlib import Path
 
 import httpx
 import pytest
 import pytest_asyncio
+from pytest_asyncio import is_async_test
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
 
+import src.models.base
 from src.configurations.settings import settings
 from src.models import books  # noqa
 from src.models.base import BaseModel
 from src.models.books import Book  # noqa F401
-
-# Переопределяем движок для запуска тестов и подключаем его к тестовой базе.
-# Это решает проблему с сохранностью данных в основной базе приложения.
-# Фикстуры тестов их не зачистят.
-# и обеспечивает чистую среду для запуска тестов. В ней не будет лишних записей.
-async_test_engine = create_async_engine(
-    settings.database_test_url,
-    echo=True,
-)
-
-# Создаем фабрику сессий для тестового движка.
-async_test_session = async_sessionmaker(async_test_engine, expire_on_commit=False, autoflush=False)
-
-
-# Получаем цикл событий для асинхорнного потока выполнения задач.
+from src.monitoring import install_query_hooks
+
+# Тесты ходят в отдельную тестовую БД: данные основной базы фикстуры не зачистят.
+# Под pytest-xdist (pytest -n auto) у каждого воркера своя БД - копия шаблона со всеми таблицами:
+# копия создается за доли секунды, а шаблон пересоздается, только если поменялись модели.
+TEMPLATE_DB = f"{settings.db_test_name}_template"
+if worker := os.environ.get("PYTEST_XDIST_WORKER"):
+    settings.db_test_name = f"{settings.db_test_name}_{worker}"
+
+# Ключ advisory lock: воркеры по очереди проверяют шаблон и копируют его.
+# Не совпадает с ключами приложения: 7_340_001 - миграции (MIGRATIONS_LOCK_ID), 7_340_002 - импорт (IMPORT_LOCK_ID)
+TEMPLATE_LOCK_ID = 7_340_003
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--sqlite",
+        action="store_true",
+        help="Гонять тесты на SQLite в памяти, без PostgreSQL. Тесты с пометкой postgresql пропускаются",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgresql: тесту нужен PostgreSQL (в режиме --sqlite он пропускается)")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Все асинхронные тесты идут в одном цикле событий: тогда пул тестового движка живет всю сессию,
+    # и соединения не открываются заново в каждом тесте
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    needs_postgresql = pytest.mark.skip(reason="needs PostgreSQL")
+    for item in items:
+        if is_async_test(item):
+            item.add_marker(session_loop, append=False)
+        if config.getoption("--sqlite") and "postgresql" in item.keywords:
+            item.add_marker(needs_postgresql)
+
+
+def _schema_fingerprint() -> str:
+    # Таблицы из create_all зависят от моделей и от настроек секционирования и id
+    digest = hashlib.sha256()
+    # Путь от файла пакета, а не от текущей папки: pytest запускают и из корня, и из src
+    for path in sorted(Path(src.models.base.__file__).resolve().parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    options = (settings.db_partitioning, settings.db_partition_count, settings.db_partition_year_step)
+    digest.update(repr((*options, settings.db_id_strategy)).encode())
+    return digest.hexdigest()
+
+
+async def _clone_test_database() -> None:
+    """Создает тестовую БД копией шаблона. Шаблон пересоздается по моделям, если они поменялись."""
+    fingerprint = _schema_fingerprint()
+    admin_engine = create_async_engine(f"{settings.db_host}/postgres", poolclass=NullPool, isolation_level="AUTOCOMMIT")
+    try:
+        async with admin_engine.connect() as connection:
+            await connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": TEMPLATE_LOCK_ID})
+            template_fingerprint = await connection.scalar(
+                text("SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = :name"),
+                {"name": TEMPLATE_DB},
+            )
+            if template_fingerprint != fingerprint:
+                await connection.execute(text(f"DROP DATABASE IF EXISTS {TEMPLATE_DB} WITH (FORCE)"))
+                await connection.execute(text(f"CREATE DATABASE {TEMPLATE_DB}"))
+                template_engine = create_async_engine(f"{settings.db_host}/{TEMPLATE_DB}", poolclass=NullPool)
+                async with template_engine.begin() as template_connection:
+                    await template_connection.run_sync(BaseModel.metadata.create_all)
+                await template_engine.dispose()
+                await connection.execute(text(f"COMMENT ON DATABASE {TEMPLATE_DB} IS '{fingerprint}'"))
+
+            await connection.execute(text(f"DROP DATABASE IF EXISTS {settings.db_test_name} WITH (FORCE)"))
+            await connection.execute(text(f"CREATE DATABASE {settings.db_test_name} TEMPLATE {TEMPLATE_DB}"))
+            await connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": TEMPLATE_LOCK_ID})
+    finally:
+        await admin_engine.dispose()
+
+
+def _use_savepoints_on_sqlite(engine) -> None:
+    # pysqlite (и aiosqlite) сам решает, когда начать транзакцию, и SAVEPOINT без этого не работают.
+    # Рецепт из документации SQLAlchemy: транзакции начинает только SQLAlchemy
+    @event.listens_for(engine.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+# Тестовый движок. Таблицы в нем уже есть: в PostgreSQL - из шаблона, в SQLite в памяти - из create_all.
+# SQL в лог не пишется (DB_ECHO=true включит): на сотнях тестов это только шум и лишнее время
 @pytest_asyncio.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for each test case."""
-    # loop = asyncio.new_event_loop() # На разных версиях питона и разных ОС срабатывает по разному
-    loop = asyncio.get_event_loop()
-    yield loop
-    loop.close()
-
-
-# Создаем таблицы в тестовой БД. Предварительно удаляя старые.
-@pytest_asyncio.fixture(scope="session", autouse=True)
-async def create_tables() -> None:
-    """Create tables in DB."""
-    async with async_test_engine.begin() as connection:
-        await connection.run_sync(BaseModel.metadata.drop_all)
-        await connection.run_sync(BaseModel.metadata.create_all)
-
-
-# Создаем сессию для БД используемую для тестов
+async def async_test_engine(request):
+    if request.config.getoption("--sqlite"):
+        # Одно соединение на всю сессию: у каждого соединения с ":memory:" своя пустая БД
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool, echo=settings.db_echo)
+        _use_savepoints_on_sqlite(engine)
+        async with engine.begin() as connection:
+            await connection.run_sync(BaseModel.metadata.create_all)
+    else:
+        await _clone_test_database()
+        engine = create_async_engine(settings.database_test_url, echo=settings.db_echo)
+
+    install_query_hooks(engine.sync_engine)  # Как у движка приложения: для Server-Timing и метрик
+    yield engine
+    await engine.dispose()
+
+
+# Сессия для теста. Все, что тест записал, откатывается вместе с внешней транзакцией,
+# а commit() внутри кода под тестом фиксирует только SAVEPOINT и не выходит за ее пределы
 @pytest_asyncio.fixture(scope="function")
-async def db_session():
+async def db_session(async_test_engine):
     async with async_test_engine.connect() as connection:
-        async with async_test_session(bind=connection) as session:
+        transaction = await connection.begin()
+        session_factory = async_sessionmaker(
+            bind=connection, expire_on_commit=False, autoflush=False, join_transaction_mode="create_savepoint"
+        )
+        async with session_factory() as session:
             yield session
-            await session.rollback()
+        await transaction.rollback()
 
 
-# Коллбэк для переопределения сессии в приложении
+# Коллбэк для переопределения сессии в приложении. Тестовую сессию делят и одновременные запросы,
+# поэтому ее не коммитим, но действия, отложенные до коммита (сброс кэша), выполняем как в приложении
 @pytest.fixture(scope="function")
 def override_get_async_session(db_session):
+    from src.configurations.database import run_after_commit
+
     async def _override_get_async_session():
         yield db_session
+        await run_after_commit(db_session)
 
     return _override_get_async_session
 
 
+# Коллбэк для переопределения фабрики сессий (ее используют стриминговые ручки).
+# Отдаем ту же тестовую сессию, чтобы стрим видел данные, созданные в тесте.
+@pytest.fixture(scope="function")
+def override_get_session_factory(db_session):
+    def _override_get_session_factory():
+        return lambda: nullcontext(db_session)
+
+    return _override_get_session_factory
+
+
+# Свой кэш книг на каждый тест, чтобы данные одного теста не протекали в другой
+@pytest.fixture(scope="function")
+def books_cache():
+    from src.services.cache import InMemoryCacheBackend, ReadThroughCache
+
+    return ReadThroughCache(InMemoryCacheBackend(max_size=100), ttl=60, negative_ttl=5)
+
+
+# Своя очередь пакетной записи на каждый тест. Пишет через тестовую сессию, без коммита
+@pytest.fixture(scope="function")
+def books_batcher(db_session):
+    from src.services.batching import InsertBatcher, insert_books
+
+    return InsertBatcher(lambda rows: insert_books(db_session, rows), max_batch_size=100, max_delay=0.005)
+
+
 # Мы не можем создать 2 приложения (app) - это приведет к ошибкам.
 # Поэтому, на время запуска тестов мы подменяем там зависимость с сессией
 @pytest.fixture(scope="function")
-def test_app(override_get_async_session):
-    from src.configurations.database import get_async_session
+def test_app(override_get_async_session, override_get_session_factory, books_cache, books_batcher):
+    from src.configurations.database import (
+        get_async_read_session,
+        get_async_session,
+        get_read_session_factory,
+        get_session_factory,
+    )
     from src.main import app
+    from src.services.batching import get_books_insert_batcher
+    from src.services.cache import get_books_cache
 
+    # Реплик в тестах нет: и запись, и чтение идут через одну тестовую сессию
     app.dependency_overrides[get_async_session] = override_get_async_session
+    app.dependency_overrides[get_async_read_session] = override_get_async_session
+    app.dependency_overrides[get_session_factory] = override_get_session_factory
+    app.dependency_overrides[get_read_session_factory] = override_get_session_factory
+    app.dependency_overrides[get_books_cache] = lambda: books_cache
+    app.dependency_overrides[get_books_insert_batcher] = lambda: books_batcher
 
     return app
 
@@ -0,0 +1,151 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.services.admission import (
+    AdmissionMiddleware,
+    ConcurrencyLimiter,
+    InMemoryRateLimitBackend,
+    RedisRateLimitBackend,
+    TokenBucketLimiter,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# Замена Redis: скрипт не выполняет, только запоминает вызов и возвращает ответ, как настоящий клиент
+class FakeRedis:
+    def __init__(self, reply: bytes):
+        self.reply = reply
+        self.calls = []
+
+    async def eval(self, script, numkeys, *args):
+        self.calls.append((numkeys, *args))
+        return self.reply
+
+
+def _app_with_limits(**limits) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    @app.get("/internal/health")
+    async def health():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, **limits)
+    return app
+
+
+# Тест на ведро токенов: всплеск до burst, дальше - по rate в секунду
+@pytest.mark.asyncio
+async def test_token_bucket_in_memory():
+    clock = FakeClock()
+    backend = InMemoryRateLimitBackend(max_keys=2, clock=clock)
+
+    assert [await backend.consume("a", rate=2, burst=2) for _ in range(3)] == [0.0, 0.0, 0.5]
+    assert await backend.consume("b", rate=2, burst=2) == 0.0  # У другого клиента свое ведро
+
+    clock.now = 0.5  # За полсекунды набежал один токен
+    assert await backend.consume("a", rate=2, burst=2) == 0.0
+    assert await backend.consume("a", rate=2, burst=2) == 0.5
+
+    await backend.consume("c", rate=2, burst=2)
+    assert len(backend) == 2  # Самый давний клиент вытеснен
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_redis_backend():
+    client = FakeRedis(reply=b"0.25")
+
+    wait = await RedisRateLimitBackend(client, prefix="test:").consume("10.0.0.1", rate=4, burst=10)
+
+    assert wait == 0.25
+    assert client.calls == [(1, "test:10.0.0.1", 4, 10)]
+
+
+# Тест на очередь за слотом: ждущие получают слоты по порядку, а дольше queue_timeout никто не ждет
+@pytest.mark.asyncio
+async def test_concurrency_limiter_queue():
+    limiter = ConcurrencyLimiter(limit=1, queue_timeout=0.1, max_queue=10)
+    assert await limiter.acquire()
+
+    first = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    limiter.release()
+
+    assert await first is True
+    assert await second is False  # Слот не освободился за queue_timeout
+    assert (limiter.in_flight, limiter.queued, limiter.admitted, limiter.shed) == (1, 0, 2, 1)
+
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+# Тест на быстрый отказ: когда очередь уже стоит дольше цели, новые запросы не ждут
+@pytest.mark.asyncio
+async def test_concurrency_limiter_sheds_without_waiting():
+    clock = FakeClock()
+    limiter = ConcurrencyLimiter(limit=1, queue_timeout=0.5, max_queue=10, clock=clock)
+    await limiter.acquire()
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    clock.now = 1.0
+    assert await limiter.acquire() is False
+
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert limiter.queued == 0
+    assert limiter.in_flight == 1
+
+
+# Тест на middleware: лишний одновременный запрос получает 503, служебные ручки не ограничены
+@pytest.mark.asyncio
+async def test_admission_middleware_sheds_overload():
+    app = _app_with_limits(concurrency_limiter=ConcurrencyLimiter(limit=1, queue_timeout=0.05, max_queue=10))
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(client.get("/slow"), client.get("/slow"), client.get("/internal/health"))
+
+    assert sorted(response.status_code for response in responses) == [200, 200, 503]
+    shed = next(response for response in responses if response.status_code == 503)
+    assert shed.headers["Retry-After"] == "1"
+    assert shed.json() == {"detail": "Server is overloaded"}
+
+
+# Тест на middleware: клиент сверх частоты получает 429 и время, через которое можно повторить
+@pytest.mark.asyncio
+async def test_admission_middleware_rate_limits():
+    limiter = TokenBucketLimiter(InMemoryRateLimitBackend(), rate=0.5, burst=1)
+    app = _app_with_limits(rate_limiter=limiter)
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        first = await client.get("/internal/health")
+        second = await client.get("/slow")
+        third = await client.get("/slow")
+
+    assert (first.status_code, second.status_code, third.status_code) == (200, 200, 429)
+    assert third.headers["Retry-After"] == "2"
+    assert limiter.limited == 1
+
+
+@pytest.mark.asyncio
+async def test_admission_stats_endpoint(async_client):
+    response = await async_client.get("/internal/admission")
+
+    assert response.status_code == 200
+    assert response.json()["concurrency_limit"] >= 1
@@ -0,0 +1,25 @@
+from src.benchmarks.load import compare_results, percentile
+
+
+# Тест на перцентили по методу ближайшего ранга
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+# Тест на поиск регрессий между двумя прогонами бенчмарка
+def test_compare_results():
+    baseline = {
+        "scenarios": {"get_book": {"rps": 1000.0, "p95_ms": 10.0}, "list_books": {"rps": 500.0, "p95_ms": 20.0}}
+    }
+    current = {"scenarios": {"get_book": {"rps": 950.0, "p95_ms": 10.5}, "list_books": {"rps": 400.0, "p95_ms": 30.0}}}
+
+    assert compare_results(baseline, current, max_regression=0.1) == [
+        "list_books: rps 500.0 -> 400.0",
+        "list_books: p95 20.00ms -> 30.00ms",
+    ]
+    assert compare_results(baseline, current, max_regression=0.6) == []
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from src.configurations.settings import settings
+from src.models import books
+from src.services.batching import InsertBatcher
+
+
+# Писатель для тестов: запоминает пачки и выдает строкам номера по порядку.
+# Пачку со строкой из fail_on отвергает, как БД отвергла бы строку с нарушением ограничения
+class FakeWriter:
+    def __init__(self, fail_on: set[str] = frozenset(), error: Exception | None = None):
+        self.batches: list[list[dict]] = []
+        self.fail_on = fail_on
+        self.error = error  # Ошибка на любую пачку (БД недоступна)
+        self.next_id = 1
+
+    async def __call__(self, rows: list[dict]) -> list[int]:
+        self.batches.append(rows)
+        if self.error is not None:
+            raise self.error
+        if any(row["title"] in self.fail_on for row in rows):
+            raise IntegrityError("INSERT INTO books_table ...", None, ValueError("bad row"))
+
+        ids = list(range(self.next_id, self.next_id + len(rows)))
+        self.next_id += len(rows)
+        return ids
+
+
+# Тест на сборку одновременных вставок в одну пачку по размеру
+@pytest.mark.asyncio
+async def test_batch_by_size():
+    writer = FakeWriter()
+    batcher = InsertBatcher(writer, max_batch_size=3, max_delay=10)
+
+    ids = await asyncio.gather(*(batcher.submit({"title": str(i)}) for i in range(3)))
+
+    assert ids == [1, 2, 3]
+    assert [[row["title"] for row in batch] for batch in writer.batches] == [["0", "1", "2"]]
+
+
+# Тест на запись неполной пачки по времени
+@pytest.mark.asyncio
+async def test_batch_by_delay():
+    writer = FakeWriter()
+    batcher = InsertBatcher(writer, max_batch_size=100, max_delay=0.01)
+
+    ids = await asyncio.wait_for(asyncio.gather(batcher.submit({"title": "a"}), batcher.submit({"title": "b"})), 1)
+
+    assert ids == [1, 2]
+    assert len(writer.batches) == 1
+
+
+# Тест на ошибку в пачке: ошибку получает только запрос с плохой строкой, остальные получают свои id
+@pytest.mark.asyncio
+async def test_batch_error_isolation():
+    writer = FakeWriter(fail_on={"bad"})
+    batcher = InsertBatcher(writer, max_batch_size=4, max_delay=10)
+
+    results = await asyncio.gather(
+        *(batcher.submit({"title": title}) for title in ("a", "bad", "c", "d")), return_exceptions=True
+    )
+
+    assert isinstance(results[1], IntegrityError)
+    assert [result for i, result in enumerate(results) if i != 1] == [1, 2, 3]
+
+
+# Тест на недоступную БД: пачка не делится на части, все запросы сразу получают ошибку после одной попытки
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [OperationalError("INSERT INTO books_table ...", None, ConnectionResetError()), asyncio.TimeoutError()],
+)
+async def test_batch_outage_fails_whole_batch(error):
+    writer = FakeWriter(error=error)
+    batcher = InsertBatcher(writer, max_batch_size=8, max_delay=10)
+
+    results = await asyncio.gather(*(batcher.submit({"title": str(i)}) for i in range(8)), return_exceptions=True)
+
+    assert results == [error] * 8
+    assert len(writer.batches) == 1
+    assert batcher.batches == 0
+
+
+# Тест на дозапись очереди при остановке
+@pytest.mark.asyncio
+async def test_close_flushes_pending():
+    writer = FakeWriter()
+    batcher = InsertBatcher(writer, max_batch_size=100, max_delay=10)
+
+    pending = asyncio.ensure_future(batcher.submit({"title": "a"}))
+    await asyncio.sleep(0)
+    await batcher.close()
+
+    assert await pending == 1
+
+
+# Тест на ручку создания книги в режиме пакетной записи: одновременные запросы пишутся одним INSERT
+@pytest.mark.asyncio
+async def test_create_book_batched(db_session, async_client, books_batcher, monkeypatch):
+    monkeypatch.setattr(settings, "books_write_batching", True)
+    data = [{"title": f"Book {i}", "author": "Pushkin", "pages": 100 + i, "year": 2001} for i in range(5)]
+
+    responses = await asyncio.gather(*(async_client.post("/api/v1/books/", json=book) for book in data))
+
+    assert [response.status_code for response in responses] == [status.HTTP_201_CREATED] * 5
+    assert books_batcher.batches == 1
+    for book, response in zip(data, responses):
+        result = response.json()
+        assert response.headers["ETag"] == f'"{result["id"]}.1"'
+        saved = await db_session.scalar(select(books.Book).where(books.Book.id == result["id"]))
+        assert (saved.title, saved.count_pages) == (book["title"], book["pages"])
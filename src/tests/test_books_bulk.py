@@ -0,0 +1,110 @@
+import orjson
+import pytest
+from fastapi import status
+from sqlalchemy import select
+
+from src.models import books
+
+
+# Тест на массовое создание книг из JSON массива с невалидной записью посередине
+@pytest.mark.asyncio
+async def test_create_books_bulk_json(db_session, async_client):
+    data = [
+        {"title": "Eugeny Onegin", "author": "Pushkin", "pages": 104, "year": 2001},
+        {"title": "Old book", "author": "Nobody", "pages": 10, "year": 1800},
+        {"title": "Mziri", "author": "Lermontov", "pages": 104, "year": 1997},
+    ]
+    response = await async_client.post("/api/v1/books/bulk", json=data)
+
+    assert response.status_code == status.HTTP_201_CREATED
+
+    result_data = response.json()
+    assert len(result_data["ids"]) == 2
+    assert [error["index"] for error in result_data["errors"]] == [1]
+
+    created = (await db_session.execute(select(books.Book).order_by(books.Book.id))).scalars().all()
+    assert [book.id for book in created] == result_data["ids"]
+    assert [book.title for book in created] == ["Eugeny Onegin", "Mziri"]
+
+
+# Тест на массовое создание книг из NDJSON, пачками меньше, чем количество книг
+@pytest.mark.asyncio
+async def test_create_books_bulk_ndjson(db_session, async_client, monkeypatch):
+    from src.configurations.settings import settings
+
+    monkeypatch.setattr(settings, "books_bulk_chunk_size", 2)
+
+    lines = [orjson.dumps({"title": f"Tale {i}", "author": "Pushkin", "pages": 10 + i}) for i in range(5)]
+    lines.insert(2, b"{not json")
+    response = await async_client.post(
+        "/api/v1/books/bulk",
+        content=b"\n".join(lines) + b"\n",
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+
+    result_data = response.json()
+    assert len(result_data["ids"]) == 5
+    assert result_data["errors"][0]["index"] == 2
+    assert result_data["errors"][0]["errors"][0]["type"] == "json_invalid"
+
+    created = (await db_session.execute(select(books.Book).order_by(books.Book.id))).scalars().all()
+    assert [(book.title, book.count_pages) for book in created] == [(f"Tale {i}", 10 + i) for i in range(5)]
+
+
+# Тест на книги, которые проходят схему, но не помещаются в колонки БД: они отбраковываются поштучно,
+# а не роняют всю загрузку. В ответе - только первые BOOKS_BULK_MAX_ERRORS ошибок
+@pytest.mark.asyncio
+async def test_create_books_bulk_too_long(db_session, async_client, monkeypatch):
+    from src.configurations.settings import settings
+
+    monkeypatch.setattr(settings, "books_bulk_max_errors", 2)
+
+    data = [
+        {"title": "Mziri", "author": "Lermontov", "pages": 104, "year": 1997},
+        {"title": "T" * 51, "author": "Lermontov", "pages": 104, "year": 1997},
+        {"title": "Demon", "author": "A" * 101, "pages": 104, "year": 1997},
+        {"title": "Huge", "author": "Lermontov", "pages": 2**31, "year": 1997},
+        {"title": "Borodino", "author": "Lermontov", "pages": 10, "year": 1997},
+    ]
+    response = await async_client.post("/api/v1/books/bulk", json=data)
+
+    assert response.status_code == status.HTTP_201_CREATED
+
+    result_data = response.json()
+    assert len(result_data["ids"]) == 2
+    assert result_data["rejected"] == 3
+    assert [error["index"] for error in result_data["errors"]] == [1, 2]
+    assert [error["errors"][0]["type"] for error in result_data["errors"]] == ["string_too_long"] * 2
+
+    created = (await db_session.execute(select(books.Book).order_by(books.Book.id))).scalars().all()
+    assert [book.title for book in created] == ["Mziri", "Borodino"]
+
+
+# Тест на массовое создание книг, когда в теле не массив
+@pytest.mark.asyncio
+async def test_create_books_bulk_not_array(async_client):
+    response = await async_client.post("/api/v1/books/bulk", json={"title": "Mziri", "author": "Lermontov"})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# Тест на ограничение JSON массива: большое тело отклоняется и по заголовку, и при чтении потока без него
+@pytest.mark.asyncio
+async def test_create_books_bulk_json_too_large(async_client, monkeypatch):
+    from src.configurations.settings import settings
+
+    monkeypatch.setattr(settings, "books_bulk_json_max_bytes", 100)
+    body = orjson.dumps([{"title": f"Tale {i}", "author": "Pushkin", "pages": 10} for i in range(10)])
+
+    async def chunked():  # Тело без Content-Length
+        for i in range(0, len(body), 32):
+            yield body[i : i + 32]
+
+    for content in (body, chunked()):
+        response = await async_client.post(
+            "/api/v1/books/bulk", content=content, headers={"content-type": "application/json"}
+        )
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert "ndjson" in response.json()["detail"]
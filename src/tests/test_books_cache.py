@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.database import (
+    get_async_read_session,
+    get_async_session,
+    get_read_session_factory,
+    run_after_commit,
+)
+from src.models import books
+from src.services.cache import InMemoryCacheBackend, ReadThroughCache, RedisCacheBackend
+
+
+# Простейшая замена Redis: хранит значения в словаре и поддерживает только нужные кэшу команды
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+        self.ttls[key] = px
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+# Тест на попадания и промахи кэша при получении книги
+@pytest.mark.asyncio
+async def test_get_book_uses_cache(db_session, async_client, books_cache):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(book)
+    await db_session.flush()
+
+    first = await async_client.get(f"/api/v1/books/{book.id}")
+    second = await async_client.get(f"/api/v1/books/{book.id}")
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert first.json() == second.json()
+    assert (books_cache.misses, books_cache.hits) == (1, 1)
+
+
+# Тест на сброс кэша при обновлении и удалении книги
+@pytest.mark.asyncio
+async def test_book_cache_invalidation(db_session, async_client):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(book)
+    await db_session.flush()
+
+    await async_client.get(f"/api/v1/books/{book.id}")
+    await async_client.put(
+        f"/api/v1/books/{book.id}",
+        json={"title": "Mziri", "author": "Lermontov", "count_pages": 100, "year": 2007, "id": book.id},
+    )
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.json()["title"] == "Mziri"
+
+    await async_client.delete(f"/api/v1/books/{book.id}")
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест на сброс кэша после коммита, а не в ручке: конкурентный GET между записью и коммитом
+# еще читает из БД старую строку и кладет ее в кэш, но коммит этот кэш сбрасывает
+@pytest.mark.asyncio
+async def test_book_cache_invalidated_after_commit(db_session, async_client, test_app, books_cache):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(book)
+    await db_session.flush()
+    key = f"book:{book.id}"
+
+    await async_client.get(f"/api/v1/books/{book.id}")
+    stale = await books_cache.backend.get(key)  # Так книгу увидит запрос, который читает до коммита
+
+    async def stale_read():
+        return stale
+
+    async def session_with_concurrent_read():
+        yield db_session
+        await books_cache.invalidate(key)  # Ключ пуст: GET идет в БД и читает еще старую строку
+        await books_cache.get_or_load(key, stale_read)
+        await run_after_commit(db_session)  # Коммит
+
+    test_app.dependency_overrides[get_async_session] = session_with_concurrent_read
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"title": "Mziri"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.json()["title"] == "Mziri"
+
+
+# Тест на то, что кэш после сброса заполняется из основной БД, а не из отстающей реплики.
+# Реплику изображает отдельное соединение: незакоммиченных изменений теста оно еще не видит
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_book_cache_not_filled_from_lagging_replica(db_session, async_client, test_app, async_test_engine):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(book)
+    await db_session.flush()
+
+    async def lagging_replica_session():
+        async with AsyncSession(async_test_engine) as session:
+            yield session
+
+    test_app.dependency_overrides[get_async_read_session] = lagging_replica_session
+    test_app.dependency_overrides[get_read_session_factory] = lambda: lambda: AsyncSession(async_test_engine)
+
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"title": "Mziri"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Mziri"
+
+
+# Тест на то, что книга, созданная после запроса ее id, не прячется за закэшированным "не найдено"
+@pytest.mark.asyncio
+async def test_book_cache_negative_entry_invalidated_on_create(db_session, async_client):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(book)
+    await db_session.flush()
+    next_id = book.id + 1
+
+    response = await async_client.get(f"/api/v1/books/{next_id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    data = {"title": "Mziri", "author": "Lermontov", "pages": 104, "year": 1997}
+    created = await async_client.post("/api/v1/books/", json=data)
+    assert created.json()["id"] == next_id
+
+    response = await async_client.get(f"/api/v1/books/{next_id}")
+    assert response.status_code == status.HTTP_200_OK
+
+
+# Тест на защиту от "толпы": одновременные промахи по одному ключу грузят значение один раз
+@pytest.mark.asyncio
+async def test_read_through_cache_single_flight():
+    cache = ReadThroughCache(InMemoryCacheBackend(max_size=10), ttl=60, negative_ttl=5)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"payload"
+
+    results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(10)))
+
+    assert results == [b"payload"] * 10
+    assert calls == 1
+    assert await cache.get_or_load("key", loader) == b"payload"
+    assert (cache.misses, cache.hits) == (10, 1)
+
+
+# Тест на вытеснение старых записей и истечение TTL
+@pytest.mark.asyncio
+async def test_in_memory_backend_lru_and_ttl():
+    now = 0.0
+    backend = InMemoryCacheBackend(max_size=2, clock=lambda: now)
+
+    await backend.set("a", b"1", ttl=10)
+    await backend.set("b", b"2", ttl=10)
+    await backend.get("a")  # "a" теперь свежее, чем "b"
+    await backend.set("c", b"3", ttl=10)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") == b"1"
+
+    now = 11.0
+    assert await backend.get("a") is None
+    assert len(backend) == 1
+
+
+# Тест на кэш поверх Redis-подобного хранилища
+@pytest.mark.asyncio
+async def test_redis_backend_with_fake_client():
+    client = FakeRedis()
+    cache = ReadThroughCache(RedisCacheBackend(client, prefix="test:"), ttl=1.5, negative_ttl=0.5)
+
+    async def loader():
+        return None
+
+    assert await cache.get_or_load("missing", loader) is None
+    assert client.data == {"test:missing": b""}
+    assert client.ttls == {"test:missing": 500}
+
+    await cache.invalidate("missing")
+    assert client.data == {}
@@ -0,0 +1,94 @@
+import pytest
+from fastapi import status
+
+from src.models import books
+
+BOOK = {"title": "Eugeny Onegin", "author": "Pushkin", "count_pages": 104, "year": 2001}
+
+
+async def create_book(db_session):
+    book = books.Book(**BOOK)
+    db_session.add(book)
+    await db_session.flush()
+    return book
+
+
+# Тест на 304 при совпадении If-None-Match с ETag книги
+@pytest.mark.asyncio
+async def test_get_book_not_modified(db_session, async_client):
+    book = await create_book(db_session)
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    etag = response.headers["ETag"]
+    assert response.status_code == status.HTTP_200_OK
+    assert etag == f'"{book.id}.1"'
+
+    response = await async_client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    response = await async_client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+# Тест на смену ETag после изменения книги
+@pytest.mark.asyncio
+async def test_etag_changes_after_update(db_session, async_client):
+    book = await create_book(db_session)
+    old_etag = (await async_client.get(f"/api/v1/books/{book.id}")).headers["ETag"]
+
+    response = await async_client.put(f"/api/v1/books/{book.id}", json={**BOOK, "title": "Mziri", "id": book.id})
+    assert response.status_code == status.HTTP_200_OK
+    new_etag = response.headers["ETag"]
+    assert new_etag == f'"{book.id}.2"'
+
+    response = await async_client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": old_etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == new_etag
+    assert response.json()["title"] == "Mziri"
+
+
+# Тест на оптимистичную блокировку: изменение по устаревшему If-Match отклоняется с 412
+@pytest.mark.asyncio
+async def test_if_match_precondition(db_session, async_client):
+    book = await create_book(db_session)
+    etag = (await async_client.get(f"/api/v1/books/{book.id}")).headers["ETag"]
+
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"year": 2002}, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["year"] == 2002
+
+    # Второй клиент все еще держит старый ETag
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"year": 2003}, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.delete(f"/api/v1/books/{book.id}", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.json()["year"] == 2002
+
+    response = await async_client.delete(f"/api/v1/books/{book.id}", headers={"If-Match": response.headers["ETag"]})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await async_client.delete(f"/api/v1/books/{book.id}", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест на ETag списка книг: 304 для той же страницы и новый ETag после изменения книги на ней
+@pytest.mark.asyncio
+async def test_list_etag(db_session, async_client):
+    book = await create_book(db_session)
+
+    response = await async_client.get("/api/v1/books/")
+    etag = response.headers["ETag"]
+
+    response = await async_client.get("/api/v1/books/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    await async_client.patch(f"/api/v1/books/{book.id}", json={"count_pages": 200})
+
+    response = await async_client.get("/api/v1/books/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
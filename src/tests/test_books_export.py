@@ -0,0 +1,127 @@
+import csv
+import io
+from contextlib import nullcontext
+
+import orjson
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.configurations.settings import settings
+from src.models import books
+from src.schemas import ExportCompression, ExportFormat
+from src.services.export import export_books
+
+BOOKS = [
+    {"title": "Eugeny Onegin", "author": "Pushkin", "year": 2001, "count_pages": 104},
+    {"title": 'Quotes "and", commas', "author": "Back\\slash", "year": 2002, "count_pages": 5},
+    {"title": "Mziri", "author": "Lermontov", "year": 1997, "count_pages": 400},
+]
+
+
+async def create_books(db_session) -> list[dict]:
+    created = [books.Book(**book) for book in BOOKS]
+    db_session.add_all(created)
+    await db_session.flush()
+    return [{"id": book.id, **data} for book, data in zip(created, BOOKS)]
+
+
+def only_created(rows: list[dict], expected: list[dict]) -> list[dict]:
+    ids = {book["id"] for book in expected}
+    return [row for row in rows if row["id"] in ids]
+
+
+def parse_csv(text: str) -> list[dict]:
+    rows = list(csv.DictReader(io.StringIO(text)))
+    return [
+        {**row, "id": int(row["id"]), "year": int(row["year"]), "count_pages": int(row["count_pages"])} for row in rows
+    ]
+
+
+# Тест на выгрузку в CSV (на PostgreSQL - через COPY). Кавычки, запятые и слэши должны пережить выгрузку
+@pytest.mark.asyncio
+async def test_export_csv(db_session, async_client):
+    expected = await create_books(db_session)
+
+    response = await async_client.get("/api/v1/books/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="books.csv"'
+    assert response.text.splitlines()[0] == "id,title,author,year,count_pages"
+    assert only_created(parse_csv(response.text), expected) == expected
+
+
+# Тест на выгрузку в NDJSON со сжатием gzip (httpx сам распаковывает Content-Encoding: gzip)
+@pytest.mark.asyncio
+async def test_export_ndjson_gzip(db_session, async_client):
+    expected = await create_books(db_session)
+
+    response = await async_client.get("/api/v1/books/export", params={"format": "ndjson", "compression": "gzip"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    assert only_created(rows, expected) == expected
+
+
+# Тест на сжатие zstd
+@pytest.mark.asyncio
+async def test_export_csv_zstd(db_session, async_client):
+    zstandard = pytest.importorskip("zstandard")
+    expected = await create_books(db_session)
+
+    response = await async_client.get("/api/v1/books/export", params={"compression": "zstd"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "zstd"
+
+    text = zstandard.ZstdDecompressor().decompressobj().decompress(response.content).decode()
+    assert only_created(parse_csv(text), expected) == expected
+
+
+# Тест на выгрузку в Parquet: по группе строк на пачку, то есть файл пишется частями
+@pytest.mark.asyncio
+async def test_export_parquet(db_session, async_client, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(settings, "books_export_chunk_size", 2)
+    expected = await create_books(db_session)
+
+    response = await async_client.get("/api/v1/books/export", params={"format": "parquet", "compression": "zstd"})
+    assert response.status_code == status.HTTP_200_OK
+    assert "content-encoding" not in response.headers
+
+    parquet_file = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet_file.metadata.num_row_groups >= 2
+    assert parquet_file.metadata.row_group(0).column(0).compression == "ZSTD"
+    assert only_created(parquet_file.read().to_pylist(), expected) == expected
+
+
+# Тест на неизвестный формат
+@pytest.mark.asyncio
+async def test_export_unknown_format(async_client):
+    response = await async_client.get("/api/v1/books/export", params={"format": "xml"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# Тест на отключение клиента посреди COPY: COPY останавливается до закрытия сессии,
+# и соединение с недочитанным COPY не возвращается в пул (в нем одно соединение - следующий запрос получил бы его)
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_export_csv_client_disconnect():
+    engine = create_async_engine(settings.database_test_url, pool_size=1, max_overflow=0)
+    try:
+        async with AsyncSession(engine) as session:
+            await session.execute(
+                text(
+                    "INSERT INTO books_table (author, title, year, count_pages) "
+                    "SELECT 'Author ' || i, 'Title ' || i, 2000, 100 FROM generate_series(1, 100000) AS i"
+                )
+            )
+            chunks = export_books(lambda: nullcontext(session), ExportFormat.csv, ExportCompression.none, 1000)
+            assert await anext(chunks)
+            await chunks.aclose()
+
+        async with AsyncSession(engine) as session:
+            assert await session.scalar(text("SELECT 1")) == 1
+    finally:
+        await engine.dispose()
@@ -0,0 +1,172 @@
+import pytest
+from fastapi import status
+from sqlalchemy import literal, text
+
+from src.models import books
+from src.schemas import BooksFilter
+from src.services.books import build_books_query
+
+
+async def _add_books(db_session):
+    new_books = [
+        books.Book(author="Pushkin", title="Eugeny Onegin", year=1833, count_pages=224),
+        books.Book(author="Pushkin", title="Boris Godunov", year=1831, count_pages=120),
+        books.Book(author="Pushkina", title="Memoirs", year=1990, count_pages=300),
+        books.Book(author="Lermontov", title="Mziri", year=1997, count_pages=104),
+    ]
+    db_session.add_all(new_books)
+    await db_session.flush()
+    return new_books
+
+
+# Тест на фильтры списка книг
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({"author": "Pushkin"}, [0, 1]),
+        ({"author_prefix": "Push"}, [0, 1, 2]),
+        ({"year_from": 1900}, [2, 3]),
+        ({"year_from": 1832, "year_to": 1995}, [0, 2]),
+        ({"pages_from": 110, "pages_to": 250}, [0, 1]),
+        ({"author_prefix": "Push", "year_to": 1900}, [0, 1]),
+    ],
+)
+async def test_get_books_filters(db_session, async_client, params, expected):
+    new_books = await _add_books(db_session)
+
+    response = await async_client.get("/api/v1/books/", params=params)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["id"] for book in response.json()["books"]] == [new_books[i].id for i in expected]
+
+
+# Тест на сортировку с постраничным обходом: курсор работает и для сортировки не по id
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "sort_by, order, expected",
+    [
+        ("title", "asc", [1, 0, 2, 3]),
+        ("year", "desc", [3, 2, 0, 1]),
+        ("author", "asc", [3, 0, 1, 2]),
+        ("id", "desc", [3, 2, 1, 0]),
+    ],
+)
+async def test_get_books_sorting(db_session, async_client, sort_by, order, expected):
+    new_books = await _add_books(db_session)
+
+    seen_ids = []
+    params = {"sort_by": sort_by, "order": order, "limit": 3}
+    while True:
+        page = (await async_client.get("/api/v1/books/", params=params)).json()
+        seen_ids.extend(book["id"] for book in page["books"])
+        if page["next_cursor"] is None:
+            break
+        params["after"] = page["next_cursor"]
+
+    assert seen_ids == [new_books[i].id for i in expected]
+
+
+# Тест на курсор при изменениях между страницами: позиция хранится в самом курсоре,
+# поэтому удаление или изменение последней книги страницы не обрывает и не сбивает обход
+@pytest.mark.asyncio
+async def test_get_books_cursor_survives_changes(db_session, async_client):
+    new_books = await _add_books(db_session)  # По названию: 1, 0, 2, 3
+
+    params = {"sort_by": "title", "limit": 2}
+    page = (await async_client.get("/api/v1/books/", params=params)).json()
+    assert [book["id"] for book in page["books"]] == [new_books[1].id, new_books[0].id]
+
+    new_books[1].title = "Zadonshchina"
+    await db_session.delete(new_books[0])
+    await db_session.flush()
+
+    page = (await async_client.get("/api/v1/books/", params={**params, "after": page["next_cursor"]})).json()
+    assert [book["id"] for book in page["books"]] == [new_books[2].id, new_books[3].id]
+
+
+# Тест на курсор, который нельзя разобрать или который выдан для другой сортировки
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort_by, after", [("title", "not-a-cursor"), ("title", "42"), ("year", None)])
+async def test_get_books_invalid_cursor(db_session, async_client, sort_by, after):
+    if after is None:
+        await _add_books(db_session)
+        after = (await async_client.get("/api/v1/books/", params={"sort_by": "title", "limit": 1})).json()[
+            "next_cursor"
+        ]
+
+    response = await async_client.get("/api/v1/books/", params={"sort_by": sort_by, "after": after})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# Тест на числа, которые не помещаются в колонки БД, и цифры не из ASCII: 422, а не ошибка драйвера
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "url, params",
+    [
+        ("/api/v1/books/", {"after": "99999999999999999999999"}),
+        ("/api/v1/books/", {"after": "١٢"}),
+        ("/api/v1/books/", {"year_from": 99999999999}),
+        ("/api/v1/books/", {"pages_to": -99999999999}),
+        ("/api/v1/books/99999999999999999999", {}),
+    ],
+)
+async def test_get_books_out_of_range(db_session, async_client, url, params):
+    response = await async_client.get(url, params=params)
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# Тест на то, что каждый поддерживаемый фильтр и сортировка разрешаются индексом, а не полным перебором.
+# Смотрим план того же запроса с параметрами, что уходит из приложения (PREPARE + EXPLAIN EXECUTE),
+# а не запроса с подставленными значениями: планировщик видит значения только при custom плане.
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "filters, after, index_names",
+    [
+        # Точное совпадение автора умеют оба индекса по автору
+        ({"author": "Author 42"}, None, ("ix_books_table_author_id", "ix_books_table_author_pattern")),
+        ({"author_prefix": "Author 42"}, None, ("ix_books_table_author_pattern",)),
+        ({"year_from": 1950, "year_to": 1951}, None, ("ix_books_table_year_id",)),
+        ({"pages_from": 10, "pages_to": 12}, None, ("ix_books_table_count_pages_id",)),
+        ({"sort_by": "title"}, None, ("ix_books_table_title_id",)),
+        ({"sort_by": "author", "order": "desc"}, None, ("ix_books_table_author_id",)),
+        ({"sort_by": "year"}, (1950, 2**40), ("ix_books_table_year_id",)),
+        ({"sort_by": "count_pages", "order": "desc"}, (500, 100), ("ix_books_table_count_pages_id",)),
+        ({}, (100, 100), ("books_table_pkey",)),
+    ],
+)
+async def test_books_filters_use_indexes(db_session, filters, after, index_names):
+    # Строки генерирует сама БД одним выражением: быстрее, чем гонять 5000 строк параметрами
+    await db_session.execute(
+        text(
+            "INSERT INTO books_table (author, title, year, count_pages) "
+            "SELECT 'Author ' || i % 500, 'Title ' || i, 1900 + i % 120, 10 + i % 1000 FROM generate_series(0, 4999) AS i"
+        )
+    )
+    await db_session.execute(text("ANALYZE books_table"))
+
+    compiled = build_books_query(BooksFilter(**filters), after, limit=101).compile(
+        dialect=db_session.get_bind().dialect
+    )
+    # Диалект asyncpg компилирует параметры в $1, $2, ... с приведением к типу колонки, как при реальном запросе
+    connection = await db_session.connection()
+    await connection.exec_driver_sql(f"PREPARE books_page AS {compiled}")
+    try:
+        # EXECUTE принимает аргументы только литералами
+        arguments = ", ".join(
+            str(
+                literal(compiled.params[name], compiled.binds[name].type).compile(
+                    dialect=compiled.dialect, compile_kwargs={"literal_binds": True}
+                )
+            )
+            for name in compiled.positiontup
+        )
+        plan = "\n".join((await db_session.execute(text(f"EXPLAIN EXECUTE books_page({arguments})"))).scalars())
+    finally:
+        await connection.exec_driver_sql("DEALLOCATE books_page")
+
+    assert "Seq Scan" not in plan, plan
+    assert any(index_name in plan for index_name in index_names), plan
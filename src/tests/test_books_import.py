@@ -0,0 +1,103 @@
+import pytest
+from fastapi import status
+from sqlalchemy import select
+
+from src.models import books
+from src.services.importer import iter_csv_records
+
+CSV = (
+    "title,author,year,pages\n"
+    "Eugeny Onegin,Pushkin,1999,300\n"  # Уже есть в каталоге - обновится
+    '"Mziri, a poem",Lermontov,1940,\n'  # Запятая в кавычках, страницы по умолчанию
+    '"Two\nlines",Pushkin,1930,10\n'  # Перевод строки внутри кавычек
+    "Old book,Nobody,1500,10\n"  # Невалидный год (раньше 1900)
+    f"{'x' * 51},Pushkin,2000,10\n"  # Слишком длинное название
+    "Mziri,Lermontov,1939,50\n"
+    "Mziri,Lermontov,1940,60\n"  # Повтор книги в файле - побеждает последняя строка
+)
+
+
+async def chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+# Тест на сборку записей CSV из кусков, разрезанных в том числе внутри кавычек
+@pytest.mark.asyncio
+async def test_iter_csv_records():
+    records = [record async for record in iter_csv_records(chunks(CSV.encode(), 7))]
+
+    assert len(records) == 8
+    assert records[3] == '"Two\nlines",Pushkin,1930,10'
+
+
+# Тест на импорт CSV в режиме upsert: обновление найденных книг, вставка новых, отбраковка невалидных строк
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_import_csv_upsert(db_session, async_client):
+    existing = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(existing)
+    await db_session.flush()
+    await async_client.get(f"/api/v1/books/{existing.id}")  # Кладем книгу в кэш
+
+    response = await async_client.post(
+        "/api/v1/books/import", content=CSV.encode(), headers={"content-type": "text/csv"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    report = response.json()
+    assert {key: report[key] for key in ("rows_read", "accepted", "rejected", "duplicates")} == {
+        "rows_read": 7,
+        "accepted": 5,
+        "rejected": 2,
+        "duplicates": 1,
+    }
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (3, 1, 0)
+    assert [error["index"] for error in report["errors"]] == [4, 5]
+    assert report["errors"][1]["errors"][0]["loc"] == ["title"]
+
+    response = await async_client.get(f"/api/v1/books/{existing.id}")
+    assert (response.json()["year"], response.json()["count_pages"]) == (1999, 300)
+
+    res = await db_session.execute(
+        select(books.Book.title, books.Book.year, books.Book.count_pages)
+        .where(books.Book.author == "Lermontov")
+        .order_by(books.Book.title)
+    )
+    assert res.all() == [("Mziri", 1940, 60), ("Mziri, a poem", 1940, 300)]
+
+    # Повторный импорт того же файла ничего не меняет
+    response = await async_client.post(
+        "/api/v1/books/import", content=CSV.encode(), headers={"content-type": "text/csv"}
+    )
+    assert (response.json()["inserted"], response.json()["updated"], response.json()["unchanged"]) == (0, 0, 4)
+
+
+# Тест на импорт NDJSON в режиме insert: все строки добавляются как новые книги
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_import_ndjson_insert(db_session, async_client):
+    ndjson = (
+        '{"title": "Clean code", "author": "Martin", "year": 2008, "pages": 464}\n'
+        '{"title": "Clean code", "author": "Martin", "year": 2008, "pages": 464}\n'
+        "not json\n"
+    )
+
+    response = await async_client.post(
+        "/api/v1/books/import",
+        params={"mode": "insert"},
+        content=ndjson.encode(),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert (response.json()["inserted"], response.json()["rejected"]) == (2, 1)
+
+    count = await db_session.scalar(select(books.Book.id).where(books.Book.author == "Martin").limit(1))
+    assert count is not None
+
+
+# Тест на неподдерживаемый тип тела
+@pytest.mark.asyncio
+async def test_import_unsupported_media_type(async_client):
+    response = await async_client.post("/api/v1/books/import", json=[])
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.models import books
+from src.models.base import BaseModel
+from src.services.search import build_search_query
+
+
+def _new_books():
+    return [
+        books.Book(author="Pushkin", title="Eugeny Onegin", year=1833, count_pages=224),
+        books.Book(author="Lermontov", title="Mziri", year=1839, count_pages=104),
+        books.Book(author="Pushkin", title="Boris Godunov", year=1831, count_pages=120),
+        books.Book(author="Tolstoy", title="About Pushkin", year=1990, count_pages=300),
+    ]
+
+
+# Тест на поиск по префиксу слова в авторе и названии
+@pytest.mark.asyncio
+async def test_search_books(db_session, async_client):
+    new_books = _new_books()
+    db_session.add_all(new_books)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "pushk"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert {book["id"] for book in response.json()["books"]} == {new_books[0].id, new_books[2].id, new_books[3].id}
+
+    # Все слова запроса должны найтись
+    response = await async_client.get("/api/v1/books/search", params={"q": "Onegin push"})
+    assert [book["id"] for book in response.json()["books"]] == [new_books[0].id]
+
+    # Спецсимволы tsquery не ломают запрос
+    response = await async_client.get("/api/v1/books/search", params={"q": "mzir & | ! :*"})
+    assert [book["id"] for book in response.json()["books"]] == [new_books[1].id]
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "!!!"})
+    assert response.json() == {"books": [], "next_cursor": None}
+
+
+# Тест на то, что поиск идет по GIN индексу, а не полным перебором таблицы
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_search_books_uses_index(db_session):
+    await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+
+    query = build_search_query("pushk onegin", 10, "postgresql")
+    sql = query.compile(dialect=db_session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    plan = "\n".join((await db_session.execute(text(f"EXPLAIN {sql}"))).scalars())
+
+    assert "ix_books_table_search" in plan, plan
+
+
+# Тест на упрощенный поиск для БД без полнотекстового поиска (SQLite)
+@pytest.mark.asyncio
+async def test_search_books_sqlite_fallback():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(BaseModel.metadata.create_all)
+
+        async with AsyncSession(engine) as session:
+            new_books = _new_books()
+            session.add_all(new_books)
+            await session.flush()
+
+            res = await session.execute(build_search_query("pushk", 10, "sqlite"))
+            found = res.all()
+
+        # Сначала книги, где слово в начале автора или названия, а потом - где в середине
+        assert [book.title for book in found] == ["Eugeny Onegin", "Boris Godunov", "About Pushkin"]
+    finally:
+        await engine.dispose()
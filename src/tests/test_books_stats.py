@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+from src.models import books
+from src.models.base import BaseModel
+from src.services.importer import import_books
+from src.services.stats import find_stats_mismatches, get_book_stats, rebuild_book_stats
+
+
+def _stats_row(stats, key, value):
+    return next((row for row in stats[f"{key}s"] if row[key] == value), None)
+
+
+async def _single_chunk(data: bytes):
+    yield data
+
+
+# Тест на то, что статистика следует за всеми ручками записи: создание, массовое создание, изменение, удаление
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_stats_follow_api_writes(db_session, async_client):
+    await async_client.post("/api/v1/books/", json={"title": "Onegin", "author": "Pushkin", "pages": 300, "year": 1933})
+    await async_client.post(
+        "/api/v1/books/bulk",
+        json=[
+            {"title": "Godunov", "author": "Pushkin", "pages": 100, "year": 1933},
+            {"title": "Mziri", "author": "Lermontov", "pages": 50, "year": 1940},
+            {"title": "Demon", "author": "Lermontov", "pages": 70, "year": 1941},
+        ],
+    )
+    books_list = (await async_client.get("/api/v1/books/", params={"author_prefix": "Lermontov"})).json()["books"]
+    mziri, demon = books_list
+
+    # Книга переходит к другому автору и в другой год, у второй меняются страницы, третья удаляется
+    await async_client.put(f"/api/v1/books/{mziri['id']}", json={**mziri, "author": "Gogol", "year": 1950})
+    await async_client.patch(f"/api/v1/books/{demon['id']}", json={"pages": 90})
+    onegin = (await async_client.get("/api/v1/books/", params={"author": "Pushkin"})).json()["books"][0]
+    await async_client.delete(f"/api/v1/books/{onegin['id']}")
+
+    response = await async_client.get("/api/v1/books/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert _stats_row(stats, "author", "Pushkin") == {"author": "Pushkin", "books": 1, "pages": 100}
+    assert _stats_row(stats, "author", "Lermontov") == {"author": "Lermontov", "books": 1, "pages": 90}
+    assert _stats_row(stats, "author", "Gogol") == {"author": "Gogol", "books": 1, "pages": 50}
+    assert _stats_row(stats, "year", 1933) == {"year": 1933, "books": 1, "pages": 100}
+    assert _stats_row(stats, "year", 1940) is None  # Книг за этот год не осталось - строки нет
+    assert stats["total_books"] == sum(row["books"] for row in stats["years"])
+    assert await find_stats_mismatches(db_session) == []
+
+
+# Тест на статистику после импорта через COPY (в обход моделей) и после TRUNCATE
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_stats_follow_import_and_truncate(db_session):
+    def catalog(rows, pages_delta):
+        lines = (f"Book {i},Author {i % 30},{1900 + i % 50},{i + pages_delta}\n" for i in rows)
+        return ("title,author,year,pages\n" + "".join(lines)).encode()
+
+    await import_books(db_session, _single_chunk(catalog(range(3000), 1)), "csv")
+    # Вторым импортом часть книг обновляется (меняются страницы), часть добавляется
+    await import_books(db_session, _single_chunk(catalog(range(2000, 4000), 2)), "csv")
+
+    assert await find_stats_mismatches(db_session) == []
+
+    await db_session.execute(text("TRUNCATE books_table"))
+    stats = await get_book_stats(db_session, authors_limit=10)
+
+    assert stats == {"total_books": 0, "total_pages": 0, "authors": [], "years": []}
+
+
+# Тест на то, что пишущие транзакции не ждут друг друга на строках статистики одного автора и года
+# и не блокируют друг друга намертво, когда пишут в них во встречном порядке разными выражениями.
+# Транзакции здесь настоящие, с коммитом, поэтому книги удаляются в конце
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_stats_concurrent_writers():
+    engine = create_async_engine(settings.database_test_url, poolclass=NullPool)
+    insert_book = text("INSERT INTO books_table (title, author, year, count_pages) VALUES ('Book', :author, :year, 10)")
+    try:
+        async with engine.connect() as first, engine.connect() as second:
+            await first.execute(insert_book, {"author": "Writer A", "year": 3001})
+            await asyncio.wait_for(second.execute(insert_book, {"author": "Writer B", "year": 3002}), timeout=2)
+            await asyncio.wait_for(second.execute(insert_book, {"author": "Writer A", "year": 3001}), timeout=2)
+            await asyncio.wait_for(second.commit(), timeout=2)
+            await first.execute(insert_book, {"author": "Writer B", "year": 3002})
+            await first.commit()
+
+        async with AsyncSession(engine) as session:
+            stats = await get_book_stats(session, authors_limit=1000)
+            assert await find_stats_mismatches(session) == []
+
+        assert _stats_row(stats, "author", "Writer A") == {"author": "Writer A", "books": 2, "pages": 20}
+        assert _stats_row(stats, "year", 3002) == {"year": 3002, "books": 2, "pages": 20}
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(text("DELETE FROM books_table WHERE author LIKE 'Writer %'"))
+        await engine.dispose()
+
+
+# Тест на пересборку статистики, если она разошлась с таблицей
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_rebuild_stats(db_session):
+    await db_session.execute(text("ALTER TABLE books_table DISABLE TRIGGER USER"))
+    await db_session.execute(
+        insert(books.Book),
+        [{"title": f"Book {i}", "author": "Gogol", "year": 1935, "count_pages": 10} for i in range(5)],
+    )
+    await db_session.execute(text("ALTER TABLE books_table ENABLE TRIGGER USER"))
+
+    assert await find_stats_mismatches(db_session) != []
+
+    await rebuild_book_stats(db_session)
+
+    assert await find_stats_mismatches(db_session) == []
+    stats = await get_book_stats(db_session, authors_limit=1000)
+    assert _stats_row(stats, "author", "Gogol") == {"author": "Gogol", "books": 5, "pages": 50}
+
+
+# Тест на статистику без триггеров (SQLite): считается по таблице книг
+@pytest.mark.asyncio
+async def test_stats_sqlite_fallback():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(BaseModel.metadata.create_all)
+
+        async with AsyncSession(engine) as session:
+            session.add_all(
+                [
+                    books.Book(author="Pushkin", title="Onegin", year=1933, count_pages=300),
+                    books.Book(author="Pushkin", title="Godunov", year=1935, count_pages=100),
+                    books.Book(author="Gogol", title="Viy", year=1935, count_pages=40),
+                ]
+            )
+            await session.flush()
+
+            stats = await get_book_stats(session, authors_limit=1)
+
+        assert stats == {
+            "total_books": 3,
+            "total_pages": 440,
+            "authors": [{"author": "Pushkin", "books": 2, "pages": 400}],
+            "years": [{"year": 1933, "books": 1, "pages": 300}, {"year": 1935, "books": 2, "pages": 140}],
+        }
+    finally:
+        await engine.dispose()
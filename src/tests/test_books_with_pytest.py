@@ -1,8 +1,11 @@
+import orjson
 import pytest
 from fastapi import status
 from sqlalchemy import select
 
 from src.models import books
+from src.schemas import BookSortField
+from src.services.books import decode_cursor
 
 result = {
     "books": [
@@ -14,16 +17,18 @@ result = {
 
 # Тест на ручку создающую книгу
 @pytest.mark.asyncio
-async def test_create_book(async_client):
+async def test_create_book(db_session, async_client):
     data = {"title": "Wrong Code", "author": "Robert Martin", "pages": 104, "year": 2007}
     response = await async_client.post("/api/v1/books/", json=data)
 
     assert response.status_code == status.HTTP_201_CREATED
 
     result_data = response.json()
+    # id выдает последовательность БД, и он зависит от порядка запуска тестов. Сверяемся с записью в БД.
+    created_book = (await db_session.execute(select(books.Book))).scalars().one()
 
     assert result_data == {
-        "id": 1,
+        "id": created_book.id,
         "title": "Wrong Code",
         "author": "Robert Martin",
         "count_pages": 104,
@@ -53,10 +58,56 @@ async def test_get_books(db_session, async_client):
         "books": [
             {"title": "Eugeny Onegin", "author": "Pushkin", "year": 2001, "id": book.id, "count_pages": 104},
             {"title": "Mziri", "author": "Lermontov", "year": 1997, "id": book_2.id, "count_pages": 104},
-        ]
+        ],
+        "next_cursor": None,
     }
 
 
+# Тест на постраничное получение списка книг
+@pytest.mark.asyncio
+async def test_get_books_pagination(db_session, async_client):
+    new_books = [books.Book(author="Pushkin", title=f"Tale {i}", year=2001, count_pages=104) for i in range(5)]
+
+    db_session.add_all(new_books)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/", params={"limit": 2})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["id"] for book in response.json()["books"]] == [new_books[0].id, new_books[1].id]
+    assert decode_cursor(response.json()["next_cursor"], BookSortField.id) == (new_books[1].id, new_books[1].id)
+
+    # Проходим по курсорам до конца и проверяем, что книги не теряются и не повторяются
+    seen_ids = []
+    cursor = None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "after": cursor}
+        page = (await async_client.get("/api/v1/books/", params=params)).json()
+        seen_ids.extend(book["id"] for book in page["books"])
+        if (cursor := page["next_cursor"]) is None:
+            break
+
+    assert seen_ids == [book.id for book in new_books]
+
+
+# Тест на потоковую выгрузку списка книг в формате NDJSON
+@pytest.mark.asyncio
+async def test_get_books_stream(db_session, async_client):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    book_2 = books.Book(author="Lermontov", title="Mziri", year=1997, count_pages=104)
+
+    db_session.add_all([book, book_2])
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/", params={"stream": True, "after": book.id})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [orjson.loads(line) for line in response.text.splitlines()] == [
+        {"title": "Mziri", "author": "Lermontov", "year": 1997, "id": book_2.id, "count_pages": 104},
+    ]
+
+
 # Тест на ручку получения одной книги
 @pytest.mark.asyncio
 async def test_get_single_book(db_session, async_client):
@@ -127,3 +178,46 @@ async def test_update_book(db_session, async_client):
     assert res.count_pages == 100
     assert res.year == 2007
     assert res.id == book.id
+
+
+# Тест на ручку частичного обновления книги
+@pytest.mark.asyncio
+async def test_patch_book(db_session, async_client):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+
+    db_session.add(book)
+    await db_session.flush()
+
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"count_pages": 200})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "title": "Eugeny Onegin",
+        "author": "Pushkin",
+        "year": 2001,
+        "count_pages": 200,
+        "id": book.id,
+    }
+
+    # Проверяем, что невалидные данные не проходят
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"year": 1800})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"title": None})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# Тест на изменение и удаление несуществующей книги
+@pytest.mark.asyncio
+async def test_missing_book_returns_404(async_client):
+    response = await async_client.patch("/api/v1/books/0", json={"count_pages": 200})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = await async_client.put(
+        "/api/v1/books/0",
+        json={"title": "Mziri", "author": "Lermontov", "count_pages": 100, "year": 2007, "id": 0},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = await async_client.delete("/api/v1/books/0")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,127 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+from src.migrations import SchemaVersionError, check_schema_version, latest_version, upgrade
+from src.models.base import BaseModel
+from src.models.books import Book
+
+# Миграции прогоняем в отдельной схеме тестовой БД, чтобы не трогать таблицы остальных тестов
+SCHEMA = "migrations_test"
+
+pytestmark = pytest.mark.postgresql
+
+
+@pytest_asyncio.fixture(scope="function")
+async def migrations_engine():
+    admin_engine = create_async_engine(settings.database_test_url, poolclass=NullPool)
+    async with admin_engine.begin() as connection:
+        await connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    engine = create_async_engine(
+        settings.database_test_url,
+        poolclass=NullPool,
+        connect_args={"server_settings": {"search_path": SCHEMA}},
+    )
+    yield engine
+    await engine.dispose()
+
+    async with admin_engine.begin() as connection:
+        await connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    await admin_engine.dispose()
+
+
+# Тест на применение миграций с нуля и повторный запуск
+@pytest.mark.asyncio
+async def test_upgrade_from_scratch(migrations_engine):
+    with pytest.raises(SchemaVersionError):
+        await check_schema_version(migrations_engine)
+
+    applied = await upgrade(migrations_engine)
+
+    assert applied == list(range(1, latest_version() + 1))
+    assert await check_schema_version(migrations_engine) == latest_version()
+    assert await upgrade(migrations_engine) == []  # Повторный запуск ничего не делает
+
+    async with migrations_engine.connect() as connection:
+        id_type = await connection.scalar(
+            text(
+                "SELECT format_type(atttypid, NULL) FROM pg_attribute "
+                "WHERE attrelid = 'books_table'::regclass AND attname = 'id'"
+            )
+        )
+    assert id_type == "bigint"
+
+
+# Тест на то, что миграции создают те же индексы, что описаны в модели
+@pytest.mark.asyncio
+async def test_migrations_match_models(migrations_engine):
+    await upgrade(migrations_engine)
+
+    async with migrations_engine.connect() as connection:
+        res = await connection.execute(
+            text("SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = 'books_table'"),
+            {"schema": SCHEMA},
+        )
+        index_names = set(res.scalars())
+
+    assert index_names == {index.name for index in Book.__table__.indexes} | {"books_table_pkey"}
+
+
+# Тест на частичное применение миграций
+@pytest.mark.asyncio
+async def test_upgrade_to_target(migrations_engine):
+    assert await upgrade(migrations_engine, target=1) == [1]
+
+    with pytest.raises(SchemaVersionError):
+        await check_schema_version(migrations_engine)
+
+    assert await upgrade(migrations_engine) == list(range(2, latest_version() + 1))
+
+
+# Тест на то, что миграции создают таблицы статистики и триггеры, которые сразу ее ведут
+@pytest.mark.asyncio
+async def test_migrations_create_stats_triggers(migrations_engine):
+    await upgrade(migrations_engine, target=5)
+    async with migrations_engine.begin() as connection:
+        await connection.execute(
+            text("INSERT INTO books_table (title, author, year, count_pages) VALUES ('Onegin', 'Pushkin', 1933, 300)")
+        )
+
+    await upgrade(migrations_engine)
+    async with migrations_engine.begin() as connection:
+        await connection.execute(
+            text("INSERT INTO books_table (title, author, year, count_pages) VALUES ('Godunov', 'Pushkin', 1935, 100)")
+        )
+    # Изменения попадают в статистику при коммите
+    async with migrations_engine.connect() as connection:
+        author_stats = (await connection.execute(text("SELECT author, books, pages FROM book_author_stats"))).all()
+        res = await connection.execute(text("SELECT tgname FROM pg_trigger WHERE tgrelid = 'books_table'::regclass"))
+        triggers = set(res.scalars())
+
+    assert author_stats == [("Pushkin", 2, 400)]  # Первое наполнение миграцией плюс вставка через триггер
+    assert triggers == {"books_stats_insert", "books_stats_update", "books_stats_delete", "books_stats_truncate"}
+
+
+# Тест на переход на миграции с базы, созданной через create_all: миграции не падают на уже существующих
+# таблицах и индексах, а статистика после них не задвоена
+@pytest.mark.asyncio
+async def test_upgrade_adopts_create_all_schema(migrations_engine):
+    async with migrations_engine.begin() as connection:
+        await connection.run_sync(BaseModel.metadata.create_all)
+        await connection.execute(
+            text("INSERT INTO books_table (title, author, year, count_pages) VALUES ('Onegin', 'Pushkin', 1933, 300)")
+        )
+
+    assert await upgrade(migrations_engine) == list(range(1, latest_version() + 1))
+
+    async with migrations_engine.connect() as connection:
+        author_stats = (await connection.execute(text("SELECT author, books, pages FROM book_author_stats"))).all()
+        year_stats = (await connection.execute(text("SELECT year, books, pages FROM book_year_stats"))).all()
+
+    assert author_stats == [("Pushkin", 1, 300)]
+    assert year_stats == [(1933, 1, 300)]
@@ -0,0 +1,67 @@
+import logging
+
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from src.configurations.database import build_async_engine
+from src.configurations.settings import settings
+from src.models import books
+from src.monitoring import query_metrics
+
+
+# Тест на заголовок Server-Timing: в нем время в БД, число запросов и строк
+# (строки SELECT считаются по rowcount, а его драйвер SQLite не сообщает)
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_server_timing_header(db_session, async_client):
+    book = books.Book(author="Pushkin", title="Eugeny Onegin", year=2001, count_pages=104)
+    db_session.add(book)
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.status_code == status.HTTP_200_OK
+
+    timings = {entry.split(";")[0]: entry for entry in response.headers["Server-Timing"].split(", ")}
+    assert set(timings) == {"handler", "db", "serialize", "total"}
+    assert 'desc="queries=1 rows=1"' in timings["db"]
+
+
+# Тест на метрики в формате Prometheus: маршрут в метках - это шаблон пути, а не сам путь
+@pytest.mark.asyncio
+async def test_prometheus_metrics(async_client):
+    await async_client.get("/api/v1/books/0")
+    await async_client.get("/api/v1/books/0")
+
+    response = await async_client.get("/internal/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+
+    lines = response.text.splitlines()
+    requests_line = next(
+        line
+        for line in lines
+        if line.startswith('http_requests_total{method="GET",route="/api/v1/books/{book_id}",status="404"}')
+    )
+    assert int(requests_line.rsplit(" ", 1)[1]) >= 2  # Метрики общие на процесс: считают и другие тесты
+    assert any(line.startswith("http_request_db_seconds_bucket") for line in lines)
+    assert "# TYPE db_query_duration_seconds histogram" in lines
+    assert not any("/api/v1/books/0" in line for line in lines)
+
+
+# Тест на лог медленных запросов: с нулевым порогом медленным считается любой запрос
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_slow_query_log(caplog, monkeypatch):
+    monkeypatch.setattr(settings, "db_slow_query_threshold", 0.0)
+    engine = build_async_engine(settings.database_test_url)
+    slow_queries = query_metrics.slow_queries
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.monitoring.queries"):
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT pg_sleep(0.01)"))
+    finally:
+        await engine.dispose()
+
+    assert any("Slow query" in record.message and "pg_sleep" in record.message for record in caplog.records)
+    assert query_metrics.slow_queries > slow_queries
@@ -0,0 +1,188 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import MetaData, insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+from src.migrations import latest_version, repartition, upgrade
+from src.models.books import BOOK_ID_SEQUENCE, Book
+from src.models.ids import MAX_SEQUENCE, SEQUENCE_BITS, SNOWFLAKE_EPOCH, WORKER_BITS, SnowflakeGenerator
+from src.models.partitioning import partition_names, partition_table
+from src.schemas import BooksFilter
+from src.services.books import build_books_query
+
+# Секционированные таблицы создаем в отдельной схеме тестовой БД, как и в тестах миграций
+SCHEMA = "partitioning_test"
+
+
+@pytest_asyncio.fixture(scope="function")
+async def partitioning_engine():
+    admin_engine = create_async_engine(settings.database_test_url, poolclass=NullPool)
+    async with admin_engine.begin() as connection:
+        await connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    engine = create_async_engine(
+        settings.database_test_url,
+        poolclass=NullPool,
+        connect_args={"server_settings": {"search_path": SCHEMA}},
+    )
+    yield engine
+    await engine.dispose()
+
+    async with admin_engine.begin() as connection:
+        await connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    await admin_engine.dispose()
+
+
+def _partitioned_books_table(scheme, **kwargs):
+    # Копия таблицы книг со своим секционированием: модель Book при этом не меняется
+    table = Book.__table__.to_metadata(MetaData())
+    partition_table(table, scheme, **kwargs)
+    return table
+
+
+def _books(count):
+    return [
+        {"title": f"Book {i}", "author": f"Author {i % 7}", "year": 1900 + i % 100, "count_pages": 100 + i}
+        for i in range(count)
+    ]
+
+
+async def _explain(connection, query) -> str:
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    res = await connection.execute(text(f"EXPLAIN {sql}"))
+    return "\n".join(res.scalars())
+
+
+# Тест на то, что фильтр списка книг по году читает только секции нужных лет
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_year_partitions_pruned_by_list_filter(partitioning_engine):
+    table = _partitioned_books_table("year", year_step=20, year_from=1900, year_to=2000)
+    async with partitioning_engine.begin() as connection:
+        await connection.run_sync(table.metadata.create_all)
+        await connection.execute(insert(table), _books(500))
+
+        # Запрос собирается по модели Book: search_path направляет его в секционированную копию
+        plan = await _explain(connection, build_books_query(BooksFilter(year_from=1945, year_to=1959), limit=10))
+        count = await connection.scalar(text("SELECT count(*) FROM books_table_y1940"))
+
+    assert partition_names(table) == [f"books_table_y{year}" for year in range(1900, 2000, 20)] + [
+        "books_table_default"
+    ]
+    assert "books_table_y1940" in plan
+    assert all(name not in plan for name in partition_names(table) if name != "books_table_y1940")
+    assert count == 100
+
+
+# Тест на то, что при секционировании по хэшу поиск по id читает одну секцию
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_hash_partitions_pruned_by_id(partitioning_engine):
+    table = _partitioned_books_table("hash", count=4)
+    async with partitioning_engine.begin() as connection:
+        await connection.run_sync(table.metadata.create_all)
+        await connection.execute(insert(table), _books(100))
+
+        plan = await _explain(connection, select(Book).where(Book.id == 42))
+        size = await connection.scalar(text("SELECT count(*) FROM books_table_p0"))
+
+    assert sum(name in plan for name in partition_names(table)) == 1
+    assert 0 < size < 100
+
+
+# Тест на перестройку таблицы из миграций в секционированную, а затем в другую схему секционирования
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_repartition_keeps_rows_and_ids(partitioning_engine):
+    await upgrade(partitioning_engine)
+    async with partitioning_engine.begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO books_table (title, author, year, count_pages) VALUES (:title, :author, :year, :count_pages)"
+            ),
+            _books(50),
+        )
+        before = (await connection.execute(text("SELECT * FROM books_table ORDER BY id"))).all()
+
+    year_table = _partitioned_books_table("year", year_step=50)
+    assert await repartition(partitioning_engine, year_table, BOOK_ID_SEQUENCE) == 50
+
+    hash_table = _partitioned_books_table("hash", count=4)
+    assert await repartition(partitioning_engine, hash_table, BOOK_ID_SEQUENCE) == 50
+
+    async with partitioning_engine.begin() as connection:
+        after = (await connection.execute(text("SELECT * FROM books_table ORDER BY id"))).all()
+        partitions = (
+            await connection.execute(
+                text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'books_table'::regclass")
+            )
+        ).scalars()
+        # Последовательность продолжается после перенесенных id
+        new_id = (await connection.execute(insert(hash_table).returning(hash_table.c.id), _books(1)[0])).scalar_one()
+        leftovers = await connection.scalar(text("SELECT count(*) FROM pg_class WHERE relname LIKE '%\\_old'"))
+
+    assert after == before
+    assert sorted(partitions) == sorted(partition_names(hash_table))
+    assert new_id > before[-1].id
+    assert leftovers == 0
+
+
+# Тест на переход на миграции с секционированной базы, созданной через create_all (DB_PARTITIONING=year/hash):
+# миграции подхватывают ее индексы, а не падают на CREATE INDEX CONCURRENTLY
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scheme", ["year", "hash"])
+async def test_upgrade_adopts_partitioned_create_all_schema(partitioning_engine, scheme):
+    table = _partitioned_books_table(scheme, count=4, year_step=50)
+    async with partitioning_engine.begin() as connection:
+        await connection.run_sync(table.create)
+
+    assert await upgrade(partitioning_engine) == list(range(1, latest_version() + 1))
+
+    async with partitioning_engine.begin() as connection:
+        await connection.execute(insert(table), _books(10))
+    async with partitioning_engine.connect() as connection:
+        index_names = set(
+            (
+                await connection.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'books_table'"))
+            ).scalars()
+        )
+        books_in_stats = await connection.scalar(text("SELECT sum(books) FROM book_year_stats"))
+
+    assert index_names == {index.name for index in table.indexes} | {"books_table_pkey"}
+    assert books_in_stats == 10
+
+
+# Тест на устройство id Snowflake: время, номер воркера и номер внутри миллисекунды
+def test_snowflake_layout():
+    generator = SnowflakeGenerator(worker_id=5, clock=lambda: (SNOWFLAKE_EPOCH + 1234) / 1000)
+
+    first, second = generator(), generator()
+
+    assert first >> (WORKER_BITS + SEQUENCE_BITS) == 1234
+    assert (first >> SEQUENCE_BITS) & ((1 << WORKER_BITS) - 1) == 5
+    assert first & MAX_SEQUENCE == 0
+    assert second == first + 1
+
+
+# Тест на то, что id растут и не повторяются, даже когда кончились номера в миллисекунде и часы пошли назад
+def test_snowflake_monotonic():
+    now = [SNOWFLAKE_EPOCH / 1000]
+    generator = SnowflakeGenerator(worker_id=1, clock=lambda: now[0])
+
+    ids = [generator() for _ in range(MAX_SEQUENCE * 3)]
+    now[0] -= 10  # Часы перевели назад
+    ids += [generator() for _ in range(10)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert ids[-1] >> (WORKER_BITS + SEQUENCE_BITS) == 3  # Заняли три миллисекунды вперед
+
+
+def test_snowflake_worker_id_range():
+    with pytest.raises(ValueError):
+        SnowflakeGenerator(worker_id=1 << WORKER_BITS)
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from src.configurations.database import build_async_engine
+from src.configurations.settings import settings
+
+
+# Тест на метрики пула: две корутины делят одно соединение, вторая должна подождать
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_pool_metrics_track_waiting_checkouts():
+    engine = build_async_engine(settings.database_test_url, pool_size=1, max_overflow=0)
+    pool = engine.pool
+
+    async def hold_connection():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT pg_sleep(0.1)"))
+
+    try:
+        first = asyncio.create_task(hold_connection())
+        await asyncio.sleep(0.05)  # Даем первой задаче забрать соединение
+        second = asyncio.create_task(hold_connection())
+        await asyncio.sleep(0.02)
+
+        assert pool.checkedout() == 1
+        assert pool.metrics.waiting == 1
+
+        await asyncio.gather(first, second)
+
+        assert pool.metrics.waiting == 0
+        assert pool.metrics.checkout_latency.count == 2
+        # Вторая корутина ждала, пока первая не вернет соединение
+        assert pool.metrics.checkout_latency.sum >= 0.05
+    finally:
+        await engine.dispose()
+
+
+# Тест на ручку с метриками пула, когда движок еще не создан
+@pytest.mark.asyncio
+async def test_pool_endpoint_without_engine(async_client):
+    response = await async_client.get("/internal/pool")
+
+    assert response.status_code == 503
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+import uvicorn
+
+from src.benchmarks.load import free_port, wait_until_ready
+from src.configurations.settings import Settings
+from src.server import APP, DrainingServer, plan_workers
+
+
+def _settings(**overrides) -> Settings:
+    return Settings(db_host="sqlite+aiosqlite://", db_name="test.db", **overrides)
+
+
+def _start_server(db_file: Path, port: int, **env: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DB_HOST": "sqlite+aiosqlite://",
+        "DB_NAME": str(db_file),
+        "DB_SCHEMA_MODE": "create_drop",
+        **env,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "src.server", "--host", "127.0.0.1", "--port", str(port), "--workers", "2"],
+        env=env,
+        cwd=Path(__file__).resolve().parents[2],
+        stderr=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        start_new_session=True,  # Своя группа процессов: Ctrl+C в тесте не заденет pytest
+    )
+
+
+# Тест на то, что общий лимит соединений делится между воркерами, а пул не больше доли воркера
+def test_plan_workers():
+    plan = plan_workers(_settings(server_workers=3, db_pool_size=5, max_connection_count=10))
+
+    assert (plan.workers, plan.pool_size, plan.max_connection_count) == (3, 5, 10)
+
+    plan = plan_workers(_settings(db_pool_size=5, db_total_connections=40), workers=16)
+    assert (plan.workers, plan.pool_size, plan.max_connection_count) == (16, 2, 2)
+    assert plan_workers(_settings(server_workers=0)).workers == (os.cpu_count() or 1)
+    with pytest.raises(ValueError):
+        plan_workers(_settings(db_total_connections=3), workers=4)
+
+
+# Тест на мягкую остановку: по сигналу готовность снимается сразу, а сервер выходит только после паузы
+@pytest.mark.asyncio
+async def test_draining_server_delays_exit(test_app):
+    test_app.state.ready = True
+    server = DrainingServer(uvicorn.Config(APP), drain_delay=0.2)
+
+    server.handle_exit(signal.SIGTERM, None)
+
+    assert test_app.state.ready is False
+    assert await server.on_tick(1) is False
+    await asyncio.sleep(0.25)
+    assert await server.on_tick(1) is True
+
+
+# Тест на повторный сигнал: сервер выходит сразу, не дожидаясь ни паузы, ни начатых запросов
+def test_draining_server_second_signal_forces_exit(test_app):
+    server = DrainingServer(uvicorn.Config(APP), drain_delay=10)
+
+    server.handle_exit(signal.SIGTERM, None)
+    assert (server.should_exit, server.force_exit) == (False, False)
+
+    server.handle_exit(signal.SIGTERM, None)
+    assert (server.should_exit, server.force_exit) == (True, True)
+
+
+# Тест на запуск нескольких воркеров: таблицы создает и удаляет родитель, воркеры отвечают и мягко останавливаются
+@pytest.mark.asyncio
+async def test_server_runs_workers_and_stops_on_sigterm(tmp_path):
+    db_file = tmp_path / "server.db"
+    port = free_port()
+    server = _start_server(db_file, port)
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{port}", server)
+        tables = sqlite3.connect(db_file).execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
+    finally:
+        server.kill()
+
+    assert ("books_table",) in tables
+    assert sqlite3.connect(db_file).execute("SELECT name FROM sqlite_master").fetchall() == []
+
+
+# Тест на Ctrl+C: SIGINT получает вся группа процессов, но воркеры не выходят сразу от SIGTERM родителя,
+# а выдерживают паузу - все это время они отвечают, только уже не готовы
+@pytest.mark.asyncio
+async def test_server_drains_on_ctrl_c(tmp_path):
+    port = free_port()
+    server = _start_server(tmp_path / "server.db", port, SERVER_DRAIN_DELAY="1.5")
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{port}", server)
+
+        os.killpg(server.pid, signal.SIGINT)
+        await asyncio.sleep(0.5)
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"http://127.0.0.1:{port}/internal/health/ready")
+
+        assert response.status_code == 503
+        assert server.wait(timeout=30) == 0
+    finally:
+        server.kill()
@@ -0,0 +1,64 @@
+import pytest
+
+from src.benchmarks.startup import profile_imports
+from src.configurations.database import build_async_engine, warm_up_engine, warm_up_pools
+from src.configurations.settings import settings
+
+# Бюджет холодного импорта с запасом на медленные машины CI. Собственный код (src.*) должен оставаться дешевым:
+# основное время уходит на fastapi, pydantic и sqlalchemy
+IMPORT_BUDGET_MS = 2500
+OWN_IMPORT_BUDGET_MS = 400
+
+# Модули, которые приложению при старте не нужны: отладка, опциональные форматы, драйверы для тестов, бенчмарки
+LAZY_MODULES = ["icecream", "pyarrow", "zstandard", "aiosqlite", "src.benchmarks"]
+
+
+# Тест на бюджет импорта приложения (python -X importtime в чистом процессе)
+def test_import_budget():
+    profile = profile_imports("src.main")
+
+    assert profile["total_ms"] < IMPORT_BUDGET_MS
+    assert profile["own_ms"] < OWN_IMPORT_BUDGET_MS
+    assert not [name for name in LAZY_MODULES if name in profile["modules"]]
+
+
+# Тест на то, что готовность появляется только после старта, а живость - сразу
+@pytest.mark.asyncio
+async def test_health_endpoints(async_client, test_app):
+    live = await async_client.get("/internal/health/live")
+    not_ready = await async_client.get("/internal/health/ready")
+
+    test_app.state.ready = True
+    try:
+        ready = await async_client.get("/internal/health/ready")
+    finally:
+        test_app.state.ready = False
+
+    assert live.status_code == 200
+    assert not_ready.status_code == 503
+    assert not_ready.headers["Retry-After"] == "1"
+    assert ready.status_code == 200
+    assert ready.json() == {"status": "ready"}
+
+
+# Тест на прогрев: соединения открыты заранее и лежат в пуле, сверх pool_size пул не растет
+@pytest.mark.postgresql
+@pytest.mark.asyncio
+async def test_warm_up_engine():
+    engine = build_async_engine(settings.database_test_url, pool_size=3)
+    try:
+        assert engine.pool.checkedin() == 0
+
+        opened = await warm_up_engine(engine, 10)
+
+        assert opened == 3
+        assert engine.pool.checkedin() == 3
+        assert engine.pool.checkedout() == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_pools_without_engine():
+    with pytest.raises(ValueError):
+        await warm_up_pools(2)